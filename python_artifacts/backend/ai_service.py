@@ -2,23 +2,48 @@
 
 import os
 import json
-from typing import Dict, List, Optional, Generator
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Generator
 from datetime import datetime
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from backend.client_pool import GeminiClientPool
+from backend.llm_resilience import LLMResilience
+from backend.model_router import ModelRouter
+from backend.rate_limit import estimate_tokens
+from backend.reference_selection import select_references
+
 load_dotenv()
 
+# Fallback replies returned instead of raising when the model call fails
+API_QUOTA_MESSAGE = "API quota exceeded. Please try again later."
+API_ERROR_MESSAGE = "I'm having trouble processing your request. Please try again or rephrase your question."
+
 class AITutorService:
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.model_name = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+        # 'fake' answers from a local stand-in (backend/fake_provider.py) for load and failure testing
+        self.provider = os.getenv('LLM_PROVIDER', 'gemini').lower()
+        
+        if self.provider == 'fake':
+            from backend.fake_provider import FakeClientPool
+            self.clients = FakeClientPool(self.model_name)
+        else:
+            if not self.api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables")
+            
+            # One model client per API key, so users can bring their own key (and quota)
+            # without reconfiguring the SDK globally; the server key is just the default.
+            # The pool imports the SDK itself, which takes most of a second.
+            self.clients = GeminiClientPool(self.model_name, server_key=self.api_key)
+        self.client = self.clients.model_for(self.api_key)
         
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        # Retries, hedging and a circuit breaker around every model call
+        self.resilience = LLMResilience()
         
-        genai.configure(api_key=self.api_key)
-        self.client = genai.GenerativeModel(self.model_name)
+        # Fast model for overviews and early hints, the strong one for solutions and code analysis
+        self.router = ModelRouter(self.model_name)
         
         # Load system prompt
         self.system_prompt = self._load_system_prompt()
@@ -108,46 +133,101 @@ class AITutorService:
         
         return "\n".join(context_parts)
     
-    def _make_api_call_stream(self, prompt: str) -> Generator[str, None, None]:
+    def _client_for(self, api_key: Optional[str], for_async: bool = False, model_name: Optional[str] = None):
+        """Model client for a caller's own key, or the server's key when none is given"""
+        return self.clients.model_for(api_key or self.api_key, for_async=for_async, model_name=model_name)
+    
+    def _make_api_call_stream(self, prompt: str, api_key: Optional[str] = None,
+                              task: str = 'chat') -> Generator[str, None, None]:
         """Make streaming API call to Gemini"""
+        prompt_tokens = estimate_tokens(prompt)
+        route = self.router.choose(task, prompt_tokens)
+        started, first_chunk, output = time.perf_counter(), None, []
         try:
-            print(f"Making streaming API call with model: {self.model_name}")
+            print(f"Making streaming API call with model: {route['model']} (route: {route['route']})")
+            
+            client = self._client_for(api_key, model_name=route['model'])
             
-            response = self.client.generate_content(
-                prompt,
-                stream=True
-            )
+            def open_stream():
+                response = client.generate_content(prompt, stream=True)
+                return (chunk.text for chunk in response if chunk.text)
             
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            for chunk in self.resilience.stream(open_stream):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                output.append(chunk)
+                yield chunk
+            self.router.record(route['route'], route['model'], time.perf_counter() - started,
+                               prompt_tokens, estimate_tokens(*output), ttft=first_chunk)
                     
         except Exception as e:
             print(f"Error in streaming API call: {e}")
             import traceback
             traceback.print_exc()
+            self.router.record(route['route'], route['model'], time.perf_counter() - started,
+                               prompt_tokens, estimate_tokens(*output), ttft=first_chunk, error=True)
+            yield f"\n\n[Error: {str(e)}]"
+    
+    async def _make_api_call_stream_async(self, prompt: str, api_key: Optional[str] = None,
+                                          task: str = 'chat') -> AsyncGenerator[str, None]:
+        """Make streaming API call to Gemini without blocking the event loop"""
+        prompt_tokens = estimate_tokens(prompt)
+        route = self.router.choose(task, prompt_tokens)
+        started, first_chunk, output = time.perf_counter(), None, []
+        try:
+            print(f"Making async streaming API call with model: {route['model']} (route: {route['route']})")
+            
+            client = self._client_for(api_key, for_async=True, model_name=route['model'])
+            
+            async def open_stream():
+                response = await client.generate_content_async(prompt, stream=True)
+                return (chunk.text async for chunk in response if chunk.text)
+            
+            async for chunk in self.resilience.stream_async(open_stream):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                output.append(chunk)
+                yield chunk
+            self.router.record(route['route'], route['model'], time.perf_counter() - started,
+                               prompt_tokens, estimate_tokens(*output), ttft=first_chunk)
+                    
+        except Exception as e:
+            print(f"Error in async streaming API call: {e}")
+            import traceback
+            traceback.print_exc()
+            self.router.record(route['route'], route['model'], time.perf_counter() - started,
+                               prompt_tokens, estimate_tokens(*output), ttft=first_chunk, error=True)
             yield f"\n\n[Error: {str(e)}]"
     
-    def _make_api_call(self, prompt: str) -> str:
+    def _make_api_call(self, prompt: str, api_key: Optional[str] = None, task: str = 'chat') -> str:
         """Make non-streaming API call to Gemini (for backward compatibility)"""
+        prompt_tokens = estimate_tokens(prompt)
+        route = self.router.choose(task, prompt_tokens)
+        started = time.perf_counter()
         try:
-            print(f"Making non-streaming API call with model: {self.model_name}")
+            print(f"Making non-streaming API call with model: {route['model']} (route: {route['route']})")
             
-            response = self.client.generate_content(prompt)
+            client = self._client_for(api_key, model_name=route['model'])
+            response = self.resilience.call(lambda: client.generate_content(prompt))
+            text = response.text.strip()
+            self.router.record(route['route'], route['model'], time.perf_counter() - started,
+                               prompt_tokens, estimate_tokens(text))
             
-            return response.text.strip()
+            return text
                 
         except Exception as e:
+            self.router.record(route['route'], route['model'], time.perf_counter() - started,
+                               prompt_tokens, 0, error=True)
             print(f"Error making API call: {e}")
             import traceback
             traceback.print_exc()
             
             if "quota" in str(e).lower() or "limit" in str(e).lower():
-                return "API quota exceeded. Please try again later."
+                return API_QUOTA_MESSAGE
             else:
-                return "I'm having trouble processing your request. Please try again or rephrase your question."
+                return API_ERROR_MESSAGE
     
-    def start_session(self, problem_data: Dict) -> str:
+    def start_session(self, problem_data: Dict, api_key: Optional[str] = None) -> str:
         """Start a new tutoring session"""
         problem_context = self._create_problem_context(problem_data)
         
@@ -157,10 +237,10 @@ class AITutorService:
 
 The student is starting to work on this problem. Give a brief technical overview (1-2 sentences) of what kind of problem this is and what approach category it belongs to."""
         
-        return self._make_api_call(prompt)
+        return self._make_api_call(prompt, api_key, task='overview')
     
-    def get_response_stream(self, user_message: str, problem_data: Dict, conversation_history: List[Dict], hints_given: int) -> Generator[str, None, None]:
-        """Get streaming AI response to user message"""
+    def _chat_prompt(self, user_message: str, problem_data: Dict, conversation_history: List[Dict], hints_given: int) -> str:
+        """Prompt for one chat turn (shared by the sync and async streams)"""
         problem_context = self._create_problem_context(problem_data)
         conversation_context = self._create_conversation_context(conversation_history)
         
@@ -175,9 +255,23 @@ Hints given: {hints_given}
 
 Respond concisely and technically. Be direct and helpful."""
         
-        yield from self._make_api_call_stream(prompt)
+        return prompt
+    
+    def get_response_stream(self, user_message: str, problem_data: Dict, conversation_history: List[Dict], hints_given: int,
+                            api_key: Optional[str] = None) -> Generator[str, None, None]:
+        """Get streaming AI response to user message"""
+        prompt = self._chat_prompt(user_message, problem_data, conversation_history, hints_given)
+        yield from self._make_api_call_stream(prompt, api_key)
     
-    def get_response(self, user_message: str, problem_data: Dict, conversation_history: List[Dict], hints_given: int) -> Dict:
+    async def get_response_stream_async(self, user_message: str, problem_data: Dict, conversation_history: List[Dict], hints_given: int,
+                                        api_key: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Async variant of get_response_stream for the ASGI server"""
+        prompt = self._chat_prompt(user_message, problem_data, conversation_history, hints_given)
+        async for chunk in self._make_api_call_stream_async(prompt, api_key):
+            yield chunk
+    
+    def get_response(self, user_message: str, problem_data: Dict, conversation_history: List[Dict], hints_given: int,
+                     api_key: Optional[str] = None) -> Dict:
         """Get AI response to user message"""
         problem_context = self._create_problem_context(problem_data)
         conversation_context = self._create_conversation_context(conversation_history)
@@ -193,7 +287,7 @@ Hints given: {hints_given}
 
 Respond concisely and technically. Be direct and helpful."""
         
-        response_text = self._make_api_call(prompt)
+        response_text = self._make_api_call(prompt, api_key)
         
         # Determine if this is a hint
         is_hint = any(keyword in user_message.lower() for keyword in ['hint', 'help', 'stuck', 'don\'t know', 'how to'])
@@ -203,7 +297,8 @@ Respond concisely and technically. Be direct and helpful."""
             'is_hint': is_hint
         }
     
-    def get_progressive_hint(self, problem_data: Dict, hints_given: int, conversation_history: List[Dict]) -> Dict:
+    def get_progressive_hint(self, problem_data: Dict, hints_given: int, conversation_history: List[Dict],
+                             api_key: Optional[str] = None) -> Dict:
         """Get a progressive hint based on the number of hints already given"""
         problem_context = self._create_problem_context(problem_data)
         conversation_context = self._create_conversation_context(conversation_history)
@@ -227,34 +322,35 @@ Respond concisely and technically. Be direct and helpful."""
 Hint #{hints_given + 1}: {instruction}
 Be concise and technical."""
         
-        response_text = self._make_api_call(prompt)
+        response_text = self._make_api_call(prompt, api_key, task=self.router.hint_task(hints_given))
         
         return {
             'message': response_text,
             'more_hints_available': hints_given < 3
         }
     
-    def get_complete_solution(self, problem_data: Dict, conversation_history: List[Dict]) -> Dict:
+    def reference_solutions(self, problem_data: Dict) -> List[str]:
+        """Reference solution sources to include in a solution prompt"""
+        # Deduplicated, minified and fitted to REFERENCE_TOKEN_BUDGET
+        return select_references(problem_data)['codes']
+    
+    def get_complete_solution(self, problem_data: Dict, conversation_history: List[Dict],
+                              api_key: Optional[str] = None) -> Dict:
         """Get the complete solution with explanation"""
         problem_context = self._create_problem_context(problem_data)
         conversation_context = self._create_conversation_context(conversation_history)
         
-        # Include ALL available solutions and editorials (Gemini 2.5 can handle large context)
-        available_solutions = []
-        if problem_data.get('solutions'):
-            for solution in problem_data['solutions']:
-                if solution.get('codes'):
-                    available_solutions.extend(solution['codes'])
-        
-        if problem_data.get('editorials'):
-            for editorial in problem_data['editorials']:
-                if editorial.get('codes'):
-                    available_solutions.extend(editorial['codes'])
+        selection = select_references(problem_data)
+        available_solutions = selection['codes']
+        print(f"Reference solutions for {problem_data.get('problem_id')}: "
+              f"{selection['candidates']} sources (~{selection['tokens_before']} tokens) -> "
+              f"{len(available_solutions)} sources (~{selection['tokens_after']} tokens), "
+              f"{selection['duplicates']} near-duplicates dropped")
         
         solution_context = ""
         if available_solutions:
             solution_context = f"\n=== AVAILABLE REFERENCE SOLUTIONS ===\n"
-            for idx, sol in enumerate(available_solutions[:5], 1):  # Include up to 5 reference solutions
+            for idx, sol in enumerate(available_solutions, 1):
                 solution_context += f"\n--- Reference Solution {idx} ---\n{sol}\n"
         
         prompt = f"""{self.system_prompt}
@@ -273,7 +369,7 @@ Provide a complete solution with:
 
 Focus on clarity, correctness, and efficiency. Explain the intuition behind the approach."""
         
-        response_text = self._make_api_call(prompt)
+        response_text = self._make_api_call(prompt, api_key, task='solution')
         
         # Try to extract code and complexity from response
         lines = response_text.split('\n')
@@ -303,10 +399,31 @@ Focus on clarity, correctness, and efficiency. Explain the intuition behind the
             'complexity': complexity_info
         }
     
-    def analyze_student_code(self, student_code: str, problem_data: Dict) -> str:
+    def analyze_student_code(self, student_code: str, problem_data: Dict,
+                             counterexample: Optional[Dict] = None, api_key: Optional[str] = None) -> str:
         """Analyze student's code submission with full problem context"""
         problem_context = self._create_problem_context(problem_data)
         
+        # A failing input found by stress testing pins the analysis to a concrete bug
+        counterexample_context = ""
+        if counterexample:
+            counterexample_context = f"""
+=== FAILING TEST FOUND BY STRESS TESTING ({counterexample.get('verdict', 'WRONG_ANSWER')}) ===
+Input:
+```
+{counterexample.get('input', '')}
+```
+Expected output (reference solution):
+```
+{counterexample.get('expected', '')}
+```
+Student's output:
+```
+{counterexample.get('output', '')}
+```
+Explain why the student's code fails on this input.
+"""
+        
         prompt = f"""{self.system_prompt}
 
 {problem_context}
@@ -315,6 +432,7 @@ Focus on clarity, correctness, and efficiency. Explain the intuition behind the
 ```
 {student_code}
 ```
+{counterexample_context}
 
 Please analyze their code comprehensively and provide:
 1. **Correctness Analysis**: Is the approach correct? Does it solve the problem?
@@ -327,4 +445,31 @@ Please analyze their code comprehensively and provide:
 
 Be thorough, constructive, and specific. Point out exact lines if there are issues."""
         
-        return self._make_api_call(prompt)
\ No newline at end of file
+        return self._make_api_call(prompt, api_key, task='code_analysis')
+    
+    def review_code_change(self, diff: str, previous_analysis: str, problem_data: Dict,
+                           api_key: Optional[str] = None) -> str:
+        """Update an earlier code analysis from a diff of what the student changed"""
+        problem_context = self._create_problem_context(problem_data)
+        
+        prompt = f"""{self.system_prompt}
+
+{problem_context}
+
+=== YOUR PREVIOUS ANALYSIS OF THE STUDENT'S CODE ===
+{previous_analysis}
+
+=== WHAT THE STUDENT CHANGED SINCE THEN (unified diff) ===
+```diff
+{diff}
+```
+
+Review only the changes:
+1. **Fixed Issues**: Which problems from the previous analysis do these changes resolve?
+2. **New Issues**: Do the changes introduce bugs, missed edge cases or complexity regressions?
+3. **Remaining Issues**: Which earlier points still apply?
+4. **Verdict**: Is the solution now correct and efficient enough?
+
+Be concise and specific. Refer to the changed lines."""
+        
+        return self._make_api_call(prompt, api_key, task='code_review')
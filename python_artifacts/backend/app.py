@@ -2,9 +2,11 @@
 
 import os
 import sys
-from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
+from flask import Flask, g, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import json
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from datetime import datetime
 import traceback
 import logging
@@ -25,6 +27,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Users may bring their own Gemini key; it is used for their requests and never stored
+API_KEY_HEADER = 'X-Gemini-Api-Key'
+
+def user_api_key(headers):
+    """The caller's own Gemini API key from the request headers, if any"""
+    return (headers.get(API_KEY_HEADER) or '').strip() or None
+
 def log_api_call(f):
     """Decorator to log all API calls with detailed information"""
     @wraps(f)
@@ -35,7 +44,10 @@ def log_api_call(f):
         logger.info(f"=== API CALL START: {request.endpoint} ===")
         logger.info(f"Method: {request.method}")
         logger.info(f"URL: {request.url}")
-        logger.info(f"Headers: {dict(request.headers)}")
+        headers = dict(request.headers)
+        if API_KEY_HEADER in headers:
+            headers[API_KEY_HEADER] = '***'
+        logger.info(f"Headers: {headers}")
         
         if request.is_json:
             try:
@@ -85,52 +97,213 @@ def log_api_call(f):
 # Add parent directory to path to import final.py
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
-from final import ComprehensiveCodeforcesSolutionExtractor
 
-# Import AI service
-from backend.ai_service import AITutorService
+from backend.startup import LazyService, startup, warm_up
+_module_started = time.perf_counter()
+
+# Import AI service (the Gemini SDK itself is only imported when the tutor is first used)
+from backend.ai_service import AITutorService, API_ERROR_MESSAGE, API_QUOTA_MESSAGE
+from backend.session_registry import SessionRegistry
+from backend.records import us_to_iso
+from backend.persistence import WriteBehindPersister, load_storage
+from backend.history import HistoryQueryError, parse_history_query, select_history, history_etag
+from backend.judge import JudgeError, LocalJudge
+from backend.sandbox import SandboxError
+from backend.stress import StressBusy, StressTester
+from backend.code_analysis import CodeAnalysisCache
+from backend.client_pool import key_hash
+from backend.rate_limit import LLMRateLimiter, estimate_tokens, retry_after_header
+from backend.llm_scheduler import BACKGROUND, INTERACTIVE, STANDARD, LLMScheduler
+from backend.welcome import WelcomeMessages, welcome_key
 
 # Flask app setup with disabled static folder
 app = Flask(__name__, static_folder=None)
 CORS(app)
 
-# Initialize services
-extractor = ComprehensiveCodeforcesSolutionExtractor()
-ai_tutor = AITutorService()
+
+def _create_extractor():
+    # Scraping and similarity dependencies are imported first so the report breaks them down
+    for module in ('curl_cffi', 'bs4', 'numpy', 'final'):
+        startup.timed_import(module)
+    from final import ComprehensiveCodeforcesSolutionExtractor
+    return ComprehensiveCodeforcesSolutionExtractor()
+
+
+def _create_ai_tutor():
+    startup.timed_import('google.generativeai')
+    return AITutorService()
 
 
-import threading
 import atexit
 
 DB_FILE = 'storage.json'
-db_lock = threading.Lock()
 
 def load_db():
-    try:
-        if os.path.exists(DB_FILE):
-            with open(DB_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('active_sessions', {}), data.get('conversations', {})
-    except Exception as e:
-        print(f"Error loading DB: {e}")
-    return {}, {}
+    return load_storage(DB_FILE)
 
 def save_db():
-    with db_lock:
-        try:
-            with open(DB_FILE, 'w') as f:
-                json.dump({
-                    'active_sessions': active_sessions,
-                    'conversations': conversations
-                }, f)
-        except Exception as e:
-            print(f"Error saving DB: {e}")
+    """Synchronously flush pending changes (normal writes happen in the background)"""
+    persister.flush()
+
+def _open_storage():
+    # Persistent storage using JSON, guarded by striped per-session/conversation locks.
+    # Each message is stored once, in its conversation's log; sessions keep seqs into it.
+    registry = SessionRegistry.from_storage(load_db())
+
+    # Handlers only mark records dirty; a background thread journals them in batches
+    registry.persister = WriteBehindPersister(registry, DB_FILE)
+    registry.on_change = registry.persister.mark_dirty
+
+    # Flush and compact on exit so nothing in the durability window is lost
+    atexit.register(registry.persister.close)
+    return registry
 
-# Persistent storage using JSON
-active_sessions, conversations = load_db()
+def close_storage():
+    """Flush session storage at shutdown; a no-op if it was never opened"""
+    if registry.loaded:
+        persister.close()
+
+
+# Initialize services; the expensive ones are built on first use
+extractor = LazyService('extractor', _create_extractor)
+ai_tutor = LazyService('ai_tutor', _create_ai_tutor)
+registry = LazyService('storage', _open_storage)
+persister = LazyService('persister', lambda: registry.persister)
+active_sessions = LazyService('active_sessions', lambda: registry.sessions)
+conversations = LazyService('conversations', lambda: registry.conversations)
+judge = LocalJudge()
+stress_tester = StressTester(judge)
+analysis_cache = CodeAnalysisCache()
+welcome_messages = WelcomeMessages()
+
+SERVICES = {'storage': registry, 'extractor': extractor, 'ai_tutor': ai_tutor}
+
+def warm_up_services():
+    """Build every lazy service now instead of on the first request"""
+    warm_up(SERVICES)
+
+startup.mark('import backend.app', _module_started)
+
+
+# Admission control for the endpoints that call Gemini
+rate_limiter = LLMRateLimiter()
+# Model calls share a bounded number of slots, handed out by priority and fairly across callers
+llm_scheduler = LLMScheduler()
+# Behind a reverse proxy (Railway, nginx...) the client address is the entry that many hops
+# from the end of X-Forwarded-For; earlier entries can be forged by the client
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+
+# Tokens allowed for the model's reply, by endpoint
+REPLY_TOKENS = {
+    'start_session': 200,
+    'chat': 1000,
+    'get_hint': 300,
+    'get_solution': 3000,
+    'analyze_code': 1500,
+    'stress_test': 1500,
+}
+
+# Endpoints that run code locally instead of calling the model: charged this flat cost plus
+# the code they submit, never the model's prompt (a stress test asking for analysis is a model call)
+LOCAL_RUN_TOKENS = {
+    'judge_solution': 500,
+    'stress_test': 1000,
+}
+
+def calls_model(endpoint, data):
+    return endpoint not in LOCAL_RUN_TOKENS or (endpoint == 'stress_test' and bool(data.get('analyze')))
+
+def client_identity(headers, remote_addr):
+    """Who a request is charged to: their own API key if they sent one, else their IP.
+    Returns (identity, uses_shared_key)."""
+    api_key = user_api_key(headers)
+    if api_key:
+        return f"key:{key_hash(api_key)}", False
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [hop.strip() for hop in headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return f"ip:{forwarded[-TRUSTED_PROXY_HOPS]}", True
+    return f"ip:{remote_addr}", True
+
+def estimate_request_tokens(endpoint, data):
+    """Estimated prompt plus reply tokens of one model call, from what the request names"""
+    if not calls_model(endpoint, data):
+        # No prompt to build, so the model service isn't touched (or built) at all
+        return LOCAL_RUN_TOKENS[endpoint] + estimate_tokens(
+            str(data.get('code', '')), str(data.get('generator', '')), str(data.get('reference_code', '')))
+    problem_data = None
+    session_id = data.get('session_id')
+    if session_id and session_id in active_sessions:
+        problem_data = active_sessions[session_id].problem_data
+    elif data.get('problem_id'):
+        problem_data = extractor.search_problem(data['problem_id'])
+    
+    texts = [ai_tutor.system_prompt, str(data.get('message', '')), str(data.get('code', ''))]
+    if problem_data:
+        problem_context = ai_tutor._create_problem_context(problem_data)
+        if endpoint == 'start_session' and welcome_messages.cached(welcome_key(problem_data['problem_id'], problem_context)):
+            # The overview will come from the cache, no model call to pay for
+            return 0
+        texts.append(problem_context)
+        if endpoint == 'get_solution':
+            texts.extend(ai_tutor.reference_solutions(problem_data))
+    return estimate_tokens(*texts) + REPLY_TOKENS.get(endpoint, 1000)
 
-# Ensure we save on exit just in case
-atexit.register(save_db)
+# Scheduling class of each endpoint's model call; background work queues behind both
+ENDPOINT_PRIORITY = {
+    'chat': INTERACTIVE,
+    'start_session': STANDARD,
+    'get_hint': STANDARD,
+    'get_solution': STANDARD,
+    'analyze_code': STANDARD,
+    'stress_test': STANDARD,
+}
+
+def admit_llm_request(endpoint, data, headers, remote_addr):
+    """Charge a model-calling request to its caller's budget; shared by the Flask and ASGI routes.
+    The decision also names the caller and the estimated cost, for scheduling the call."""
+    data = data or {}
+    identity, shared_key = client_identity(headers, remote_addr)
+    tokens = estimate_request_tokens(endpoint, data)
+    # Local runs count against the caller's budget but not the shared Gemini key's quota
+    decision = rate_limiter.acquire(identity, tokens, shared_key=shared_key and calls_model(endpoint, data))
+    decision.update(caller=identity, tokens=tokens)
+    return decision
+
+def llm_slot():
+    """Scheduler slot for the current request's model call (enter it around the call)"""
+    decision = g.get('rate_limit') or {}
+    return llm_scheduler.slot(ENDPOINT_PRIORITY.get(request.endpoint, STANDARD),
+                              decision.get('caller', ''), decision.get('tokens', 1))
+
+def rate_limit_payload(decision):
+    return {
+        'error': 'Rate limit exceeded. Please wait before sending more requests.',
+        'retry_after': round(decision['retry_after'], 1)
+    }
+
+def llm_rate_limited(f):
+    """Decorator refusing model-calling requests over the caller's budget with a 429"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        decision = admit_llm_request(request.endpoint, data, request.headers, request.remote_addr)
+        if not decision['allowed']:
+            response = jsonify(rate_limit_payload(decision))
+            response.headers['Retry-After'] = retry_after_header(decision['retry_after'])
+            return response, 429
+        g.rate_limit = decision
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
+@app.after_request
+def add_rate_limit_headers(response):
+    decision = g.get('rate_limit')
+    if decision and 'remaining_requests' in decision:
+        response.headers['X-RateLimit-Remaining-Requests'] = str(decision['remaining_requests'])
+        response.headers['X-RateLimit-Remaining-Tokens'] = str(decision['remaining_tokens'])
+    return response
 
 
 # Frontend serving routes
@@ -165,36 +338,20 @@ def extract_problem():
         if not url:
             return jsonify({'error': 'Valid URL is required'}), 400
         
-        # Process the problem URL
-        success = extractor.process_problem_url(url)
-        
-        if not success:
-            return jsonify({'error': 'Failed to extract problem data'}), 400
-        
-        # Get the extracted problem data
-        # Extract problem ID from URL to find the data
-        url_parts = url.split('/')
-        problem_id = ""
-        if 'contest' in url_parts and 'problem' in url_parts:
-            contest_index = url_parts.index('contest')
-            problem_index = url_parts.index('problem')
-            if contest_index + 1 < len(url_parts) and problem_index + 1 < len(url_parts):
-                contest_num = url_parts[contest_index + 1]
-                problem_letter = url_parts[problem_index + 1]
-                problem_id = contest_num + problem_letter
-        elif 'problemset' in url_parts and 'problem' in url_parts:
-            problem_index = url_parts.index('problem')
-            if len(url_parts) > problem_index + 2:
-                problem_id = url_parts[problem_index+1] + url_parts[problem_index+2]
-        
-        # Try multiple possible problem IDs since the scraper might save it differently
-        possible_ids = [problem_id, f"problem{problem_id[-2:]}" if len(problem_id) >= 2 else problem_id]
-        problem_data = None
-        
-        for pid in possible_ids:
-            problem_data = extractor.search_problem(pid)
-            if problem_data:
-                break
+        # One canonical key for every URL form (contest/problemset/gym, mirrors, case, query strings)
+        canonical = extractor.resolve_problem_url(url)
+        if not canonical:
+            return jsonify({'error': 'Not a Codeforces problem URL'}), 400
+        
+        # Store hit: already extracted with a full statement, no need to scrape again
+        problem_data = extractor.search_problem(canonical.key)
+        if not problem_data or not problem_data.get('statement'):
+            success = extractor.process_problem_url(canonical.url)
+            
+            if not success:
+                return jsonify({'error': 'Failed to extract problem data'}), 400
+            
+            problem_data = extractor.search_problem(canonical.key)
         
         if not problem_data:
             return jsonify({'error': 'Problem data not found after extraction'}), 500
@@ -224,10 +381,57 @@ def extract_problem():
         traceback.print_exc()
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+WELCOME_TIMEOUT = float(os.getenv('WELCOME_TIMEOUT', 60))
+
+def request_welcome(session, api_key=None):
+    """Future of the session's welcome overview. Call it when the session is created: the overview
+    takes the session's first place in its history then, and is written there once ready."""
+    problem_data = session.problem_data
+    key = welcome_key(problem_data['problem_id'], ai_tutor._create_problem_context(problem_data))
+    # Runs on the welcome worker pool, outside the request: schedule it as the request's caller,
+    # behind chat and the requests a student is waiting on
+    decision = g.get('rate_limit') or {}
+    caller, tokens = decision.get('caller', ''), decision.get('tokens', 1)
+    
+    def generate():
+        with llm_scheduler.slot(BACKGROUND, caller, tokens):
+            text = ai_tutor.start_session(problem_data, api_key=api_key)
+        # Failed model calls come back as fallback text; never cache those
+        return text, text not in (API_ERROR_MESSAGE, API_QUOTA_MESSAGE)
+    
+    def deliver(future):
+        if future.exception() is None:
+            registry.write_message(session, seq, future.result())
+        else:
+            # The reserved place stays empty, and out of the history
+            print(f"Error generating welcome message for {session.session_id}: {future.exception()}")
+    
+    # Ahead of anything the student sends while the overview is generated
+    seq = registry.reserve_message(session, 'assistant')
+    future = welcome_messages.request(session.session_id, key, generate)
+    future.add_done_callback(deliver)
+    return future
+
+def welcome_status(session):
+    """(status, welcome message or error) of a session: pending, ready or error"""
+    future = welcome_messages.for_session(session.session_id)
+    if future is None:
+        # Started before a restart (or long ago): the overview is the session's first reply
+        history = registry.session_history(session)
+        first_reply = next((message['message'] for message in history if message['role'] == 'assistant'), None)
+        return ('ready', first_reply) if first_reply is not None else ('error', 'Welcome message unavailable')
+    if not future.done():
+        return 'pending', None
+    if future.exception() is not None:
+        return 'error', str(future.exception())
+    return 'ready', future.result()
+
 @app.route('/api/start-session', methods=['POST'])
 @log_api_call
+@llm_rate_limited
 def start_session():
-    """Start a new tutoring session"""
+    """Start a new tutoring session; the welcome overview follows at /api/session/{id}/welcome
+    unless it is cached (or the request asks to wait for it)"""
     try:
         data = request.get_json()
         if not data or 'problem_id' not in data:
@@ -241,56 +445,24 @@ def start_session():
         if not problem_data:
             return jsonify({'error': 'Problem not found'}), 404
         
-        # Create session
-        session_id = f"{problem_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        session_data = {
-            'session_id': session_id,
-            'problem_id': problem_id,
-            'problem_data': problem_data,
-            'conversation_history': [],
-            'hints_given': 0,
-            'created_at': datetime.now().isoformat(),
-            'last_activity': datetime.now().isoformat(),
-            'conversation_id': conversation_id  # Link to conversation
-        }
-        
-        active_sessions[session_id] = session_data
-        save_db()
-        
-        # If conversation_id is provided, track this session in the conversation
-        if conversation_id:
-            if conversation_id not in conversations:
-                conversations[conversation_id] = {
-                    'id': conversation_id,
-                    'sessions': [],
-                    'context': [],
-                    'created_at': datetime.now().isoformat(),
-                    'last_updated': datetime.now().isoformat()
-                }
-            conversations[conversation_id]['sessions'].append(session_id)
-            conversations[conversation_id]['last_updated'] = datetime.now().isoformat()
-        
-        # Generate welcome message
-        welcome_message = ai_tutor.start_session(problem_data)
-        
-        session_data['conversation_history'].append({
-            'role': 'assistant',
-            'message': welcome_message,
-            'timestamp': datetime.now().isoformat()
-        })
+        # Create session (collision-free ID, linked to its conversation under lock)
+        session_data = registry.create_session(problem_id, problem_data, conversation_id)
+        session_id = session_data.session_id
         
-        # Also add to conversation context if available
-        if conversation_id and conversation_id in conversations:
-            conversations[conversation_id]['context'].append({
-                'role': 'assistant',
-                'message': welcome_message,
-                'timestamp': datetime.now().isoformat(),
-                'session_id': session_id
-            })
+        # Welcome message: from the per-problem cache, else generated in the background
+        future = request_welcome(session_data, api_key=user_api_key(request.headers))
+        if data.get('wait'):
+            try:
+                future.exception(timeout=WELCOME_TIMEOUT)
+            except FuturesTimeoutError:
+                pass
+        status, welcome_message = welcome_status(session_data)
         
         return jsonify({
             'session_id': session_id,
-            'welcome_message': welcome_message,
+            'welcome_message': welcome_message if status == 'ready' else None,
+            'welcome_status': status,
+            'welcome_url': f'/api/session/{session_id}/welcome',
             'problem_title': problem_data['problem_title']
         })
         
@@ -299,87 +471,144 @@ def start_session():
         traceback.print_exc()
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-@app.route('/api/chat', methods=['POST'])
+@app.route('/api/session/<session_id>/welcome', methods=['GET'])
 @log_api_call
-def chat():
-    """Handle chat messages in a tutoring session with streaming"""
+def get_welcome(session_id):
+    """A session's welcome overview: JSON to poll (202 while pending), or one SSE event once ready"""
     try:
-        data = request.get_json()
-        if not data or 'session_id' not in data or 'message' not in data:
-            return jsonify({'error': 'Session ID and message are required'}), 400
+        if session_id not in active_sessions:
+            return jsonify({'error': 'Session not found'}), 404
+        session = active_sessions[session_id]
         
-        session_id = data['session_id']
-        user_message = data['message'].strip()
-        conversation_id = data.get('conversation_id')
+        if 'text/event-stream' not in request.headers.get('Accept', ''):
+            status, result = welcome_status(session)
+            if status == 'error':
+                return jsonify({'status': status, 'error': result}), 500
+            return jsonify({'status': status, 'welcome_message': result}), 202 if status == 'pending' else 200
         
-        if session_id not in active_sessions:
-            return jsonify({'error': 'Session not found or expired'}), 404
+        future = welcome_messages.for_session(session_id)
         
-        session = active_sessions[session_id]
+        def generate():
+            try:
+                if future is not None:
+                    future.exception(timeout=WELCOME_TIMEOUT)
+                status, result = welcome_status(session)
+                if status == 'error':
+                    yield sse_event({'error': result})
+                else:
+                    yield sse_event({'welcome_message': result, 'done': True})
+            except FuturesTimeoutError:
+                yield sse_event({'error': 'Welcome message timed out'})
+            except Exception as e:
+                print(f"Error streaming welcome message: {e}")
+                yield sse_event({'error': str(e)})
         
-        session['last_activity'] = datetime.now().isoformat()
+        return Response(stream_with_context(generate()), mimetype='text/event-stream')
         
-        conversation_context = []
-        if conversation_id and conversation_id in conversations:
-            conversation_context = conversations[conversation_id]['context']
-            conversations[conversation_id]['last_updated'] = datetime.now().isoformat()
+    except Exception as e:
+        print(f"Error in get_welcome: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+HINT_KEYWORDS = ['hint', 'help', 'stuck', 'don\'t know', 'how to']
+
+class ChatRequestError(Exception):
+    """A chat request that can't be served; carries the HTTP status to answer with"""
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def conversation_mismatch(session, data):
+    """Error message for a request naming another conversation than its session's, else None.
+    A session reads its context from and writes its replies to its own log only."""
+    conversation_id = data.get('conversation_id')
+    if conversation_id and conversation_id != session.conversation_id:
+        return f"Session {session.session_id} does not belong to conversation {conversation_id}"
+    return None
+
+def begin_chat(data, api_key=None):
+    """Validate a chat request, record the user's message and snapshot what the model needs.
+    Shared by the Flask route and the ASGI streaming route."""
+    if not data or 'session_id' not in data or 'message' not in data:
+        raise ChatRequestError('Session ID and message are required', 400)
+    
+    session_id = data['session_id']
+    user_message = data['message'].strip()
+    
+    if session_id not in active_sessions:
+        raise ChatRequestError('Session not found or expired', 404)
+    
+    session = active_sessions[session_id]
+    mismatch = conversation_mismatch(session, data)
+    if mismatch:
+        raise ChatRequestError(mismatch, 400)
+    
+    with registry.locked_session(session):
+        session.touch()
         
-        session['conversation_history'].append({
-            'role': 'user',
-            'message': user_message,
-            'timestamp': datetime.now().isoformat()
-        })
+        registry.append_message(session, 'user', user_message)
         
-        if conversation_id and conversation_id in conversations:
-            conversations[conversation_id]['context'].append({
-                'role': 'user',
-                'message': user_message,
-                'timestamp': datetime.now().isoformat(),
-                'session_id': session_id
-            })
+        # Snapshot the context so the model call runs without holding the lock
+        context_to_use = registry.context_for(session)
+        hints_given = session.hints_given
+    
+    return {
+        'session': session,
+        'user_message': user_message,
+        'model_args': {
+            'user_message': user_message,
+            'problem_data': session.problem_data,
+            'conversation_history': context_to_use,
+            'hints_given': hints_given,
+            'api_key': api_key
+        }
+    }
+
+def finish_chat(turn, full_response):
+    """Store the streamed reply and return the final 'done' event payload"""
+    session = turn['session']
+    is_hint = any(keyword in turn['user_message'].lower() for keyword in HINT_KEYWORDS)
+    
+    with registry.locked_session(session):
+        if is_hint:
+            session.hints_given += 1
         
-        context_to_use = conversation_context if conversation_context else session['conversation_history']
+        registry.append_message(session, 'assistant', full_response, is_hint=is_hint)
+        hints_total = session.hints_given
+    
+    return {'done': True, 'is_hint': is_hint, 'hints_given': hints_total}
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat', methods=['POST'])
+@log_api_call
+@llm_rate_limited
+def chat():
+    """Handle chat messages in a tutoring session with streaming"""
+    try:
+        try:
+            turn = begin_chat(request.get_json(), api_key=user_api_key(request.headers))
+        except ChatRequestError as e:
+            return jsonify({'error': str(e)}), e.status
+        
+        # The slot is held until the stream ends (or the client goes away)
+        slot = llm_slot()
         
         def generate():
             full_response = ""
             try:
-                for chunk in ai_tutor.get_response_stream(
-                    user_message=user_message,
-                    problem_data=session['problem_data'],
-                    conversation_history=context_to_use,
-                    hints_given=session['hints_given']
-                ):
-                    full_response += chunk
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                
-                is_hint = any(keyword in user_message.lower() for keyword in ['hint', 'help', 'stuck', 'don\'t know', 'how to'])
-                
-                if is_hint:
-                    session['hints_given'] += 1
-                
-                session['conversation_history'].append({
-                    'role': 'assistant',
-                    'message': full_response,
-                    'timestamp': datetime.now().isoformat(),
-                    'is_hint': is_hint
-                })
-                
-                if conversation_id and conversation_id in conversations:
-                    conversations[conversation_id]['context'].append({
-                        'role': 'assistant',
-                        'message': full_response,
-                        'timestamp': datetime.now().isoformat(),
-                        'is_hint': is_hint,
-                        'session_id': session_id
-                    })
+                with slot:
+                    for chunk in ai_tutor.get_response_stream(**turn['model_args']):
+                        full_response += chunk
+                        yield sse_event({'chunk': chunk})
                 
-                save_db()
-                yield f"data: {json.dumps({'done': True, 'is_hint': is_hint, 'hints_given': session['hints_given']})}\n\n"
+                yield sse_event(finish_chat(turn, full_response))
                 
             except Exception as e:
                 print(f"Error in streaming: {e}")
                 traceback.print_exc()
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield sse_event({'error': str(e)})
         
         return Response(stream_with_context(generate()), mimetype='text/event-stream')
         
@@ -390,6 +619,7 @@ def chat():
 
 @app.route('/api/get-hint', methods=['POST'])
 @log_api_call
+@llm_rate_limited
 def get_hint():
     """Get a progressive hint for the current problem"""
     try:
@@ -398,57 +628,46 @@ def get_hint():
             return jsonify({'error': 'Session ID is required'}), 400
         
         session_id = data['session_id']
-        conversation_id = data.get('conversation_id')
         
         if session_id not in active_sessions:
             return jsonify({'error': 'Session not found or expired'}), 404
         
         session = active_sessions[session_id]
-        problem_data = session['problem_data']
-        hints_given = session['hints_given']
+        mismatch = conversation_mismatch(session, data)
+        if mismatch:
+            return jsonify({'error': mismatch}), 400
+        problem_data = session.problem_data
         
-        # Get conversation context if available
-        conversation_context = []
-        if conversation_id and conversation_id in conversations:
-            conversation_context = conversations[conversation_id]['context']
-            conversations[conversation_id]['last_updated'] = datetime.now().isoformat()
-        
-        # Use conversation context for hint generation
-        context_to_use = conversation_context if conversation_context else session['conversation_history']
+        with registry.locked_session(session):
+            # Reserve the hint number up front so concurrent requests get distinct hint levels
+            hints_given = session.hints_given
+            session.hints_given += 1
+            session.touch()
+            
+            # Use conversation context for hint generation
+            context_to_use = registry.context_for(session)
         
         # Get hint from AI tutor
-        hint_response = ai_tutor.get_progressive_hint(
-            problem_data=problem_data,
-            hints_given=hints_given,
-            conversation_history=context_to_use
-        )
-        
-        # Update session
-        session['hints_given'] += 1
-        session['last_activity'] = datetime.now().isoformat()
-        
-        # Add to conversation history
-        session['conversation_history'].append({
-            'role': 'assistant',
-            'message': hint_response['message'],
-            'timestamp': datetime.now().isoformat(),
-            'is_hint': True
-        })
+        try:
+            with llm_slot():
+                hint_response = ai_tutor.get_progressive_hint(
+                    problem_data=problem_data,
+                    hints_given=hints_given,
+                    conversation_history=context_to_use,
+                    api_key=user_api_key(request.headers)
+                )
+        except Exception:
+            with registry.locked_session(session):
+                session.hints_given -= 1
+            registry.mark_changed(session)
+            raise
+        
+        # Add to conversation history (stored once, shared with the conversation context)
+        registry.append_message(session, 'assistant', hint_response['message'], is_hint=True)
         
-        # Add to conversation context
-        if conversation_id and conversation_id in conversations:
-            conversations[conversation_id]['context'].append({
-                'role': 'assistant',
-                'message': hint_response['message'],
-                'timestamp': datetime.now().isoformat(),
-                'is_hint': True,
-                'session_id': session_id
-            })
-        
-        save_db()
         return jsonify({
             'hint': hint_response['message'],
-            'hint_number': session['hints_given'],
+            'hint_number': hints_given + 1,
             'more_hints_available': hint_response.get('more_hints_available', True)
         })
         
@@ -459,6 +678,7 @@ def get_hint():
 
 @app.route('/api/get-solution', methods=['POST'])
 @log_api_call
+@llm_rate_limited
 def get_solution():
     """Get the complete solution for the problem"""
     try:
@@ -467,51 +687,35 @@ def get_solution():
             return jsonify({'error': 'Session ID is required'}), 400
         
         session_id = data['session_id']
-        conversation_id = data.get('conversation_id')
         
         if session_id not in active_sessions:
             return jsonify({'error': 'Session not found or expired'}), 404
         
         session = active_sessions[session_id]
-        problem_data = session['problem_data']
+        mismatch = conversation_mismatch(session, data)
+        if mismatch:
+            return jsonify({'error': mismatch}), 400
+        problem_data = session.problem_data
         
-        # Get conversation context if available
-        conversation_context = []
-        if conversation_id and conversation_id in conversations:
-            conversation_context = conversations[conversation_id]['context']
-            conversations[conversation_id]['last_updated'] = datetime.now().isoformat()
-        
-        # Use conversation context for solution generation
-        context_to_use = conversation_context if conversation_context else session['conversation_history']
+        with registry.locked_session(session):
+            # Use conversation context for solution generation
+            context_to_use = registry.context_for(session)
         
         # Get solution from AI tutor
-        solution_response = ai_tutor.get_complete_solution(
-            problem_data=problem_data,
-            conversation_history=context_to_use
-        )
-        
-        # Update session
-        session['last_activity'] = datetime.now().isoformat()
-        
-        # Add to conversation history
-        session['conversation_history'].append({
-            'role': 'assistant',
-            'message': solution_response['message'],
-            'timestamp': datetime.now().isoformat(),
-            'is_solution': True
-        })
+        with llm_slot():
+            solution_response = ai_tutor.get_complete_solution(
+                problem_data=problem_data,
+                conversation_history=context_to_use,
+                api_key=user_api_key(request.headers)
+            )
+        
+        with registry.locked_session(session):
+            # Update session
+            session.touch()
+        
+        # Add to conversation history (stored once, shared with the conversation context)
+        registry.append_message(session, 'assistant', solution_response['message'], is_solution=True)
         
-        # Add to conversation context
-        if conversation_id and conversation_id in conversations:
-            conversations[conversation_id]['context'].append({
-                'role': 'assistant',
-                'message': solution_response['message'],
-                'timestamp': datetime.now().isoformat(),
-                'is_solution': True,
-                'session_id': session_id
-            })
-        
-        save_db()
         return jsonify({
             'solution': solution_response['message'],
             'explanation': solution_response.get('explanation', ''),
@@ -527,20 +731,36 @@ def get_solution():
 @app.route('/api/conversation/<conversation_id>/history', methods=['GET'])
 @log_api_call
 def get_conversation_history(conversation_id):
-    """Get conversation history for a conversation"""
+    """Get conversation history for a conversation (supports limit/before/since cursors)"""
     try:
         if conversation_id not in conversations:
             return jsonify({'error': 'Conversation not found'}), 404
         
+        query = parse_history_query(request.args)
         conversation = conversations[conversation_id]
-        return jsonify({
+        
+        log = registry.conversation_context(conversation_id)
+        
+        etag = history_etag('conversation', conversation_id,
+                            (len(log), len(conversation.sessions), conversation.last_updated),
+                            query)
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+        
+        context, cursor = select_history(log, seqs=log.seqs, **query)
+        response = jsonify({
             'conversation_id': conversation_id,
-            'context': conversation['context'],
-            'sessions': conversation['sessions'],
-            'created_at': conversation['created_at'],
-            'last_updated': conversation['last_updated']
+            'context': context,
+            'sessions': list(conversation.sessions),
+            'created_at': us_to_iso(conversation.created_at),
+            'last_updated': us_to_iso(conversation.last_updated),
+            **cursor
         })
+        response.set_etag(etag)
+        return response
         
+    except HistoryQueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_conversation_history: {e}")
         traceback.print_exc()
@@ -549,34 +769,308 @@ def get_conversation_history(conversation_id):
 @app.route('/api/session/<session_id>/history', methods=['GET'])
 @log_api_call
 def get_session_history(session_id):
-    """Get conversation history for a session"""
+    """Get conversation history for a session (supports limit/before/since cursors)"""
     try:
         if session_id not in active_sessions:
             return jsonify({'error': 'Session not found'}), 404
         
+        query = parse_history_query(request.args)
         session = active_sessions[session_id]
-        return jsonify({
+        history = registry.session_history(session)
+        
+        # The history's length, not the seqs': a reserved welcome counts once it is written
+        etag = history_etag('session', session_id,
+                            (len(history), session.hints_given, session.last_activity),
+                            query)
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+        
+        # Seqs are positions in the shared log, so they stay valid as cursors across sessions
+        conversation_history, cursor = select_history(history, seqs=history.seqs, **query)
+        response = jsonify({
             'session_id': session_id,
-            'problem_id': session['problem_id'],
-            'conversation_history': session['conversation_history'],
-            'hints_given': session['hints_given'],
-            'created_at': session['created_at']
+            'problem_id': session.problem_id,
+            'conversation_history': conversation_history,
+            'hints_given': session.hints_given,
+            'created_at': us_to_iso(session.created_at),
+            **cursor
         })
+        response.set_etag(etag)
+        return response
         
+    except HistoryQueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_session_history: {e}")
         traceback.print_exc()
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/api/problems/search', methods=['GET'])
+@log_api_call
+def search_problems():
+    """BM25 search over stored problems (?q=...&tags=dp,greedy&contest=2128&limit=10)"""
+    try:
+        query = request.args.get('q', '').strip()
+        tags = [tag for tag in request.args.get('tags', '').split(',') if tag.strip()]
+        contest = request.args.get('contest', '').strip() or None
+        
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+        except ValueError:
+            return jsonify({'error': "'limit' must be an integer"}), 400
+        
+        if not query and not tags and not contest:
+            return jsonify({'error': 'A query, tag or contest filter is required'}), 400
+        
+        started = time.perf_counter()
+        results = extractor.search_problems(query, tags=tags, contest=contest, limit=limit)
+        took_ms = (time.perf_counter() - started) * 1000
+        
+        return jsonify({
+            'query': query,
+            'tags': tags,
+            'contest': contest,
+            'results': results,
+            'took_ms': round(took_ms, 3)
+        })
+        
+    except Exception as e:
+        print(f"Error in search_problems: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/problems/<problem_id>/similar', methods=['GET'])
+@log_api_call
+def similar_problems(problem_id):
+    """Recommend stored problems similar to the given one (?k=5)"""
+    try:
+        try:
+            k = min(max(int(request.args.get('k', 5)), 1), 20)
+        except ValueError:
+            return jsonify({'error': "'k' must be an integer"}), 400
+        
+        results = extractor.similar_problems(problem_id, k)
+        if results is None:
+            return jsonify({'error': 'Problem not found'}), 404
+        
+        return jsonify({
+            'problem_id': problem_id.upper(),
+            'similar': results
+        })
+        
+    except Exception as e:
+        print(f"Error in similar_problems: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+def judge_unavailable():
+    """Error response when this server doesn't run submitted code, else None"""
+    if not judge.enabled:
+        return jsonify({'error': 'The local judge is disabled on this server (JUDGE_ENABLED=1 turns it on)'}), 403
+    if not judge.sandbox.available:
+        return jsonify({'error': 'The local judge has no sandbox to run code in'}), 503
+    return None
+
+@app.route('/api/judge', methods=['POST'])
+@log_api_call
+@llm_rate_limited
+def judge_solution():
+    """Compile a C++ solution and run it on the problem's samples (or on given tests)"""
+    try:
+        unavailable = judge_unavailable()
+        if unavailable:
+            return unavailable
+        
+        data = request.get_json()
+        if not data or not data.get('code'):
+            return jsonify({'error': 'Code is required'}), 400
+        
+        problem_id = data.get('problem_id')
+        if not problem_id and data.get('session_id') in active_sessions:
+            problem_id = active_sessions[data['session_id']].problem_id
+        if not problem_id:
+            return jsonify({'error': 'Problem ID or an active session ID is required'}), 400
+        
+        problem_data = extractor.search_problem(problem_id)
+        if not problem_data:
+            return jsonify({'error': 'Problem not found'}), 404
+        
+        if data.get('tests'):
+            if not isinstance(data['tests'], list) or not all(isinstance(test, dict) for test in data['tests']):
+                return jsonify({'error': "'tests' must be a list of {input, output} objects"}), 400
+            # Custom tests replace the samples but keep the problem's limits
+            problem_data = dict(problem_data,
+                                sample_inputs=[str(test.get('input', '')) for test in data['tests']],
+                                sample_outputs=[str(test.get('output', '')) for test in data['tests']])
+        
+        try:
+            report = judge.judge_problem(data['code'], problem_data)
+        except JudgeError as e:
+            return jsonify({'error': str(e)}), 400
+        except SandboxError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        report['problem_id'] = problem_data['problem_id']
+        return jsonify(report)
+        
+    except Exception as e:
+        print(f"Error in judge_solution: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/analyze-code', methods=['POST'])
+@log_api_call
+@llm_rate_limited
+def analyze_code():
+    """AI review of student code; repeats are cached and small edits are reviewed as a diff"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('code'):
+            return jsonify({'error': 'Code is required'}), 400
+        
+        session_id = data.get('session_id')
+        problem_id = data.get('problem_id')
+        if not problem_id and session_id in active_sessions:
+            problem_id = active_sessions[session_id].problem_id
+        if not problem_id:
+            return jsonify({'error': 'Problem ID or an active session ID is required'}), 400
+        
+        problem_data = extractor.search_problem(problem_id)
+        if not problem_data:
+            return jsonify({'error': 'Problem not found'}), 404
+        problem_id = problem_data['problem_id']
+        code = data['code']
+        
+        def cacheable(analysis):
+            # Failed model calls come back as fallback text; never cache those
+            return analysis, analysis not in (API_ERROR_MESSAGE, API_QUOTA_MESSAGE)
+        
+        api_key = user_api_key(request.headers)
+        
+        # Only cache misses reach the model, so only they wait for a scheduler slot
+        def full_review():
+            with llm_slot():
+                return cacheable(ai_tutor.analyze_student_code(code, problem_data, api_key=api_key))
+        
+        def incremental_review(diff, previous):
+            with llm_slot():
+                return cacheable(ai_tutor.review_code_change(diff, previous, problem_data, api_key=api_key))
+        
+        started = time.perf_counter()
+        result = analysis_cache.analyze(
+            problem_id, code,
+            owner=session_id or data.get('conversation_id'),
+            full_review=full_review,
+            incremental_review=incremental_review)
+        
+        result['problem_id'] = problem_id
+        result['took_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return jsonify(result)
+        
+    except Exception as e:
+        print(f"Error in analyze_code: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/stress-test', methods=['POST'])
+@log_api_call
+@llm_rate_limited
+def stress_test():
+    """Run student code against a reference solution on generated inputs until they disagree"""
+    try:
+        unavailable = judge_unavailable()
+        if unavailable:
+            return unavailable
+        
+        data = request.get_json()
+        if not data or not data.get('code') or not data.get('generator'):
+            return jsonify({'error': 'Code and a generator script are required'}), 400
+        
+        problem_id = data.get('problem_id')
+        if not problem_id and data.get('session_id') in active_sessions:
+            problem_id = active_sessions[data['session_id']].problem_id
+        if not problem_id:
+            return jsonify({'error': 'Problem ID or an active session ID is required'}), 400
+        
+        problem_data = extractor.search_problem(problem_id)
+        if not problem_data:
+            return jsonify({'error': 'Problem not found'}), 404
+        
+        try:
+            cases = int(data.get('cases', 1000))
+        except (TypeError, ValueError):
+            return jsonify({'error': "'cases' must be an integer"}), 400
+        
+        try:
+            report = stress_tester.run(
+                data['code'], problem_data, data['generator'],
+                language=data.get('generator_language', 'python'),
+                cases=cases,
+                reference_code=data.get('reference_code'))
+        except StressBusy as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        except JudgeError as e:
+            return jsonify({'error': str(e)}), 400
+        except SandboxError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        # The smallest failing input goes straight into the code review prompt
+        if data.get('analyze') and report.get('counterexample'):
+            with llm_slot():
+                report['analysis'] = ai_tutor.analyze_student_code(
+                    data['code'], problem_data, counterexample=report['counterexample'],
+                    api_key=user_api_key(request.headers))
+        
+        report['problem_id'] = problem_data['problem_id']
+        return jsonify(report)
+        
+    except Exception as e:
+        print(f"Error in stress_test: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+def _not_modified(etag):
+    """Empty 304 response for a history page the client already has"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/rate-limit', methods=['GET'])
+def rate_limit_status():
+    """The caller's remaining request and token budget"""
+    try:
+        identity, shared_key = client_identity(request.headers, request.remote_addr)
+        status = rate_limiter.remaining(identity)
+        if not shared_key:
+            status.pop('shared_tokens', None)  # their own key doesn't draw on the shared quota
+        status['stats'] = dict(rate_limiter.stats)
+        return jsonify(status)
+    except Exception as e:
+        print(f"Error in rate_limit_status: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({
+    """Health check endpoint; ?verbose=1 adds service state and startup timings"""
+    # Counting sessions would load storage; a health check never builds a lazy service
+    health = {
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'active_sessions': len(active_sessions),
-        'active_conversations': len(conversations)
-    })
+        'active_sessions': len(active_sessions) if registry.loaded else None,
+        'active_conversations': len(conversations) if registry.loaded else None
+    }
+    if request.args.get('verbose', '').lower() in ('1', 'true', 'yes'):
+        health['services'] = {name: service.loaded for name, service in SERVICES.items()}
+        health['startup'] = startup.to_dict()
+        health['llm_scheduler'] = llm_scheduler.stats()
+        if ai_tutor.loaded:
+            health['llm_resilience'] = ai_tutor.resilience.stats()
+            health['model_routes'] = ai_tutor.router.stats()
+        health['welcome_messages'] = dict(welcome_messages.stats)
+        health['judge'] = dict(judge.stats, enabled=judge.enabled, sandbox=judge.sandbox.describe())
+    return jsonify(health)
 
 @app.errorhandler(404)
 def not_found(error):
@@ -588,7 +1082,7 @@ def internal_error(error):
 
 if __name__ == '__main__':
     port = int(os.getenv('FLASK_PORT', 5000))
-    debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     
     print(f"Starting Codeforces AI Tutor server on port {port}")
     print(f"Debug mode: {debug}")
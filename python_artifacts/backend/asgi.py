@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+ASGI entry point for the Codeforces AI Tutor.
+
+/api/chat is served natively: the SSE stream is an async generator over the
+async Gemini stream, so an open chat costs a coroutine instead of an OS
+thread and one event loop can hold thousands of streams. Its blocking steps
+(rate limiting, session lookup and storage writes) run on Starlette's
+thread pool so they never stall the loop. Every other route is the
+unchanged Flask app, run on a small thread pool through a WSGI
+adapter. Run it with:
+
+    uvicorn backend.asgi:app
+
+Sessions live in process memory, so keep a single worker process (the
+default) unless sessions are moved to shared storage.
+"""
+
+import os
+import traceback
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from backend.app import (ChatRequestError, admit_llm_request, ai_tutor, app as flask_app, begin_chat, finish_chat,
+                         llm_scheduler, rate_limit_payload, sse_event, user_api_key)
+from backend.llm_scheduler import INTERACTIVE
+from backend.rate_limit import retry_after_header
+
+DEFAULT_WSGI_THREADS = 16
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop reverse proxies from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+async def chat(request: Request):
+    """Handle chat messages in a tutoring session with async streaming"""
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+
+        decision = await run_in_threadpool(admit_llm_request, 'chat', data, request.headers,
+                                           request.client.host if request.client else None)
+        if not decision['allowed']:
+            return JSONResponse(rate_limit_payload(decision), status_code=429,
+                                headers={'Retry-After': retry_after_header(decision['retry_after'])})
+
+        try:
+            turn = await run_in_threadpool(begin_chat, data, api_key=user_api_key(request.headers))
+        except ChatRequestError as e:
+            return JSONResponse({'error': str(e)}, status_code=e.status)
+
+        async def generate():
+            full_response = ""
+            try:
+                # Queued chats wait on the event loop, not on a thread
+                async with llm_scheduler.slot_async(INTERACTIVE, decision['caller'], decision['tokens']):
+                    async for chunk in ai_tutor.get_response_stream_async(**turn['model_args']):
+                        full_response += chunk
+                        yield sse_event({'chunk': chunk})
+
+                yield sse_event(await run_in_threadpool(finish_chat, turn, full_response))
+
+            except Exception as e:
+                print(f"Error in async streaming: {e}")
+                traceback.print_exc()
+                yield sse_event({'error': str(e)})
+
+        return StreamingResponse(generate(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+    except Exception as e:
+        print(f"Error in chat: {e}")
+        traceback.print_exc()
+        return JSONResponse({'error': f'Internal server error: {str(e)}'}, status_code=500)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat, methods=['POST']),
+        # Everything else: the Flask app, with its blocking handlers on worker threads
+        Mount('/', app=WSGIMiddleware(flask_app, workers=int(os.getenv('WSGI_THREADS', DEFAULT_WSGI_THREADS)))),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+)
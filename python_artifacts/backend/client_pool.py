@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Pool of Gemini model clients, one per API key.
+
+genai.configure() sets a process-wide key, so switching keys per request
+would race between threads. Instead every key gets its own client manager
+(the SDK's per-configuration client factory) and a GenerativeModel bound to
+the clients it makes; nothing global is touched. Models are kept in an LRU
+keyed by a hash of the key and the model name, so a user's later requests
+reuse their connection and each user's traffic counts against their own
+quota. All models of one key share its client manager.
+
+The SDK has no public way to give a model its own key, so this relies on
+three private names: client._ClientManager, and a GenerativeModel's _client
+and _async_client. They are only touched in _bind, and checked once
+against TESTED_SDK_VERSIONS. With any other SDK the pool warns at start-up
+and falls back to genai.configure() with the server's key. Calls with the
+server's key keep working, and calls with a user's own key fail with
+ClientPoolUnsupported.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_POOL_SIZE = 64
+# google-generativeai releases whose private client hooks the pool was checked against
+TESTED_SDK_VERSIONS = ((0, 7), (0, 8))
+
+
+class ClientPoolUnsupported(RuntimeError):
+    """Raised for a user's own key when the installed SDK can't give models their own keys"""
+
+
+def key_hash(api_key: str) -> str:
+    """Stable identifier of a key that is safe to log and to use as a dict key"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def sdk_hooks_problem() -> Optional[str]:
+    """Why per-key models can't be made with the installed SDK, or None if they can"""
+    import google.generativeai as genai
+
+    version = getattr(genai, '__version__', '')
+    try:
+        release = tuple(int(part) for part in version.split('.')[:2])
+    except ValueError:
+        release = ()
+    if release not in TESTED_SDK_VERSIONS:
+        tested = ', '.join('.'.join(map(str, tested)) for tested in TESTED_SDK_VERSIONS)
+        return f"google-generativeai {version or '(unknown version)'} is untested (tested: {tested})"
+    try:
+        from google.generativeai.client import _ClientManager
+    except ImportError:
+        return f"google-generativeai {version} has no client._ClientManager"
+    if not all(hasattr(_ClientManager, name) for name in ('configure', 'get_default_client')):
+        return f"google-generativeai {version} changed client._ClientManager"
+    model = genai.GenerativeModel('probe')  # no request is made until generate_content
+    missing = [name for name in ('_client', '_async_client') if not hasattr(model, name)]
+    if missing:
+        return f"google-generativeai {version} GenerativeModel has no {', '.join(missing)}"
+    return None
+
+
+class GeminiClientPool:
+    """LRU of GenerativeModel instances, each configured with its own API key and model name"""
+
+    def __init__(self, model_name: str, server_key: Optional[str] = None, max_clients: Optional[int] = None):
+        self.model_name = model_name
+        self.server_key = server_key
+        self.max_clients = max_clients or int(os.getenv('GEMINI_CLIENT_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self._models: "OrderedDict[tuple, object]" = OrderedDict()
+        self._managers = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'created': 0, 'evicted': 0}
+        self.unsupported = sdk_hooks_problem()
+        if self.unsupported:
+            print(f"Warning: {self.unsupported}; per-user API keys are disabled, "
+                  f"only the server's key is used (install google-generativeai==0.7.2)")
+            if server_key:
+                import google.generativeai as genai
+                genai.configure(api_key=server_key)
+
+    def _create(self, api_key: str, digest: str, model_name: str):
+        import google.generativeai as genai
+
+        if self.unsupported:
+            if api_key != self.server_key:
+                raise ClientPoolUnsupported(f"Per-user API keys are unavailable: {self.unsupported}")
+            return genai.GenerativeModel(model_name)  # the global configuration holds the server's key
+        model = genai.GenerativeModel(model_name)
+        self._bind(model, api_key, digest)
+        return model
+
+    def _bind(self, model, api_key: str, digest: str, for_async: bool = False):
+        """Point a model at the clients of its key's own manager; the only use of SDK internals"""
+        from google.generativeai.client import _ClientManager
+
+        manager = self._managers.get(digest)
+        if manager is None:
+            manager = self._managers[digest] = _ClientManager()
+            manager.configure(api_key=api_key)
+        # The model falls back to the global default clients when these are unset
+        if for_async:
+            # Async clients attach to the running event loop, so they are made on first async use
+            if model._async_client is None:
+                model._async_client = manager.get_default_client('generative_async')
+        else:
+            model._client = manager.get_default_client('generative')
+
+    def model_for(self, api_key: str, for_async: bool = False, model_name: Optional[str] = None):
+        """The model `model_name` (default: the pool's) bound to `api_key`; pass for_async=True from coroutines"""
+        digest = key_hash(api_key)
+        entry = (digest, model_name or self.model_name)
+        with self._lock:
+            model = self._models.get(entry)
+            if model is not None:
+                self._models.move_to_end(entry)
+                self.stats['hits'] += 1
+            else:
+                model = self._models[entry] = self._create(api_key, *entry)
+                self.stats['created'] += 1
+                while len(self._models) > self.max_clients:
+                    # In-flight calls keep their own reference to an evicted model
+                    (evicted, _), _ = self._models.popitem(last=False)
+                    if not any(other == evicted for other, _ in self._models):
+                        self._managers.pop(evicted, None)
+                    self.stats['evicted'] += 1
+
+            if for_async and not self.unsupported:
+                self._bind(model, api_key, digest, for_async=True)
+        return model
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._models)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""
+Cache for AI code reviews.
+
+Analyses are keyed by (problem_id, hash of the normalized code), where
+normalization drops blank lines and trailing whitespace, plus comments in
+C, C++ and Java sources (elsewhere `//` or `/*` may be code, like Python's
+integer division), so resubmitting the same program (or one that only
+differs in comments or formatting) is answered from memory. For each
+student the last analyzed version is remembered; a new version that
+changes only part of the code is reviewed from a unified diff plus the
+previous analysis instead of from scratch.
+
+Only full reviews go into the shared cache. An incremental review is
+written against one student's previous version and analysis, so it is
+kept with that student's last version only.
+"""
+
+import difflib
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CACHE_SIZE = 512
+# Above this share of changed lines a diff is no cheaper than a full review
+MAX_DIFF_RATIO = 0.5
+DIFF_CONTEXT_LINES = 3
+
+# String literals are matched first so comment markers inside them survive
+_COMMENT_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|//[^\n]*|/\*.*?\*/', re.DOTALL)
+# Constructs only C, C++ and Java programs have; anything else keeps its comments
+_C_FAMILY_RE = re.compile(r'^\s*#\s*(?:include|define)\b|\bint\s+main\s*\(|\bstd::|\busing\s+namespace\b'
+                          r'|\bpublic\s+static\s+void\s+main\b|^\s*import\s+java\.', re.MULTILINE)
+
+
+def is_c_family(code: str) -> bool:
+    """Whether `code` looks like C, C++ or Java, where // and /* */ are comments"""
+    return bool(_C_FAMILY_RE.search(code))
+
+
+def normalize_code(code: str) -> str:
+    """Code with trailing whitespace, blank lines, line-ending differences and (C-family only) comments removed"""
+    code = code.replace('\r\n', '\n').replace('\r', '\n')
+    if is_c_family(code):
+        code = _COMMENT_RE.sub(lambda match: match.group(1) or '', code)
+    lines = [line.rstrip() for line in code.split('\n')]
+    return '\n'.join(line for line in lines if line.strip())
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+
+def code_diff(old_code: str, new_code: str) -> Tuple[str, float]:
+    """Unified diff of two normalized versions and the share of lines it touches"""
+    old_lines = normalize_code(old_code).split('\n')
+    new_lines = normalize_code(new_code).split('\n')
+    diff = list(difflib.unified_diff(old_lines, new_lines, 'previous', 'current',
+                                     n=DIFF_CONTEXT_LINES, lineterm=''))
+    changed = sum(1 for line in diff
+                  if line[:1] in '+-' and not line.startswith(('+++', '---')))
+    ratio = changed / max(len(old_lines) + len(new_lines), 1)
+    return '\n'.join(diff), ratio
+
+
+class CodeAnalysisCache:
+    """LRU of full analyses by (problem, code hash), plus each student's last analyzed version"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv('CODE_ANALYSIS_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+        self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._latest: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'full': 0, 'incremental': 0}
+
+    def get(self, problem_id: str, digest: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get((problem_id, digest))
+            if entry is not None:
+                self._entries.move_to_end((problem_id, digest))
+            return entry
+
+    def put(self, problem_id: str, digest: str, code: str, analysis: str):
+        with self._lock:
+            self._entries[(problem_id, digest)] = {'code': code, 'analysis': analysis, 'created_at': time.time()}
+            self._entries.move_to_end((problem_id, digest))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def previous(self, owner: str, problem_id: str) -> Optional[Dict]:
+        """The owner's last analyzed version of this problem: {'code_hash', 'code', 'analysis'}"""
+        with self._lock:
+            return self._latest.get((owner, problem_id))
+
+    def remember(self, owner: Optional[str], problem_id: str, digest: str, code: str, analysis: str):
+        if not owner:
+            return
+        with self._lock:
+            self._latest[(owner, problem_id)] = {'code_hash': digest, 'code': code, 'analysis': analysis}
+            self._latest.move_to_end((owner, problem_id))
+            while len(self._latest) > self.max_entries:
+                self._latest.popitem(last=False)
+
+    def analyze(self, problem_id: str, code: str, owner: Optional[str], full_review, incremental_review) -> Dict:
+        """
+        Cached analysis of `code`. On a miss, `incremental_review(diff, previous_analysis)`
+        is used when the owner's previous version is close enough, else `full_review()`.
+        Either returns (analysis, cacheable). Without an owner every miss is a full review.
+        Incremental analyses are only ever returned to their owner.
+        """
+        digest = code_hash(code)
+        key = (problem_id, digest)
+        while True:
+            entry = self.get(problem_id, digest)
+            if entry is not None:
+                self.stats['hits'] += 1
+                self.remember(owner, problem_id, digest, code, entry['analysis'])
+                return {'analysis': entry['analysis'], 'mode': 'cached', 'code_hash': digest}
+            own = self.previous(owner, problem_id) if owner else None
+            if own is not None and own['code_hash'] == digest:
+                self.stats['hits'] += 1
+                return {'analysis': own['analysis'], 'mode': 'cached', 'code_hash': digest}
+            with self._lock:
+                waiting = self._in_flight.get(key)
+                if waiting is None:
+                    self._in_flight[key] = threading.Event()
+                    break
+            # The same code is already being reviewed; wait for it instead of paying twice
+            waiting.wait()
+
+        try:
+            previous = self.previous(owner, problem_id) if owner else None
+            diff, ratio = code_diff(previous['code'], code) if previous else ('', 1.0)
+            if previous and ratio <= MAX_DIFF_RATIO:
+                analysis, cacheable = incremental_review(diff, previous['analysis'])
+                mode = 'incremental'
+            else:
+                analysis, cacheable = full_review()
+                mode = 'full'
+            self.stats[mode] += 1
+            if cacheable:
+                if mode == 'full':
+                    self.put(problem_id, digest, code, analysis)
+                self.remember(owner, problem_id, digest, code, analysis)
+            result = {'analysis': analysis, 'mode': mode, 'code_hash': digest}
+            if mode == 'incremental':
+                result['diff_lines'] = diff.count('\n') + 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key).set()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for Gemini, selected with LLM_PROVIDER=fake.
+
+It answers every prompt with canned text, streamed in chunks, after a
+configurable time to first token, and can fail a share of calls with the
+same exception types the real SDK raises. That makes load tests, the
+scheduler, rate limits and the resilience layer exercisable without an API
+key or network access:
+
+    FAKE_LLM_TTFT_MS         time to the first chunk (default 200)
+    FAKE_LLM_TTFT_JITTER_MS  extra random delay, for a latency tail (default 100)
+    FAKE_LLM_CHUNK_MS        delay between chunks (default 20)
+    FAKE_LLM_ERROR_RATE      share of calls failing with 503 before the first chunk (default 0)
+    FAKE_LLM_SLOW_RATE       share of calls whose first chunk takes 10x longer (default 0)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import List, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+FAKE_REPLY = ("This is a placeholder reply from the local fake model. "
+              "Think about which constraints bound the answer, then try a greedy approach "
+              "and check it against the samples.")
+CHUNK_WORDS = 4
+
+
+class FakeChunk:
+    """The part of a Gemini response object the tutor reads"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Mimics GenerativeModel.generate_content(_async), streaming or not"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.ttft = float(os.getenv('FAKE_LLM_TTFT_MS', 200)) / 1000
+        self.jitter = float(os.getenv('FAKE_LLM_TTFT_JITTER_MS', 100)) / 1000
+        self.chunk_delay = float(os.getenv('FAKE_LLM_CHUNK_MS', 20)) / 1000
+        self.error_rate = float(os.getenv('FAKE_LLM_ERROR_RATE', 0))
+        self.slow_rate = float(os.getenv('FAKE_LLM_SLOW_RATE', 0))
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _plan(self):
+        """First-chunk delay of one call, or the error it fails with"""
+        with self._lock:
+            self.calls += 1
+            roll, slow_roll, jitter = self._random.random(), self._random.random(), self._random.random()
+        delay = self.ttft + jitter * self.jitter
+        if slow_roll < self.slow_rate:
+            delay *= 10
+        error = google_exceptions.ServiceUnavailable('fake model overloaded') if roll < self.error_rate else None
+        return delay, error
+
+    def _chunks(self) -> List[str]:
+        words = FAKE_REPLY.split(' ')
+        return [' '.join(words[i:i + CHUNK_WORDS]) + ' ' for i in range(0, len(words), CHUNK_WORDS)]
+
+    def generate_content(self, prompt, stream: bool = False):
+        delay, error = self._plan()
+        if not stream:
+            time.sleep(delay)
+            if error:
+                raise error
+            return FakeChunk(FAKE_REPLY)
+
+        def chunks():
+            time.sleep(delay)
+            if error:
+                raise error
+            for i, text in enumerate(self._chunks()):
+                if i:
+                    time.sleep(self.chunk_delay)
+                yield FakeChunk(text)
+        return chunks()
+
+    async def generate_content_async(self, prompt, stream: bool = False):
+        delay, error = self._plan()
+        if not stream:
+            await asyncio.sleep(delay)
+            if error:
+                raise error
+            return FakeChunk(FAKE_REPLY)
+
+        async def chunks():
+            await asyncio.sleep(delay)
+            if error:
+                raise error
+            for i, text in enumerate(self._chunks()):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                yield FakeChunk(text)
+        return chunks()
+
+
+class FakeClientPool:
+    """Same interface as GeminiClientPool; every key shares one fake model per model name"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.models = {model_name: FakeGenerativeModel(model_name)}
+        self.stats = {'hits': 0, 'created': 1, 'evicted': 0}
+
+    def model_for(self, api_key: str, for_async: bool = False, model_name: Optional[str] = None):
+        model_name = model_name or self.model_name
+        if model_name not in self.models:
+            self.models.setdefault(model_name, FakeGenerativeModel(model_name))
+        return self.models[model_name]
+
+    def __len__(self) -> int:
+        return len(self.models)
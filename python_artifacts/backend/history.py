@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Cursor pagination and delta sync for the history endpoints.
+
+Every message in a history list has a sequence number (``seq``) that never
+changes once the message is appended. Clients page backwards with
+``limit``/``before`` and catch up with ``since``, so a refresh only transfers
+the messages it has not seen yet.
+"""
+
+import bisect
+import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Hard cap on a single page so one request can't serialize an entire huge log
+MAX_PAGE_SIZE = 500
+
+
+class HistoryQueryError(ValueError):
+    """Raised when history cursor parameters are malformed"""
+
+
+def _parse_int_arg(args, name: str) -> Optional[int]:
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise HistoryQueryError(f"'{name}' must be an integer")
+    if number < 0:
+        raise HistoryQueryError(f"'{name}' must not be negative")
+    return number
+
+
+def parse_history_query(args) -> Dict[str, Optional[int]]:
+    """Read limit/before/since cursors from request query args"""
+    query = {
+        'limit': _parse_int_arg(args, 'limit'),
+        'before': _parse_int_arg(args, 'before'),
+        'since': _parse_int_arg(args, 'since'),
+    }
+
+    if query['before'] is not None and query['since'] is not None:
+        raise HistoryQueryError("'before' and 'since' cannot be combined")
+
+    if query['limit'] is not None:
+        query['limit'] = min(max(query['limit'], 1), MAX_PAGE_SIZE)
+
+    return query
+
+
+def select_history(messages: Sequence[Dict], seqs: Optional[Sequence[int]] = None,
+                   limit: Optional[int] = None, before: Optional[int] = None,
+                   since: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Select the page of messages a client asked for.
+
+    ``seqs`` holds the sequence number of each message in ``messages`` (in
+    ascending order); when omitted, the 1-based list position is used.
+    Only the selected messages are copied, so the cost is proportional to
+    the page size rather than to the length of the history.
+    """
+    total = len(messages)
+    if seqs is None:
+        seq_at = lambda i: i + 1
+        position_after = lambda seq: min(max(seq, 0), total)
+        position_before = lambda seq: min(max(seq - 1, 0), total)
+    else:
+        seq_at = seqs.__getitem__
+        # seqs may be a live list that grew past len(messages), so clamp the search
+        position_after = lambda seq: bisect.bisect_right(seqs, seq, 0, total)
+        position_before = lambda seq: bisect.bisect_left(seqs, seq, 0, total)
+
+    if since is not None:
+        # Delta mode: oldest unseen messages first, so clients can keep calling until has_more is false
+        start = position_after(since)
+        end = total if limit is None else min(total, start + limit)
+        has_more = end < total
+    else:
+        end = total if before is None else position_before(before)
+        start = 0 if limit is None else max(0, end - limit)
+        has_more = start > 0
+
+    page = []
+    for i in range(start, end):
+        entry = dict(messages[i])
+        entry['seq'] = seq_at(i)
+        page.append(entry)
+
+    latest_seq = seq_at(total - 1) if total else 0
+    cursor = {
+        'latest_seq': latest_seq,
+        'total': total,
+        'has_more': has_more,
+        'next_before': page[0]['seq'] if page and since is None and has_more else None,
+        'next_since': page[-1]['seq'] if page else (since if since is not None else latest_seq),
+    }
+    return page, cursor
+
+
+def history_etag(kind: str, key: str, state: Sequence, query: Dict[str, Optional[int]]) -> str:
+    """
+    Build an ETag for one page of history.
+
+    ``state`` must change whenever the history changes (message count, last
+    update time, counters). It's cheap to compute, unlike hashing the body.
+    """
+    parts = [kind, key] + [str(item) for item in state]
+    parts += [f"{name}={query.get(name)}" for name in ('limit', 'before', 'since')]
+    digest = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+    return digest
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+
+"""
+Local sample-test judge for C++ solutions.
+
+Sources are compiled once: binaries are cached on disk under the SHA-256 of
+the source and compiler command, so re-judging the same code skips g++
+entirely. At most JUDGE_COMPILE_CONCURRENCY compilers run at a time, and
+the cache keeps the JUDGE_CACHE_ENTRIES most recently used files. Every
+sample runs as its own child process in parallel, in an empty scratch
+directory, with CPU time, address space and output size limits derived
+from the problem's time and memory limits. Output is compared token by
+token, with a small tolerance for floating-point tokens.
+
+The compiler and the programs run in the sandbox of backend.sandbox (no
+network, read-only filesystem, unprivileged user). The /api/judge and
+/api/stress-test endpoints are off unless JUDGE_ENABLED=1.
+"""
+
+import hashlib
+import math
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.sandbox import SANDBOX_ENV, Sandbox
+
+DEFAULT_CACHE_DIR = "judge_cache"
+DEFAULT_COMPILER = "g++ -std=c++17 -O2 -pipe"
+DEFAULT_TIME_LIMIT = 2.0  # seconds
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024  # bytes
+COMPILE_TIMEOUT = 60.0
+COMPILE_OUTPUT_LIMIT = 256 * 1024 * 1024  # bytes of object files and binary
+DEFAULT_CACHE_ENTRIES = 1000
+COMPILE_LOCK_STRIPES = 64
+OUTPUT_LIMIT = 16 * 1024 * 1024  # bytes a solution may write
+SHOWN_OUTPUT_CHARS = 2000
+FLOAT_TOLERANCE = 1e-6
+
+# Verdict names follow the Codeforces API
+OK = 'OK'
+WRONG_ANSWER = 'WRONG_ANSWER'
+TIME_LIMIT_EXCEEDED = 'TIME_LIMIT_EXCEEDED'
+MEMORY_LIMIT_EXCEEDED = 'MEMORY_LIMIT_EXCEEDED'
+RUNTIME_ERROR = 'RUNTIME_ERROR'
+COMPILATION_ERROR = 'COMPILATION_ERROR'
+
+
+class JudgeError(ValueError):
+    """Raised when a judge request can't be run at all (no code, no tests)"""
+
+
+def parse_time_limit(text: str) -> float:
+    """Seconds from a statement limit like '2 seconds' or '1.5 s'"""
+    match = re.search(r'(\d+(?:\.\d+)?)', text or '')
+    return float(match.group(1)) if match else DEFAULT_TIME_LIMIT
+
+
+def parse_memory_limit(text: str) -> int:
+    """Bytes from a statement limit like '256 megabytes'"""
+    match = re.search(r'(\d+(?:\.\d+)?)\s*(\w*)', text or '')
+    if not match:
+        return DEFAULT_MEMORY_LIMIT
+    value, unit = float(match.group(1)), match.group(2).lower()
+    if unit.startswith('g'):
+        return int(value * 1024 ** 3)
+    if unit.startswith('k'):
+        return int(value * 1024)
+    return int(value * 1024 ** 2)
+
+
+def _tokens_equal(expected: str, actual: str) -> bool:
+    if expected == actual:
+        return True
+    if '.' not in expected and '.' not in actual:
+        return False
+    try:
+        a, b = float(expected), float(actual)
+    except ValueError:
+        return False
+    return abs(a - b) <= FLOAT_TOLERANCE * max(1.0, abs(a))
+
+
+def check_tokens(expected: str, actual: str) -> Tuple[bool, str]:
+    """Whitespace-insensitive token comparison; returns (ok, reason)"""
+    expected_tokens = expected.split()
+    actual_tokens = actual.split()
+    for i, (want, got) in enumerate(zip(expected_tokens, actual_tokens), 1):
+        if not _tokens_equal(want, got):
+            return False, f"token {i}: expected '{want[:50]}', found '{got[:50]}'"
+    if len(expected_tokens) != len(actual_tokens):
+        return False, f"expected {len(expected_tokens)} tokens, found {len(actual_tokens)}"
+    return True, ''
+
+
+def run_failure(run: Dict, time_limit: float, memory_limit: int) -> Optional[str]:
+    """Verdict for a run that didn't finish normally, or None if it exited with status 0"""
+    returncode = run['returncode']
+    if run['timed_out'] or run['cpu'] > time_limit or returncode in (-9, -24):  # SIGKILL/SIGXCPU
+        return TIME_LIMIT_EXCEEDED
+    if returncode != 0:
+        # Allocation failures under RLIMIT_AS surface as std::bad_alloc aborts
+        stderr = run['stderr']
+        if 'bad_alloc' in stderr or 'Cannot allocate memory' in stderr or run['max_rss'] >= memory_limit * 0.95:
+            return MEMORY_LIMIT_EXCEEDED
+        return RUNTIME_ERROR
+    return None
+
+
+class LocalJudge:
+    """Compiles C++ with a content-addressed binary cache and runs samples in parallel"""
+
+    def __init__(self, cache_dir: Optional[str] = None, compiler: Optional[str] = None,
+                 workers: Optional[int] = None, sandbox: Optional[Sandbox] = None):
+        self.enabled = os.getenv('JUDGE_ENABLED', '0') != '0'
+        self.cache_dir = cache_dir or os.getenv('JUDGE_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.compiler = shlex.split(compiler or os.getenv('JUDGE_COMPILER', DEFAULT_COMPILER))
+        self.workers = workers or int(os.getenv('JUDGE_WORKERS', 0)) or max(2, os.cpu_count() or 1)
+        self.max_cache_entries = int(os.getenv('JUDGE_CACHE_ENTRIES', 0)) or DEFAULT_CACHE_ENTRIES
+        self.sandbox = sandbox or Sandbox()
+        # Each sample is its own child process; these threads only feed and reap them
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='judge')
+        # Same-source compiles share a lock stripe, so the lock table never grows
+        self._compile_locks = [threading.Lock() for _ in range(COMPILE_LOCK_STRIPES)]
+        self._compile_slots = threading.BoundedSemaphore(
+            int(os.getenv('JUDGE_COMPILE_CONCURRENCY', 0)) or max(1, (os.cpu_count() or 2) // 2))
+        self._trim_lock = threading.Lock()
+        self.stats = {'compiles': 0, 'cache_hits': 0, 'runs': 0, 'evicted': 0}
+
+    def _digest(self, code: str) -> str:
+        key = ' '.join(self.compiler) + '\0' + code
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _compile_lock(self, digest: str) -> threading.Lock:
+        return self._compile_locks[int(digest[:8], 16) % COMPILE_LOCK_STRIPES]
+
+    @staticmethod
+    def touch(path: str):
+        """Mark a cache file as just used, so trim_cache keeps it"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def trim_cache(self):
+        """Delete the least recently used cache files beyond max_cache_entries"""
+        with self._trim_lock:
+            entries = []
+            try:
+                for entry in os.scandir(self.cache_dir):
+                    if entry.is_file():
+                        entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                return
+            excess = len(entries) - self.max_cache_entries
+            if excess <= 0:
+                return
+            for _, path in sorted(entries)[:excess]:
+                try:
+                    os.remove(path)
+                    self.stats['evicted'] += 1
+                except OSError:
+                    pass
+
+    def compile(self, code: str) -> Dict:
+        """Binary path for a source (compiling only on a cache miss), or the compiler error"""
+        digest = self._digest(code)
+        binary = os.path.join(self.cache_dir, digest)
+        error_log = binary + '.ce'
+
+        # Concurrent requests for the same source wait for one compile instead of racing
+        with self._compile_lock(digest):
+            if os.path.exists(binary):
+                self.stats['cache_hits'] += 1
+                self.touch(binary)
+                return {'binary': binary, 'cached': True, 'compile_ms': 0.0}
+            if os.path.exists(error_log):
+                self.stats['cache_hits'] += 1
+                self.touch(error_log)
+                with open(error_log, 'r', encoding='utf-8') as f:
+                    return {'error': f.read(), 'cached': True, 'compile_ms': 0.0}
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Build next to the cache so the final rename never crosses filesystems
+            with tempfile.TemporaryDirectory(prefix='build-', dir=self.cache_dir) as build_dir:
+                source = os.path.join(build_dir, 'solution.cpp')
+                output = os.path.join(build_dir, 'solution')
+                with open(source, 'w', encoding='utf-8') as f:
+                    f.write(code)
+                command = self.sandbox.wrap(self.compiler + [source, '-o', output], build_dir,
+                                            cpu_seconds=int(COMPILE_TIMEOUT), file_bytes=COMPILE_OUTPUT_LIMIT)
+                with self._compile_slots:
+                    started = time.perf_counter()
+                    try:
+                        result = subprocess.run(command, capture_output=True, text=True, env=SANDBOX_ENV,
+                                                timeout=COMPILE_TIMEOUT, start_new_session=True)
+                    except subprocess.TimeoutExpired:
+                        return {'error': 'Compilation timed out', 'cached': False,
+                                'compile_ms': COMPILE_TIMEOUT * 1000}
+                compile_ms = round((time.perf_counter() - started) * 1000, 1)
+                self.stats['compiles'] += 1
+
+                if result.returncode != 0:
+                    message = result.stderr.replace(build_dir + os.sep, '')[-SHOWN_OUTPUT_CHARS:]
+                    with open(error_log, 'w', encoding='utf-8') as f:
+                        f.write(message)
+                    self.trim_cache()
+                    return {'error': message, 'cached': False, 'compile_ms': compile_ms}
+
+                os.replace(output, binary)
+            self.trim_cache()
+            return {'binary': binary, 'cached': False, 'compile_ms': compile_ms}
+
+    def _execute(self, command: List[str], test_input: str, time_limit: float, memory_limit: int,
+                 cwd: str, readable: Sequence[str] = ()) -> Dict:
+        """Run one sandboxed process; reports CPU time and peak memory from its own rusage where available"""
+        # Wall-clock cap well above the CPU limit so sleeping or blocked programs also stop
+        wall_limit = time_limit * 2 + 1
+        data = test_input.rstrip('\n') + '\n'
+        command = self.sandbox.wrap(command, cwd, readable, cpu_seconds=int(math.ceil(time_limit)),
+                                    memory_bytes=memory_limit, file_bytes=OUTPUT_LIMIT)
+        started = time.perf_counter()
+
+        if not hasattr(os, 'wait4'):
+            try:
+                result = subprocess.run(command, input=data, capture_output=True, text=True,
+                                        timeout=wall_limit, cwd=cwd, env=SANDBOX_ENV)
+                return {'stdout': result.stdout, 'stderr': result.stderr,
+                        'returncode': self.sandbox.exit_code(result.returncode),
+                        'timed_out': False, 'cpu': time.perf_counter() - started, 'max_rss': 0}
+            except subprocess.TimeoutExpired:
+                return {'stdout': '', 'stderr': '', 'returncode': None, 'timed_out': True,
+                        'cpu': wall_limit, 'max_rss': 0}
+
+        # A session of its own, so a timeout kills the sandbox and everything in it
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, cwd=cwd, env=SANDBOX_ENV,
+                                   start_new_session=True)
+        streams = {}
+
+        def pump(name, stream):
+            streams[name] = stream.read(OUTPUT_LIMIT + 1)
+            stream.close()
+
+        def feed():
+            try:
+                process.stdin.write(data.encode('utf-8'))
+            except (BrokenPipeError, OSError):
+                pass  # the program exited without reading all of its input
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            try:
+                os.killpg(process.pid, 9)
+            except OSError:
+                pass
+
+        helpers = [threading.Thread(target=pump, args=('stdout', process.stdout), daemon=True),
+                   threading.Thread(target=pump, args=('stderr', process.stderr), daemon=True),
+                   threading.Thread(target=feed, daemon=True)]
+        for helper in helpers:
+            helper.start()
+        timer = threading.Timer(wall_limit, kill)
+        timer.start()
+        # wait4 reaps this child only and returns its own rusage, unlike RUSAGE_CHILDREN
+        _, status, usage = os.wait4(process.pid, 0)
+        timer.cancel()
+        process.returncode = self.sandbox.exit_code(os.waitstatus_to_exitcode(status))
+        for helper in helpers:
+            helper.join()
+
+        return {
+            'stdout': streams.get('stdout', b'').decode('utf-8', 'replace'),
+            'stderr': streams.get('stderr', b'').decode('utf-8', 'replace'),
+            'returncode': process.returncode,
+            'timed_out': timed_out.is_set(),
+            'cpu': usage.ru_utime + usage.ru_stime,
+            'max_rss': usage.ru_maxrss * 1024,  # kilobytes on Linux
+        }
+
+    def execute(self, command: List[str], test_input: str, time_limit: float = DEFAULT_TIME_LIMIT,
+                memory_limit: int = DEFAULT_MEMORY_LIMIT, readable: Sequence[str] = ()) -> Dict:
+        """Run a program once in the sandbox, in a fresh scratch directory, under the judge's limits;
+        `readable` are further paths it may read"""
+        with tempfile.TemporaryDirectory(prefix='judge-run-') as scratch:
+            run = self._execute(command, test_input, time_limit, memory_limit, scratch, readable)
+        self.stats['runs'] += 1
+        return run
+
+    def _run_one(self, binary: str, index: int, test_input: str, expected: str,
+                 time_limit: float, memory_limit: int) -> Dict:
+        run = self.execute([os.path.abspath(binary)], test_input, time_limit, memory_limit)
+
+        # CPU time, not wall time, so samples running side by side don't slow each other into TLE
+        test = {'index': index, 'time_ms': round(run['cpu'] * 1000, 1),
+                'memory_kb': run['max_rss'] // 1024}
+        stdout = run['stdout']
+        failure = run_failure(run, time_limit, memory_limit)
+        if failure:
+            test['verdict'] = failure
+            if failure != TIME_LIMIT_EXCEEDED:
+                test['exit_code'] = run['returncode']
+                test['stderr'] = run['stderr'][-SHOWN_OUTPUT_CHARS:]
+        else:
+            ok, reason = check_tokens(expected, stdout)
+            test['verdict'] = OK if ok else WRONG_ANSWER
+            if not ok:
+                test['checker'] = reason
+
+        if test['verdict'] != OK:
+            test['input'] = test_input[:SHOWN_OUTPUT_CHARS]
+            test['expected'] = expected[:SHOWN_OUTPUT_CHARS]
+            test['output'] = stdout[:SHOWN_OUTPUT_CHARS]
+        return test
+
+    def judge(self, code: str, tests: Sequence[Tuple[str, str]],
+              time_limit: float = DEFAULT_TIME_LIMIT, memory_limit: int = DEFAULT_MEMORY_LIMIT) -> Dict:
+        """Compile (or reuse) a solution and run every (input, expected output) test in parallel"""
+        if not code or not code.strip():
+            raise JudgeError('No code to judge')
+        if not tests:
+            raise JudgeError('No tests to run')
+
+        started = time.perf_counter()
+        build = self.compile(code)
+        report = {
+            'compile_cached': build['cached'],
+            'compile_ms': build['compile_ms'],
+            'time_limit': time_limit,
+            'memory_limit_mb': memory_limit // (1024 * 1024),
+        }
+        if 'error' in build:
+            report.update({'verdict': COMPILATION_ERROR, 'compile_error': build['error'],
+                           'passed': 0, 'total': len(tests), 'tests': []})
+            report['took_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            return report
+
+        futures = [self._pool.submit(self._run_one, build['binary'], i, test_input, expected,
+                                     time_limit, memory_limit)
+                   for i, (test_input, expected) in enumerate(tests, 1)]
+        results: List[Dict] = [future.result() for future in futures]
+
+        failed = next((test for test in results if test['verdict'] != OK), None)
+        report.update({
+            'verdict': failed['verdict'] if failed else OK,
+            'passed': sum(1 for test in results if test['verdict'] == OK),
+            'total': len(results),
+            'tests': results,
+            'took_ms': round((time.perf_counter() - started) * 1000, 1),
+        })
+        return report
+
+    def judge_problem(self, code: str, problem_data: Dict) -> Dict:
+        """Judge a solution against a stored problem's samples and limits"""
+        tests = list(zip(problem_data.get('sample_inputs', []), problem_data.get('sample_outputs', [])))
+        return self.judge(code, tests,
+                          time_limit=parse_time_limit(problem_data.get('time_limit', '')),
+                          memory_limit=parse_memory_limit(problem_data.get('memory_limit', '')))
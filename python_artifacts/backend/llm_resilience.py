@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+
+"""
+Retries, hedged requests and a circuit breaker around model calls.
+
+- Retries: a call failing with a transient error (5xx, 429, timeouts,
+  dropped connections) is retried up to LLM_MAX_ATTEMPTS times with
+  exponential backoff and full jitter. A stream is only retried until its
+  first chunk; after that the reply is partly delivered and the error is
+  passed on.
+- Hedging: when a call has produced nothing after the p95 of recent times to
+  first token, a second identical request is started and whichever answers
+  first is used; the other is abandoned. Hedges are capped at LLM_HEDGE_BUDGET
+  of all calls so a slow upstream isn't sent twice the load.
+- Circuit breaker: after LLM_BREAKER_FAILURES consecutive upstream failures
+  calls fail immediately with CircuitOpenError for LLM_BREAKER_COOLDOWN
+  seconds, instead of each tying up a worker until it times out; then one
+  probe call decides whether to close it again.
+
+Errors that retrying can't fix (bad request, invalid key) pass through at
+once and don't count against the breaker, nor do 429s, which are one key's
+quota rather than upstream health.
+"""
+
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF_BASE = 0.5  # seconds before the first retry, at most
+DEFAULT_BACKOFF_CAP = 8.0
+DEFAULT_HEDGE_BUDGET = 0.1  # share of calls that may be hedged
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+HEDGE_MIN_SAMPLES = 20  # latency samples needed before hedging starts
+HEDGE_MIN_DELAY = 0.5  # never hedge sooner than this
+LATENCY_SAMPLES = 200
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+UPSTREAM_FAILURE_STATUS = {500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while the upstream is considered down"""
+
+
+def _status_of(error: BaseException) -> Optional[int]:
+    # google.api_core exceptions carry the HTTP status as `code`
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return _status_of(error) in RETRYABLE_STATUS
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return _status_of(error) in UPSTREAM_FAILURE_STATUS
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open (one probe) after a cooldown"""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = 'half-open'
+            if self.state == 'half-open' and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError('The AI service is temporarily unavailable')
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half-open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self):
+        """The probe ended in an error that says nothing about upstream health"""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyTracker:
+    """Recent times to first token, for the hedging threshold"""
+
+    def __init__(self):
+        self._samples = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]
+
+
+_DONE = object()
+
+
+class LLMResilience:
+    """Wraps model calls (plain, streaming, sync and async) with retries, hedging and a breaker"""
+
+    def __init__(self, max_attempts: Optional[int] = None, hedge_budget: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_attempts = max_attempts or int(os.getenv('LLM_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        self.hedge_budget = hedge_budget if hedge_budget is not None else \
+            float(os.getenv('LLM_HEDGE_BUDGET', DEFAULT_HEDGE_BUDGET))
+        self.backoff_base = float(os.getenv('LLM_BACKOFF_BASE', DEFAULT_BACKOFF_BASE))
+        self.breaker = breaker or CircuitBreaker(
+            int(os.getenv('LLM_BREAKER_FAILURES', DEFAULT_BREAKER_FAILURES)),
+            float(os.getenv('LLM_BREAKER_COOLDOWN', DEFAULT_BREAKER_COOLDOWN)))
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'attempts': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+                         'failures': 0, 'rejected_open': 0}
+
+    # --- bookkeeping -------------------------------------------------------
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when no hedge may be sent"""
+        if self.hedge_budget <= 0:
+            return None
+        p95 = self.latency.p95()
+        if p95 is None:
+            return None
+        with self._lock:
+            if self.counters['hedges'] >= self.hedge_budget * max(self.counters['calls'], 1):
+                return None
+        return max(p95, HEDGE_MIN_DELAY)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(DEFAULT_BACKOFF_CAP, self.backoff_base * 2 ** attempt))
+
+    def _admit(self):
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            self._count('rejected_open')
+            raise
+        self._count('attempts')
+
+    def _settle(self, error: Optional[BaseException]):
+        """Feed an attempt's outcome to the breaker"""
+        if error is None:
+            self.breaker.record_success()
+        elif is_upstream_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            self._count('failures')
+            return False
+        self._count('retries')
+        return True
+
+    # --- sync --------------------------------------------------------------
+
+    def _try_hedge(self) -> bool:
+        """Admit a hedge request; a breaker that refuses it just means no hedge"""
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            return False
+        self._count('attempts')
+        self._count('hedges')
+        return True
+
+    def _race(self, start: Callable[[], Iterator], first_only: bool) -> Iterator:
+        """
+        Run `start()` (an iterator factory) and, past the hedge delay, a second copy;
+        yields from whichever produces first. Attempts run on threads that feed a queue.
+        """
+        events = queue.Queue()
+        stop = [threading.Event(), threading.Event()]
+
+        def pump(index: int):
+            try:
+                for item in start():
+                    if stop[index].is_set():
+                        return
+                    events.put((index, item, None))
+                    if first_only:
+                        break
+                events.put((index, _DONE, None))
+            except BaseException as e:
+                events.put((index, None, e))
+
+        started = time.perf_counter()
+        threading.Thread(target=pump, args=(0,), daemon=True, name='llm-attempt').start()
+        running, winner, hedge_delay = 1, None, self._hedge_delay()
+        first_error = None
+        try:
+            while True:
+                timeout = None
+                if hedge_delay is not None and winner is None:
+                    timeout = max(hedge_delay - (time.perf_counter() - started), 0)
+                try:
+                    index, item, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    # Nothing yet after the usual worst case: send a second request
+                    if self._try_hedge():
+                        threading.Thread(target=pump, args=(1,), daemon=True, name='llm-hedge').start()
+                        running += 1
+                    hedge_delay = None
+                    continue
+
+                if winner is None:
+                    if error is not None:
+                        self._settle(error)
+                        running -= 1
+                        first_error = first_error or error
+                        if running == 0:
+                            raise first_error
+                        hedge_delay = None  # the other attempt may still succeed
+                        continue
+                    winner = index
+                    stop[1 - index].set()  # the loser stops at its next chunk
+                    self.latency.record(time.perf_counter() - started)
+                    self._settle(None)
+                    if index == 1:
+                        self._count('hedge_wins')
+                if index != winner:
+                    continue
+                if error is not None:
+                    raise error
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            # Also reached when the consumer closes the stream early
+            for event in stop:
+                event.set()
+
+    def call(self, fn: Callable[[], object]):
+        """Result of `fn()`, a blocking model call, retried and hedged"""
+        self._count('calls')
+        for attempt in range(self.max_attempts):
+            self._admit()
+            try:
+                if self._hedge_delay() is None:
+                    started = time.perf_counter()
+                    try:
+                        result = fn()
+                    except BaseException as e:
+                        self._settle(e)
+                        raise
+                    self.latency.record(time.perf_counter() - started)
+                    self._settle(None)
+                    return result
+                return next(self._race(lambda: iter([fn()]), first_only=True))
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    def stream(self, fn: Callable[[], Iterator]) -> Iterator:
+        """Chunks of the stream `fn()` opens; retried and hedged until the first chunk"""
+        self._count('calls')
+        for attempt in range(self.max_attempts):
+            self._admit()
+            delivered = False
+            try:
+                if self._hedge_delay() is None:
+                    chunks = self._direct(fn)
+                else:
+                    chunks = self._race(fn, first_only=False)
+                for chunk in chunks:
+                    delivered = True
+                    yield chunk
+                return
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if delivered or not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    def _direct(self, fn: Callable[[], Iterator]) -> Iterator:
+        """Consume a stream on the calling thread (no hedge possible, so no extra thread)"""
+        started = time.perf_counter()
+        first = True
+        try:
+            for chunk in fn():
+                if first:
+                    first = False
+                    self.latency.record(time.perf_counter() - started)
+                    self._settle(None)
+                yield chunk
+        except BaseException as e:
+            if first:
+                self._settle(e)
+            raise
+        if first:
+            self._settle(None)  # an empty reply is still a healthy upstream
+
+    # --- async -------------------------------------------------------------
+
+    async def stream_async(self, fn: Callable[[], object]) -> AsyncIterator:
+        """Async stream(): `fn()` is a coroutine returning an async iterator of chunks"""
+        self._count('calls')
+        for attempt in range(self.max_attempts):
+            self._admit()
+            delivered = False
+            try:
+                async for chunk in self._race_async(fn):
+                    delivered = True
+                    yield chunk
+                return
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if delivered or not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+
+    async def _race_async(self, fn: Callable[[], object]) -> AsyncIterator:
+        started = time.perf_counter()
+
+        async def first_chunk():
+            iterator = (await fn()).__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, _DONE
+
+        attempts = [asyncio.ensure_future(first_chunk())]
+        hedge_delay = self._hedge_delay()
+        winner = None
+        first_error = None
+        try:
+            while winner is None:
+                pending = [task for task in attempts if not task.done()]
+                if not pending:
+                    raise first_error
+                timeout = None
+                if hedge_delay is not None:
+                    timeout = max(hedge_delay - (time.perf_counter() - started), 0)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if self._try_hedge():
+                        attempts.append(asyncio.ensure_future(first_chunk()))
+                    hedge_delay = None
+                    continue
+                for task in done:
+                    error = task.exception()
+                    if error is not None:
+                        self._settle(error)
+                        first_error = first_error or error
+                    elif winner is None:
+                        winner = task
+                if first_error is not None:
+                    hedge_delay = None  # a failure is retried, not hedged
+        finally:
+            for task in attempts:
+                if task is not winner:
+                    task.cancel()
+
+        self.latency.record(time.perf_counter() - started)
+        self._settle(None)
+        if winner is not attempts[0]:
+            self._count('hedge_wins')
+        iterator, chunk = winner.result()
+        if chunk is _DONE:
+            return
+        yield chunk
+        async for chunk in iterator:
+            yield chunk
+
+    def stats(self) -> Dict:
+        with self._lock:
+            report = dict(self.counters)
+        p95 = self.latency.p95()
+        report['breaker'] = self.breaker.state
+        report['breaker_opened'] = self.breaker.times_opened
+        report['ttft_p95_ms'] = round(p95 * 1000, 1) if p95 is not None else None
+        return report
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""
+Priority scheduling of model calls.
+
+All Gemini calls share LLM_MAX_CONCURRENCY slots. Waiting calls are served
+by class first: interactive chat, then standard requests (hints, solutions,
+code reviews), then background work (welcome overviews). A queued background call is
+passed over whenever anything else is waiting, and background work may only
+occupy part of the slots, so a burst of it can't make chat wait for a slot
+to free up.
+
+Within a class, callers are served by start-time fair queuing: each call is
+tagged with its caller's virtual start time, advanced by the call's cost
+(estimated tokens), so a caller sending many or large requests can't crowd
+out the others. Time spent queued is recorded per class.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+
+INTERACTIVE = 'interactive'
+STANDARD = 'standard'
+BACKGROUND = 'background'
+CLASSES = (INTERACTIVE, STANDARD, BACKGROUND)  # highest priority first
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_BACKGROUND_SHARE = 0.5  # most of the slots background work may hold at once
+WAIT_SAMPLES = 1000  # recent queue waits kept per class for percentiles
+
+
+class _Waiter:
+    __slots__ = ('priority', 'user', 'enqueued', 'granted', 'cancelled', 'wake')
+
+    def __init__(self, priority: str, user: str, wake):
+        self.priority = priority
+        self.user = user
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.cancelled = False
+        self.wake = wake
+
+
+class _ClassQueue:
+    """Fair queue of one priority class"""
+
+    def __init__(self):
+        self.heap: List = []
+        self.queued = 0  # waiters in the heap that haven't given up
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.active = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.served = 0
+
+    def push(self, waiter: _Waiter, cost: float, seq: int):
+        start = max(self.virtual_time, self.last_finish.get(waiter.user, 0.0))
+        self.last_finish[waiter.user] = start + max(cost, 1.0)
+        heapq.heappush(self.heap, (start, seq, waiter))
+        self.queued += 1
+
+    def pop(self) -> Optional[_Waiter]:
+        while self.heap:
+            start, _, waiter = heapq.heappop(self.heap)
+            if waiter.cancelled:
+                continue
+            self.queued -= 1
+            self.virtual_time = max(self.virtual_time, start)
+            if len(self.last_finish) > 4 * (self.queued + 64):
+                # Callers whose last call finished before now have no claim left
+                self.last_finish = {user: finish for user, finish in self.last_finish.items()
+                                    if finish > self.virtual_time}
+            return waiter
+        return None
+
+    def cancel(self, waiter: _Waiter):
+        waiter.cancelled = True
+        self.queued -= 1
+
+
+class LLMScheduler:
+    """Grants model-call slots by priority class, fairly across callers within a class"""
+
+    def __init__(self, max_concurrency: Optional[int] = None, background_share: Optional[float] = None):
+        self.max_concurrency = max_concurrency if max_concurrency is not None else \
+            int(os.getenv('LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        share = background_share if background_share is not None else \
+            float(os.getenv('LLM_BACKGROUND_SHARE', DEFAULT_BACKGROUND_SHARE))
+        self.background_limit = max(1, int(self.max_concurrency * share))
+        self._queues = {priority: _ClassQueue() for priority in CLASSES}
+        self._active = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def _can_start(self, priority: str) -> bool:
+        if self._active >= self.max_concurrency:
+            return False
+        return priority != BACKGROUND or self._queues[BACKGROUND].active < self.background_limit
+
+    def _grant(self, waiter: _Waiter):
+        queue = self._queues[waiter.priority]
+        waiter.granted = True
+        queue.active += 1
+        queue.served += 1
+        queue.waits.append(time.perf_counter() - waiter.enqueued)
+        self._active += 1
+
+    def _dispatch(self):
+        """Hand free slots to the best waiters (caller holds the lock)"""
+        while self._active < self.max_concurrency:
+            for priority in CLASSES:
+                if self._can_start(priority):
+                    waiter = self._queues[priority].pop()
+                    if waiter is not None:
+                        self._grant(waiter)
+                        waiter.wake()
+                        break
+            else:
+                return
+
+    def _enqueue(self, priority: str, user: str, cost: float, wake) -> _Waiter:
+        """Queue a call, or grant it right away when a slot is free and nobody is ahead of it"""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        waiter = _Waiter(priority, user, wake)
+        with self._lock:
+            ahead = any(self._queues[other].queued for other in CLASSES[:CLASSES.index(priority) + 1])
+            if not ahead and self._can_start(priority):
+                self._grant(waiter)
+            else:
+                self._queues[priority].push(waiter, cost, next(self._seq))
+        return waiter
+
+    def release(self, priority: str):
+        with self._lock:
+            self._queues[priority].active -= 1
+            self._active -= 1
+            self._dispatch()
+
+    def _abandon(self, waiter: _Waiter):
+        """A waiter that gave up: free its slot if it was granted meanwhile, else drop it from the queue"""
+        with self._lock:
+            if not waiter.granted:
+                self._queues[waiter.priority].cancel(waiter)
+                return
+        self.release(waiter.priority)
+
+    @contextmanager
+    def slot(self, priority: str, user: str = '', cost: float = 1.0):
+        """Hold one model-call slot for the duration of the block"""
+        if not self.enabled:
+            yield
+            return
+        event = threading.Event()
+        waiter = self._enqueue(priority, user, cost, event.set)
+        if not waiter.granted:
+            try:
+                event.wait()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: str, user: str = '', cost: float = 1.0):
+        """slot() for coroutines: waits on the event loop instead of blocking a thread"""
+        if not self.enabled:
+            yield
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, user, cost, wake)
+        if not waiter.granted:
+            try:
+                await future
+            except BaseException:
+                # Cancelled, e.g. the client disconnected while queued
+                self._abandon(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict:
+        """Slots in use, queue lengths and queue-wait percentiles per class"""
+        with self._lock:
+            report = {'max_concurrency': self.max_concurrency, 'active': self._active, 'classes': {}}
+            for priority, queue in self._queues.items():
+                waits = sorted(queue.waits)
+                report['classes'][priority] = {
+                    'active': queue.active,
+                    'queued': queue.queued,
+                    'served': queue.served,
+                    'wait_ms_p50': _percentile_ms(waits, 0.50),
+                    'wait_ms_p95': _percentile_ms(waits, 0.95),
+                    'wait_ms_max': _percentile_ms(waits, 1.0),
+                }
+            return report
+
+
+def _percentile_ms(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return round(sorted_values[index] * 1000, 1)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Per-call model selection.
+
+Each model call names its task (session overview, early or late hint, chat
+turn, full solution, code review...). The task's route picks a model tier:
+the fast tier (LLM_MODEL_FAST) serves short answers like overviews and
+first hints, the strong one (LLM_MODEL_STRONG) solutions and code analysis.
+Both tiers default to GEMINI_MODEL, so every call uses the configured
+model until a cheaper one is named explicitly. A prompt above
+LLM_LARGE_PROMPT_TOKENS is always sent to the strong model. Routes are
+overridden with LLM_ROUTES, e.g.
+
+    LLM_ROUTES="chat=fast,solution=gemini-2.5-pro"
+
+where a value is a tier name or a model name. Latency, time to first token
+and estimated tokens are recorded per route, for tuning the table.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+FAST = 'fast'
+STRONG = 'strong'
+
+DEFAULT_LARGE_PROMPT_TOKENS = 12000
+LATENCY_SAMPLES = 500
+
+# Task -> tier (or model name)
+DEFAULT_ROUTES = {
+    'overview': FAST,
+    'hint_early': FAST,
+    'hint_late': STRONG,
+    'chat': STRONG,
+    'solution': STRONG,
+    'code_analysis': STRONG,
+    'code_review': STRONG,
+}
+EARLY_HINTS = 2  # hints before this number are short nudges
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """'task=target,task=target' -> {task: target}"""
+    routes = {}
+    for item in spec.split(','):
+        if '=' in item:
+            task, target = item.split('=', 1)
+            if task.strip() and target.strip():
+                routes[task.strip()] = target.strip()
+    return routes
+
+
+class _RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.ttfts = deque(maxlen=LATENCY_SAMPLES)
+        self.models: Dict[str, int] = {}
+
+
+class ModelRouter:
+    """Chooses the model of each call and keeps per-route latency and token statistics"""
+
+    def __init__(self, default_model: str, routes: Optional[Dict[str, str]] = None):
+        self.tiers = {
+            FAST: os.getenv('LLM_MODEL_FAST') or default_model,
+            STRONG: os.getenv('LLM_MODEL_STRONG') or default_model,
+        }
+        self.routes = dict(DEFAULT_ROUTES)
+        self.routes.update(routes if routes is not None else parse_routes(os.getenv('LLM_ROUTES', '')))
+        self.large_prompt_tokens = int(os.getenv('LLM_LARGE_PROMPT_TOKENS') or DEFAULT_LARGE_PROMPT_TOKENS)
+        self._stats: Dict[str, _RouteStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hint_task(hints_given: int) -> str:
+        return 'hint_early' if hints_given < EARLY_HINTS else 'hint_late'
+
+    def choose(self, task: str, prompt_tokens: int) -> Dict:
+        """{'route', 'model'} for a call of `task` with a prompt of about `prompt_tokens`"""
+        target = self.routes.get(task, STRONG)
+        route = task
+        if target == FAST and prompt_tokens > self.large_prompt_tokens:
+            # A long statement or conversation is worth the stronger model
+            target, route = STRONG, f"{task}+large"
+        return {'route': route, 'model': self.tiers.get(target, target)}
+
+    def record(self, route: str, model: str, latency: float, prompt_tokens: int, output_tokens: int,
+               ttft: Optional[float] = None, error: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(route, _RouteStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.prompt_tokens += prompt_tokens
+            stats.output_tokens += output_tokens
+            stats.latencies.append(latency)
+            if ttft is not None:
+                stats.ttfts.append(ttft)
+            stats.models[model] = stats.models.get(model, 0) + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            report = {}
+            for route, stats in sorted(self._stats.items()):
+                report[route] = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'models': dict(stats.models),
+                    'prompt_tokens': stats.prompt_tokens,
+                    'output_tokens': stats.output_tokens,
+                    'avg_prompt_tokens': stats.prompt_tokens // max(stats.calls, 1),
+                    'latency_ms_p50': _percentile_ms(stats.latencies, 0.50),
+                    'latency_ms_p95': _percentile_ms(stats.latencies, 0.95),
+                    'ttft_ms_p50': _percentile_ms(stats.ttfts, 0.50),
+                }
+            return {'tiers': dict(self.tiers), 'routes': dict(self.routes), 'stats': report}
+
+
+def _percentile_ms(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered: List[float] = sorted(values)
+    return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000, 1)
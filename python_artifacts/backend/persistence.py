@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+"""
+Write-behind persistence for the session registry.
+
+Request handlers only mark sessions, conversations and message logs dirty.
+A background thread collects everything dirtied since its last run and
+appends it to a journal next to storage.json in one write followed by one
+fsync (group commit). Message logs are append-only, so only new messages are
+journaled, except that a reserved message (see session_registry) journaled
+before it was written is journaled again from its place once it is. A session is journaled in full once, when it is new; after that
+only its changing fields (message seqs, hint count, activity time) are, so a
+chat turn doesn't rewrite the problem statement and editorial it carries.
+When the journal grows past a threshold it is folded into a fresh
+storage.json snapshot and truncated.
+
+At most DB_FLUSH_INTERVAL seconds of changes can be lost on a crash; a batch
+of DB_FLUSH_BATCH dirty records triggers an early flush.
+
+There must be a single writer process: a snapshot holds only the writing
+process's registry, and compaction truncates the shared journal, so a
+second process would lose the first one's writes. launcher.py therefore
+always runs one worker.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds: the durability window
+DEFAULT_FLUSH_BATCH = 256  # dirty records that trigger an early flush
+DEFAULT_COMPACT_BYTES = 8 * 1024 * 1024  # journal size that triggers a snapshot
+
+
+def _journal_path(path: str) -> str:
+    return path + '.journal'
+
+
+def load_storage(path: str) -> Dict:
+    """Read the last snapshot and replay the journal written after it"""
+    data = {}
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+    except Exception as e:
+        print(f"Error loading DB: {e}")
+
+    journal = _journal_path(path)
+    if not os.path.exists(journal):
+        return data
+
+    sessions = data.setdefault('active_sessions', {})
+    conversations = data.setdefault('conversations', {})
+    message_logs = data.setdefault('message_logs', {})
+    replayed = 0
+    with open(journal, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final line from a crash mid-write; everything before it is intact
+                print("Warning: ignoring incomplete journal record")
+                break
+            kind, key, value = record['t'], record['k'], record['v']
+            if kind == 'session':
+                sessions[key] = value
+            elif kind == 'session_state':
+                if key in sessions:
+                    sessions[key].update(value)
+            elif kind == 'conversation':
+                conversations[key] = value
+            elif kind == 'messages':
+                log = message_logs.setdefault(key, [])
+                del log[record['from']:]
+                log.extend(value)
+            replayed += 1
+
+    if replayed:
+        print(f"Replayed {replayed} journal records from {journal}")
+    return data
+
+
+class WriteBehindPersister:
+    """Batches registry changes and writes them to disk off the request path"""
+
+    def __init__(self, registry, path: str, flush_interval: Optional[float] = None,
+                 batch_size: Optional[int] = None, compact_bytes: Optional[int] = None):
+        self.registry = registry
+        self.path = path
+        self.journal_path = _journal_path(path)
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.getenv('DB_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+        self.batch_size = batch_size or int(os.getenv('DB_FLUSH_BATCH', DEFAULT_FLUSH_BATCH))
+        self.compact_bytes = compact_bytes or int(os.getenv('DB_COMPACT_BYTES', DEFAULT_COMPACT_BYTES))
+
+        self._dirty: Set[Tuple[str, str]] = set()
+        self._dirty_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._dirty_lock)
+        # Only one flush or compaction touches the files at a time
+        self._io_lock = threading.Lock()
+        # How many messages of each log are already on disk
+        self._persisted_lengths: Dict[str, int] = {
+            log_id: len(log) for log_id, log in registry.message_logs.items()
+        }
+        # Positions of reserved messages that went to disk before they were written
+        self._unwritten: Dict[str, Set[int]] = {
+            log_id: {seq - 1 for seq in seqs} for log_id, seqs in registry.reserved.items()
+        }
+        # Sessions whose full record is already on disk; later changes journal only their state
+        self._persisted_sessions: Set[str] = set(registry.sessions)
+        self._journal = None
+        self._thread = None
+        self._thread_pid = None
+        self._closed = False
+
+        self.stats = {'flushes': 0, 'records': 0, 'fsyncs': 0, 'compactions': 0, 'last_flush_ms': 0.0}
+
+    def mark_dirty(self, kind: str, key: str):
+        """Record that a session, conversation or message log changed"""
+        with self._wakeup:
+            self._dirty.add((kind, key))
+            if len(self._dirty) >= self.batch_size:
+                self._wakeup.notify()
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        # Started lazily and per process, so a pre-forking server gets a flusher in every worker
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._io_lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._journal = None
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if not self._closed and len(self._dirty) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in write-behind flush: {e}")
+
+    def _take_dirty(self) -> Set[Tuple[str, str]]:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _serialize(self, kind: str, key: str) -> Optional[Dict]:
+        registry = self.registry
+        if kind == 'session':
+            session = registry.get_session(key)
+            if session is None:
+                self._persisted_sessions.discard(key)
+                return None
+            with registry.locked(session_id=key):
+                if key in self._persisted_sessions:
+                    return {'t': 'session_state', 'k': key, 'v': session.state_dict()}
+                self._persisted_sessions.add(key)
+                return {'t': 'session', 'k': key, 'v': session.to_dict()}
+
+        if kind == 'conversation':
+            conversation = registry.get_conversation(key)
+            if conversation is None:
+                return None
+            with registry.locked(conversation_id=key):
+                return {'t': 'conversation', 'k': key, 'v': conversation.to_dict()}
+
+        if kind == 'messages':
+            log = registry.message_logs.get(key)
+            if log is None:
+                return None
+            start = self._persisted_lengths.get(key, 0)
+            unwritten = self._unwritten.get(key, set())
+            written = [position for position in unwritten if log[position].text is not None]
+            if written:
+                start = min(written)
+            new_messages = log[start:]  # append-only, so a slice is a consistent snapshot
+            if not new_messages:
+                return None
+            records = [m.to_dict() for m in new_messages]
+            # Judged from the rendered records: a message written meanwhile is caught next flush
+            unwritten = {position for position in unwritten if position < start} | \
+                        {start + i for i, record in enumerate(records) if record['message'] is None}
+            if unwritten:
+                self._unwritten[key] = unwritten
+            else:
+                self._unwritten.pop(key, None)
+            self._persisted_lengths[key] = start + len(new_messages)
+            return {'t': 'messages', 'k': key, 'from': start, 'v': records}
+
+        return None
+
+    def flush(self):
+        """Group-commit all pending changes: one journal write and one fsync"""
+        with self._io_lock:
+            dirty = self._take_dirty()
+            if not dirty:
+                return
+            started = time.perf_counter()
+
+            lines = []
+            for kind, key in dirty:
+                record = self._serialize(kind, key)
+                if record is not None:
+                    lines.append(json.dumps(record))
+
+            if lines:
+                if self._journal is None:
+                    self._journal = open(self.journal_path, 'a')
+                self._journal.write('\n'.join(lines) + '\n')
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self.stats['fsyncs'] += 1
+
+            self.stats['flushes'] += 1
+            self.stats['records'] += len(lines)
+            self.stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+            if self._journal is not None and self._journal.tell() >= self.compact_bytes:
+                self._compact()
+
+    def _compact(self):
+        """Fold the journal into a fresh snapshot. Caller holds _io_lock."""
+        snapshot = self.registry.snapshot()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'w')
+        os.fsync(self._journal.fileno())
+        self.stats['compactions'] += 1
+
+    def compact(self):
+        with self._io_lock:
+            self._compact()
+
+    def pending(self) -> int:
+        with self._dirty_lock:
+            return len(self._dirty)
+
+    def close(self):
+        """Flush everything and leave a compacted snapshot behind (used at shutdown)"""
+        if self._closed and not self.pending():
+            return  # already closed (worker exit hook and atexit both call this)
+        if self._thread_pid != os.getpid() and not self.pending():
+            # This process never changed anything (e.g. a preloading server master);
+            # compacting its stale registry would overwrite the workers' data
+            return
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+            self.compact()
+        except Exception as e:
+            print(f"Error saving DB: {e}")
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
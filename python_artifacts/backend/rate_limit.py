@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""
+Admission control for the endpoints that call Gemini.
+
+Every caller (identified by their own API key, or else by client IP) has two
+token buckets: one for requests and one for the estimated model tokens those
+requests will spend. Calls on the server's shared GEMINI_API_KEY also draw
+from a global token bucket sized below the project's quota, so the quota is
+never exhausted by one user; a request that doesn't fit is refused with the
+number of seconds until it would, which the API turns into a 429 with a
+Retry-After header.
+
+Token spend is estimated before the call (about four characters per token
+for the prompt, plus an allowance for the reply), since the real usage is
+only known afterwards.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+CHARS_PER_TOKEN = 4
+DEFAULT_REQUESTS_PER_MINUTE = 20
+DEFAULT_REQUEST_BURST = 10
+DEFAULT_TOKENS_PER_MINUTE = 200_000
+DEFAULT_GLOBAL_TOKENS_PER_MINUTE = 0  # 0: no shared-quota guard
+PRUNE_EVERY = 1024  # admissions between sweeps of idle buckets
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count of some prompt text"""
+    return sum(len(text) for text in texts if text) // CHARS_PER_TOKEN
+
+
+class TokenBucket:
+    """Holds up to `capacity` units and refills at `rate` units per second"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (call refill first)"""
+        # A cost above the capacity is admitted from a full bucket and leaves it in debt,
+        # otherwise it could never be admitted at all
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def idle(self, now: float) -> bool:
+        return self.level + (now - self.updated) * self.rate >= self.capacity
+
+
+class LLMRateLimiter:
+    """Per-caller request and token buckets, plus a global token bucket for the shared key"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, request_burst: Optional[int] = None,
+                 tokens_per_minute: Optional[float] = None, global_tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute if requests_per_minute is not None else \
+            float(os.getenv('RATE_LIMIT_RPM', DEFAULT_REQUESTS_PER_MINUTE))
+        self.request_burst = request_burst or int(os.getenv('RATE_LIMIT_BURST', DEFAULT_REQUEST_BURST))
+        self.tokens_per_minute = tokens_per_minute if tokens_per_minute is not None else \
+            float(os.getenv('RATE_LIMIT_TPM', DEFAULT_TOKENS_PER_MINUTE))
+        global_tpm = global_tokens_per_minute if global_tokens_per_minute is not None else \
+            float(os.getenv('LLM_GLOBAL_TPM', DEFAULT_GLOBAL_TOKENS_PER_MINUTE))
+        self.enabled = os.getenv('RATE_LIMIT', '1') != '0' and self.requests_per_minute > 0
+
+        self._requests: Dict[str, TokenBucket] = {}
+        self._tokens: Dict[str, TokenBucket] = {}
+        # The shared key's budget: a minute's worth of burst
+        self._global = TokenBucket(global_tpm, global_tpm / 60) if global_tpm > 0 else None
+        self._lock = threading.Lock()
+        self._admissions = 0
+        self.stats = {'admitted': 0, 'limited': 0, 'limited_global': 0}
+
+    def _buckets(self, identity: str):
+        requests = self._requests.get(identity)
+        if requests is None:
+            requests = self._requests[identity] = TokenBucket(self.request_burst, self.requests_per_minute / 60)
+            # Token budget: one minute's worth may be spent in a burst
+            self._tokens[identity] = TokenBucket(self.tokens_per_minute, self.tokens_per_minute / 60)
+        return requests, self._tokens[identity]
+
+    def acquire(self, identity: str, tokens: int, shared_key: bool = True) -> Dict:
+        """
+        Admit one request costing an estimated `tokens`, or refuse it.
+        Returns {'allowed', 'retry_after' (seconds), 'remaining_requests', 'remaining_tokens'}.
+        """
+        if not self.enabled:
+            return {'allowed': True, 'retry_after': 0.0}
+
+        with self._lock:
+            now = time.monotonic()
+            requests, budget = self._buckets(identity)
+            requests.refill(now)
+            budget.refill(now)
+            wait = max(requests.wait_time(1), budget.wait_time(tokens))
+            global_wait = 0.0
+            if shared_key and self._global is not None:
+                self._global.refill(now)
+                global_wait = self._global.wait_time(tokens)
+
+            allowed = wait == 0 and global_wait == 0
+            if allowed:
+                requests.take(1)
+                budget.take(tokens)
+                if shared_key and self._global is not None:
+                    self._global.take(tokens)
+                self.stats['admitted'] += 1
+            else:
+                self.stats['limited'] += 1
+                if global_wait > wait:
+                    self.stats['limited_global'] += 1
+
+            self._admissions += 1
+            if self._admissions % PRUNE_EVERY == 0:
+                self._prune(now)
+
+            return {
+                'allowed': allowed,
+                'retry_after': max(wait, global_wait),
+                'remaining_requests': max(int(requests.level), 0),
+                'remaining_tokens': max(int(budget.level), 0),
+            }
+
+    def _prune(self, now: float):
+        """Forget callers whose buckets have refilled completely; they'd be recreated identical"""
+        for identity in [key for key, bucket in self._requests.items()
+                         if bucket.idle(now) and self._tokens[key].idle(now)]:
+            del self._requests[identity]
+            del self._tokens[identity]
+
+    def remaining(self, identity: str) -> Dict:
+        """A caller's current budget without spending any of it"""
+        with self._lock:
+            now = time.monotonic()
+            requests, budget = self._buckets(identity)
+            requests.refill(now)
+            budget.refill(now)
+            report = {
+                'enabled': self.enabled,
+                'requests': {'remaining': max(int(requests.level), 0), 'burst': self.request_burst,
+                             'per_minute': self.requests_per_minute},
+                'tokens': {'remaining': max(int(budget.level), 0), 'per_minute': self.tokens_per_minute},
+            }
+            if self._global is not None:
+                self._global.refill(now)
+                report['shared_tokens'] = {'remaining': max(int(self._global.level), 0),
+                                           'per_minute': self._global.capacity}
+            return report
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After takes whole seconds; round up so an immediate retry isn't refused again"""
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""
+Compact in-memory records for sessions, conversations and messages.
+
+Messages used to be dicts repeating the same five keys plus an ISO timestamp
+string each. Here they are __slots__ objects with interned roles, integer
+epoch-microsecond timestamps and a small flags int. They are only turned
+back into the API's JSON dicts when a response (or storage.json) is built.
+"""
+
+import sys
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Message flag bits
+FLAG_HINT_SET = 1  # message carries an explicit is_hint value (chat replies, hints)
+FLAG_HINT = 2
+FLAG_SOLUTION = 4
+
+
+def now_us() -> int:
+    """Current local time as integer microseconds since the epoch"""
+    return time.time_ns() // 1000
+
+
+def us_to_iso(timestamp_us: int) -> str:
+    seconds, micros = divmod(timestamp_us, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros).isoformat()
+
+
+def iso_to_us(value) -> Optional[int]:
+    """Microseconds of an ISO timestamp (or one already in microseconds); None if missing or unreadable,
+    so the record's constructor falls back to the current time"""
+    if isinstance(value, int):
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return int(moment.timestamp()) * 1_000_000 + moment.microsecond
+
+
+class Message:
+    """One chat message; stored once in its conversation's log. Its text is None while the
+    message is only reserved (its place in the log taken, its reply not written yet)."""
+
+    __slots__ = ('role', 'text', 'timestamp', 'flags', 'session_id')
+
+    def __init__(self, role: str, text: Optional[str], session_id: str, flags: int = 0, timestamp: Optional[int] = None):
+        self.role = sys.intern(role)
+        self.text = text
+        self.session_id = session_id
+        self.flags = flags
+        self.timestamp = now_us() if timestamp is None else timestamp
+
+    @staticmethod
+    def flags_for(is_hint: Optional[bool] = None, is_solution: bool = False) -> int:
+        flags = 0
+        if is_hint is not None:
+            flags |= FLAG_HINT_SET
+            if is_hint:
+                flags |= FLAG_HINT
+        if is_solution:
+            flags |= FLAG_SOLUTION
+        return flags
+
+    def to_dict(self, include_session: bool = True) -> Dict:
+        """Render in the API's message shape"""
+        data = {
+            'role': self.role,
+            'message': self.text,
+            'timestamp': us_to_iso(self.timestamp)
+        }
+        if self.flags & FLAG_HINT_SET:
+            data['is_hint'] = bool(self.flags & FLAG_HINT)
+        if self.flags & FLAG_SOLUTION:
+            data['is_solution'] = True
+        if include_session:
+            data['session_id'] = self.session_id
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict, session_id: Optional[str] = None) -> 'Message':
+        flags = cls.flags_for(data.get('is_hint'), bool(data.get('is_solution')))
+        owner = data.get('session_id') or session_id or ''
+        return cls(data.get('role', 'unknown'), data.get('message', ''), sys.intern(owner),
+                   flags, iso_to_us(data.get('timestamp')))
+
+
+class Session:
+    """A tutoring session; its messages live in the log named by log_id"""
+
+    __slots__ = ('session_id', 'problem_id', 'problem_data', 'log_id', 'message_seqs',
+                 'hints_given', 'created_at', 'last_activity', 'conversation_id')
+    # The fields that change after creation; the others (problem_data above all) never do
+    STATE_FIELDS = ('message_seqs', 'hints_given', 'last_activity')
+
+    def __init__(self, session_id: str, problem_id: str, problem_data: Dict, log_id: str,
+                 conversation_id: Optional[str] = None, message_seqs=(), hints_given: int = 0,
+                 created_at: Optional[int] = None, last_activity: Optional[int] = None):
+        self.session_id = sys.intern(session_id)
+        self.problem_id = problem_id
+        self.problem_data = problem_data
+        self.log_id = sys.intern(log_id)
+        self.conversation_id = conversation_id
+        # Unsigned 32-bit seqs: 4 bytes each instead of a pointer to an int object
+        self.message_seqs = array('I', message_seqs)
+        self.hints_given = hints_given
+        self.created_at = now_us() if created_at is None else created_at
+        self.last_activity = self.created_at if last_activity is None else last_activity
+
+    def touch(self):
+        self.last_activity = now_us()
+
+    def to_dict(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'problem_id': self.problem_id,
+            'problem_data': self.problem_data,
+            'log_id': self.log_id,
+            'message_seqs': self.message_seqs.tolist(),
+            'hints_given': self.hints_given,
+            'created_at': us_to_iso(self.created_at),
+            'last_activity': us_to_iso(self.last_activity),
+            'conversation_id': self.conversation_id
+        }
+
+    def state_dict(self) -> Dict:
+        """Just the STATE_FIELDS of to_dict(), for journaling a change to an existing session"""
+        return {
+            'message_seqs': self.message_seqs.tolist(),
+            'hints_given': self.hints_given,
+            'last_activity': us_to_iso(self.last_activity)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, session_id: Optional[str] = None) -> 'Session':
+        session_id = data.get('session_id') or session_id
+        return cls(session_id, data.get('problem_id', ''), data.get('problem_data', {}),
+                   data.get('log_id') or session_id, data.get('conversation_id'),
+                   data.get('message_seqs', ()), data.get('hints_given', 0),
+                   iso_to_us(data.get('created_at')), iso_to_us(data.get('last_activity')))
+
+
+class Conversation:
+    """A conversation groups sessions that share one message log"""
+
+    __slots__ = ('id', 'sessions', 'created_at', 'last_updated')
+
+    def __init__(self, conversation_id: str, sessions: Optional[List[str]] = None,
+                 created_at: Optional[int] = None, last_updated: Optional[int] = None):
+        self.id = sys.intern(conversation_id)
+        self.sessions = sessions if sessions is not None else []
+        self.created_at = now_us() if created_at is None else created_at
+        self.last_updated = self.created_at if last_updated is None else last_updated
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'sessions': list(self.sessions),
+            'created_at': us_to_iso(self.created_at),
+            'last_updated': us_to_iso(self.last_updated)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, conversation_id: Optional[str] = None) -> 'Conversation':
+        return cls(data.get('id') or conversation_id, list(data.get('sessions', [])),
+                   iso_to_us(data.get('created_at')), iso_to_us(data.get('last_updated')))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Choice of the reference solutions pasted into a solution prompt.
+
+Solutions and editorials often carry the same program more than once, and
+contest templates full of comments and macros can add tens of kilobytes of
+input. C, C++ and Java sources are minified first (comments, blank lines
+and trailing whitespace dropped, as for the code-analysis cache); sources
+in other languages are kept as written, since `//` or a blank line inside
+a string may be meaningful there. Snippets shorter than MIN_LINES are left
+out. The rest is ranked by relevance (C++ before
+other languages, full programs before fragments, official solutions before
+editorial code) and then by length, shortest first; near-identical sources
+are collapsed to their best-ranked copy by the Jaccard similarity of their
+token shingles. Sources are added in that order while they fit in
+REFERENCE_TOKEN_BUDGET; if even the best one doesn't, it is cut down to
+the budget.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Set
+
+from backend.code_analysis import is_c_family, normalize_code
+from backend.rate_limit import CHARS_PER_TOKEN, estimate_tokens
+
+DEFAULT_TOKEN_BUDGET = 6000
+MAX_REFERENCES = 5
+NEAR_DUPLICATE = 0.8  # shingle Jaccard similarity above which two sources count as one
+SHINGLE_SIZE = 5
+MIN_LINES = 3  # shorter blocks are snippets, not solutions
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+def _shingles(code: str) -> Set[tuple]:
+    tokens = _TOKEN_RE.findall(code)
+    if len(tokens) <= SHINGLE_SIZE:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def _similarity(a: Set[tuple], b: Set[tuple]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _relevance(code: str, title: str, official: bool) -> int:
+    score = 0
+    if is_c_family(code) or 'c++' in title.lower():
+        score += 4  # the prompt asks for C++ (or the closest language to it)
+    if re.search(r'\bmain\s*\(', code):
+        score += 2
+    if official:
+        score += 1
+    return score
+
+
+def _candidates(problem_data: Dict) -> List[Dict]:
+    candidates = []
+    for section, official in (('solutions', True), ('editorials', False)):
+        for entry in problem_data.get(section) or []:
+            for code in entry.get('codes') or []:
+                if code.strip():
+                    candidates.append({'raw': code, 'title': entry.get('title', ''), 'official': official})
+    return candidates
+
+
+def _minify(code: str) -> str:
+    """C-family code normalized like the analysis cache does; anything else only trimmed at the ends"""
+    return normalize_code(code) if is_c_family(code) else code.strip('\n').rstrip()
+
+
+def _truncate(code: str, tokens: int) -> str:
+    """Whole lines of `code` up to about `tokens`, marked as cut in the code's own comment syntax"""
+    kept, size = [], 0
+    for line in code.split('\n'):
+        size += len(line) + 1
+        if size > tokens * CHARS_PER_TOKEN:
+            break
+        kept.append(line)
+    marker = '//' if is_c_family(code) else '#'
+    return '\n'.join(kept) + f"\n{marker} ... (truncated)"
+
+
+def select_references(problem_data: Dict, token_budget: Optional[int] = None,
+                      max_references: int = MAX_REFERENCES) -> Dict:
+    """
+    The reference sources for a problem's solution prompt, and what selecting them saved:
+    {'codes', 'candidates', 'duplicates', 'tokens_before', 'tokens_after'}.
+    tokens_before counts every extracted source as is, tokens_after the selection.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv('REFERENCE_TOKEN_BUDGET') or DEFAULT_TOKEN_BUDGET)
+    candidates = _candidates(problem_data)
+    tokens_before = estimate_tokens(*(candidate['raw'] for candidate in candidates))
+
+    for candidate in candidates:
+        candidate['code'] = _minify(candidate['raw'])
+        candidate['tokens'] = estimate_tokens(candidate['code'])
+        candidate['score'] = _relevance(candidate['code'], candidate['title'], candidate['official'])
+    programs = [candidate for candidate in candidates if candidate['code'].count('\n') + 1 >= MIN_LINES]
+    ranked = sorted(programs, key=lambda candidate: (-candidate['score'], candidate['tokens']))
+
+    # Near-duplicates: keep the best-ranked copy
+    distinct, duplicates = [], 0
+    for candidate in ranked:
+        candidate['shingles'] = _shingles(candidate['code'])
+        if any(_similarity(candidate['shingles'], kept['shingles']) >= NEAR_DUPLICATE for kept in distinct):
+            duplicates += 1
+        else:
+            distinct.append(candidate)
+
+    codes, used = [], 0
+    for candidate in distinct:
+        if len(codes) >= max_references:
+            break
+        if used + candidate['tokens'] <= token_budget:
+            codes.append(candidate['code'])
+            used += candidate['tokens']
+    if not codes and distinct and token_budget > 0:
+        codes.append(_truncate(distinct[0]['code'], token_budget))
+
+    return {
+        'codes': codes,
+        'candidates': len(candidates),
+        'duplicates': duplicates,
+        'tokens_before': tokens_before,
+        'tokens_after': estimate_tokens(*codes),
+    }
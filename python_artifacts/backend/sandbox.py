@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Isolation of the untrusted programs the judge compiles and runs.
+
+Every compiler, solution and generator process is started through a
+sandbox command line: bubblewrap (bwrap) or nsjail, whichever is installed,
+or the one JUDGE_SANDBOX names. Inside, the program runs as the
+unprivileged user nobody in fresh user, PID, IPC, UTS and network
+namespaces (so without network access). Its filesystem is the system
+directories and the files the command needs, all mounted read-only, plus
+its own writable working directory and an empty /tmp. The environment is
+cleared. CPU time, address space, file size and core dumps are limited by
+setrlimit in the sandbox itself (nsjail) or by the prlimit tool (bwrap),
+so nothing runs in the server process between fork and exec.
+
+Without a sandbox tool the judge refuses to run code, unless
+JUDGE_SANDBOX=none explicitly allows unconfined runs under rlimits only,
+e.g. on a developer machine.
+"""
+
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence
+
+AUTO = 'auto'
+NONE = 'none'
+SANDBOX_TOOLS = ('bwrap', 'nsjail')
+
+NOBODY = 65534
+SANDBOX_PATH = '/usr/local/bin:/usr/bin:/bin'
+# Environment of sandboxed processes; never the server's, which holds API keys
+SANDBOX_ENV = {'PATH': SANDBOX_PATH, 'LC_ALL': 'C'}
+# Mounted read-only in every sandbox: the compiler, shared libraries and interpreters
+SYSTEM_PATHS = ('/usr', '/bin', '/sbin', '/lib', '/lib32', '/lib64', '/etc/alternatives',
+                '/etc/ld.so.cache', '/etc/ld.so.conf', '/etc/ld.so.conf.d')
+
+
+class SandboxError(RuntimeError):
+    """Raised when code would have to run without the configured sandbox"""
+
+
+class Sandbox:
+    """Builds the command lines that run a program confined, with resource limits"""
+
+    def __init__(self, kind: Optional[str] = None):
+        self.requested = (kind or os.getenv('JUDGE_SANDBOX') or AUTO).strip().lower()
+        self.kind, self.tool = self._resolve(self.requested)
+        self.prlimit = shutil.which('prlimit')
+        if self.kind is None:
+            print(f"Warning: no sandbox available (JUDGE_SANDBOX={self.requested}); "
+                  f"install bubblewrap or nsjail, or set JUDGE_SANDBOX=none to run code unconfined")
+        elif self.kind == NONE:
+            print("Warning: JUDGE_SANDBOX=none, submitted code runs unconfined")
+
+    @staticmethod
+    def _resolve(requested: str):
+        if requested == NONE:
+            return NONE, None
+        if requested == AUTO:
+            candidates = SANDBOX_TOOLS
+        elif requested in SANDBOX_TOOLS:
+            candidates = (requested,)
+        else:
+            print(f"Warning: unknown JUDGE_SANDBOX '{requested}', expected one of "
+                  f"{', '.join((AUTO, NONE) + SANDBOX_TOOLS)}")
+            return None, None
+        for name in candidates:
+            tool = shutil.which(name)
+            if tool:
+                return name, tool
+        return None, None
+
+    @property
+    def available(self) -> bool:
+        return self.kind is not None
+
+    @property
+    def confined(self) -> bool:
+        return self.kind in SANDBOX_TOOLS
+
+    def describe(self) -> Dict:
+        return {'requested': self.requested, 'kind': self.kind, 'confined': self.confined}
+
+    def exit_code(self, returncode: Optional[int]) -> Optional[int]:
+        """The program's exit code as subprocess reports it: both tools exit with 128+N when it dies of signal N"""
+        if self.confined and returncode is not None and returncode > 128:
+            return -(returncode - 128)
+        return returncode
+
+    def wrap(self, command: Sequence[str], workdir: str, readable: Sequence[str] = (),
+             cpu_seconds: Optional[int] = None, memory_bytes: Optional[int] = None,
+             file_bytes: Optional[int] = None) -> List[str]:
+        """
+        Command line running `command` in the sandbox with `workdir` as its writable
+        working directory and `readable` paths mounted read-only. Limits left as None
+        are unlimited. Run it with env=SANDBOX_ENV.
+        """
+        if not self.available:
+            raise SandboxError('No sandbox available to run code in; install bubblewrap or nsjail')
+        command = list(command)
+        if not os.path.isabs(command[0]):
+            command[0] = shutil.which(command[0], path=SANDBOX_PATH) or command[0]
+        workdir = os.path.abspath(workdir)
+        readable = [os.path.abspath(path) for path in readable]
+        if os.path.isabs(command[0]) and not any(command[0].startswith(path + '/') for path in SYSTEM_PATHS):
+            readable.append(command[0])
+
+        if self.kind == 'nsjail':
+            return self._nsjail(command, workdir, readable, cpu_seconds, memory_bytes, file_bytes)
+        limited = self._prlimit(cpu_seconds, memory_bytes, file_bytes) + command
+        if self.kind == 'bwrap':
+            return self._bwrap(limited, workdir, readable)
+        return limited
+
+    def _prlimit(self, cpu_seconds, memory_bytes, file_bytes) -> List[str]:
+        if not self.prlimit:
+            return []  # only the judge's wall-clock timeout applies
+        limits = ['--core=0']
+        if cpu_seconds:
+            limits.append(f"--cpu={cpu_seconds}:{cpu_seconds + 1}")
+        if memory_bytes:
+            limits.append(f"--as={memory_bytes}")
+        if file_bytes:
+            limits.append(f"--fsize={file_bytes}")
+        return [self.prlimit] + limits + ['--']
+
+    def _bwrap(self, command, workdir, readable) -> List[str]:
+        args = [self.tool, '--unshare-all', '--unshare-user', '--uid', str(NOBODY), '--gid', str(NOBODY),
+                '--die-with-parent', '--new-session', '--clearenv', '--setenv', 'PATH', SANDBOX_PATH,
+                '--proc', '/proc', '--dev', '/dev', '--tmpfs', '/tmp']
+        for path in SYSTEM_PATHS:
+            if os.path.islink(path):  # merged /usr: /bin -> usr/bin
+                args += ['--symlink', os.readlink(path), path]
+            elif os.path.exists(path):
+                args += ['--ro-bind', path, path]
+        for path in readable:
+            args += ['--ro-bind', path, path]
+        args += ['--bind', workdir, workdir, '--remount-ro', '/', '--chdir', workdir, '--']
+        return args + command
+
+    def _nsjail(self, command, workdir, readable, cpu_seconds, memory_bytes, file_bytes) -> List[str]:
+        megabytes = lambda size: str(max(1, size // (1024 * 1024))) if size else 'inf'
+        args = [self.tool, '--mode', 'o', '--really_quiet', '--user', str(NOBODY), '--group', str(NOBODY),
+                '--hostname', 'judge', '--time_limit', '0', '--env', f"PATH={SANDBOX_PATH}",
+                '--rlimit_cpu', str(cpu_seconds) if cpu_seconds else 'inf',
+                '--rlimit_as', megabytes(memory_bytes),
+                '--rlimit_fsize', megabytes(file_bytes),
+                '--rlimit_core', '0', '--tmpfsmount', '/tmp']
+        for path in SYSTEM_PATHS:
+            if os.path.islink(path):
+                args += ['--symlink', f"{os.readlink(path)}:{path}"]
+            elif os.path.exists(path):
+                args += ['--bindmount_ro', path]
+        for path in readable:
+            args += ['--bindmount_ro', path]
+        args += ['--bindmount', workdir, '--cwd', workdir, '--']
+        return args + command
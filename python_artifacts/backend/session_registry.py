@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+"""
+In-memory registry of tutoring sessions and conversations.
+
+Session IDs are collision-free and sort by creation time. Mutations are
+guarded by a fixed pool of striped locks keyed by session/conversation ID,
+so requests touching different sessions almost never wait on each other,
+while concurrent requests on the same session are serialized.
+
+Messages are stored exactly once, in an append-only log per conversation
+(standalone sessions get a log of their own). A session only keeps the
+sequence numbers of its messages in that log and is rendered as a view.
+A reply that arrives later (the welcome overview) can reserve its place in
+the log up front; views leave it out until it is written.
+"""
+
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence
+
+from backend.records import Conversation, Message, Session
+
+# Crockford base32: no I, L, O, U, so IDs stay unambiguous and sort lexicographically
+_ID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+DEFAULT_LOCK_STRIPES = 64
+
+
+def _encode_base32(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_ID_ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+class SessionIdGenerator:
+    """
+    Generates ULID-style IDs: 48 bits of milliseconds + 80 random bits.
+
+    Within one millisecond the random part is incremented instead of redrawn,
+    so IDs created by this process are strictly increasing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new_id(self) -> str:
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._last_random = (self._last_random + 1) & ((1 << 80) - 1)
+            else:
+                self._last_ms = now_ms
+                self._last_random = secrets.randbits(80)
+            random_part = self._last_random
+
+        return _encode_base32(now_ms, 10) + _encode_base32(random_part, 16)
+
+
+class LogView(Sequence):
+    """
+    Read-only view over a prefix of a message log, rendering dicts on access.
+
+    Logs are append-only, so fixing the length at creation time makes the
+    view a consistent snapshot without copying any messages.
+    """
+
+    def __init__(self, log: List[Message], seqs: Optional[Sequence[int]] = None, include_session: bool = True):
+        self._log = log
+        self._seqs = seqs
+        self._length = len(seqs) if seqs is not None else len(log)
+        self._include_session = include_session
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def seqs(self) -> Optional[Sequence[int]]:
+        """Seq of each message in the view, or None when it is the whole log (seq = position + 1)"""
+        return self._seqs
+
+    def _render(self, position: int) -> Dict:
+        seq = self._seqs[position] if self._seqs is not None else position + 1
+        return self._log[seq - 1].to_dict(self._include_session)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._render(position) for position in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('log view index out of range')
+        return self._render(index)
+
+
+class SessionRegistry:
+    """Holds active sessions, conversations and their message logs behind striped locks"""
+
+    def __init__(self, sessions: Optional[Dict[str, Session]] = None,
+                 conversations: Optional[Dict[str, Conversation]] = None,
+                 message_logs: Optional[Dict[str, List[Message]]] = None, stripes: Optional[int] = None):
+        self.sessions: Dict[str, Session] = sessions if sessions is not None else {}
+        self.conversations: Dict[str, Conversation] = conversations if conversations is not None else {}
+        self.message_logs: Dict[str, List[Message]] = message_logs if message_logs is not None else {}
+        # Seqs of reserved messages not written yet, per log. Frozen sets, replaced rather than
+        # mutated, so views can read them without the lock.
+        self.reserved: Dict[str, FrozenSet[int]] = {}
+        for log_id, log in self.message_logs.items():
+            seqs = frozenset(seq for seq, message in enumerate(log, 1) if message.text is None)
+            if seqs:
+                self.reserved[log_id] = seqs
+
+        stripe_count = stripes or int(os.getenv('SESSION_LOCK_STRIPES', DEFAULT_LOCK_STRIPES))
+        self._stripes = [threading.RLock() for _ in range(max(1, stripe_count))]
+        self._ids = SessionIdGenerator()
+        # Called with (kind, key) after every mutation; the persister uses it for dirty tracking
+        self.on_change: Optional[Callable[[str, str], None]] = None
+
+    @classmethod
+    def from_storage(cls, data: Dict) -> 'SessionRegistry':
+        """Build a registry from persisted data, upgrading the old duplicated-history format"""
+        sessions = data.get('active_sessions', {})
+        conversations = data.get('conversations', {})
+        message_logs = data.get('message_logs', {})
+
+        for conversation_id, conversation in conversations.items():
+            if 'context' in conversation:
+                message_logs[conversation_id] = conversation.pop('context')
+            message_logs.setdefault(conversation_id, [])
+
+        for session_id, session in sessions.items():
+            if 'conversation_history' not in session:
+                continue
+            history = session.pop('conversation_history')
+            conversation_id = session.get('conversation_id')
+            if conversation_id in conversations:
+                log = message_logs[conversation_id]
+                session['log_id'] = conversation_id
+                session['message_seqs'] = [seq for seq, message in enumerate(log, 1)
+                                           if message.get('session_id') == session_id]
+            else:
+                session['log_id'] = session_id
+                message_logs[session_id] = [dict(message, session_id=session_id) for message in history]
+                session['message_seqs'] = list(range(1, len(history) + 1))
+
+        return cls(
+            {session_id: Session.from_dict(session, session_id) for session_id, session in sessions.items()},
+            {conversation_id: Conversation.from_dict(conversation, conversation_id)
+             for conversation_id, conversation in conversations.items()},
+            {log_id: [Message.from_dict(message) for message in log] for log_id, log in message_logs.items()}
+        )
+
+    def new_session_id(self, problem_id: str) -> str:
+        """Collision-free, time-sortable session ID prefixed with the problem ID"""
+        return f"{problem_id}_{self._ids.new_id()}"
+
+    def _stripe_index(self, kind: str, key: str) -> int:
+        return hash((kind, key)) % len(self._stripes)
+
+    @contextmanager
+    def locked(self, session_id: Optional[str] = None, conversation_id: Optional[str] = None):
+        """
+        Lock a session and/or conversation for mutation.
+
+        Stripes are always acquired in index order, so callers locking a
+        session together with its conversation can't deadlock each other.
+        """
+        indexes = set()
+        if session_id:
+            indexes.add(self._stripe_index('session', session_id))
+        if conversation_id:
+            indexes.add(self._stripe_index('conversation', conversation_id))
+
+        acquired = []
+        try:
+            for index in sorted(indexes):
+                self._stripes[index].acquire()
+                acquired.append(index)
+            yield
+        finally:
+            for index in reversed(acquired):
+                self._stripes[index].release()
+
+    def locked_session(self, session: Session):
+        """Lock a session together with the conversation whose log it writes to"""
+        return self.locked(session_id=session.session_id, conversation_id=session.conversation_id)
+
+    def _changed(self, kind: str, key: str):
+        if self.on_change is not None:
+            self.on_change(kind, key)
+
+    def mark_changed(self, session: Session):
+        """Report an in-place change to a session's fields (hint count, activity time)"""
+        self._changed('session', session.session_id)
+
+    def get_session(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def get_conversation(self, conversation_id: Optional[str]) -> Optional[Conversation]:
+        if not conversation_id:
+            return None
+        return self.conversations.get(conversation_id)
+
+    def create_session(self, problem_id: str, problem_data: Dict, conversation_id: Optional[str] = None) -> Session:
+        """Register a new session and link it to its conversation if one is given"""
+        session_id = self.new_session_id(problem_id)
+        session = Session(session_id, problem_id, problem_data,
+                          log_id=conversation_id or session_id, conversation_id=conversation_id)
+
+        with self.locked_session(session):
+            self.sessions[session_id] = session
+
+            if conversation_id:
+                conversation = self.conversations.get(conversation_id)
+                if conversation is None:
+                    # setdefault keeps this atomic if two first sessions race on a new conversation
+                    conversation = self.conversations.setdefault(conversation_id, Conversation(conversation_id))
+                conversation.sessions.append(session.session_id)
+                conversation.last_updated = session.created_at
+            self.message_logs.setdefault(session.log_id, [])
+
+        self._changed('session', session_id)
+        if conversation_id:
+            self._changed('conversation', conversation_id)
+        return session
+
+    def append_message(self, session: Session, role: str, text: str,
+                       is_hint: Optional[bool] = None, is_solution: bool = False) -> int:
+        """Append a message to the session's log once and record it in the session; returns its seq"""
+        message = Message(role, text, session.session_id, Message.flags_for(is_hint, is_solution))
+
+        with self.locked_session(session):
+            log = self.message_logs.setdefault(session.log_id, [])
+            log.append(message)
+            seq = len(log)
+            session.message_seqs.append(seq)
+
+            conversation = self.get_conversation(session.conversation_id)
+            if conversation:
+                conversation.last_updated = message.timestamp
+
+        self._changed('messages', session.log_id)
+        self._changed('session', session.session_id)
+        if conversation:
+            self._changed('conversation', conversation.id)
+        return seq
+
+    def reserve_message(self, session: Session, role: str) -> int:
+        """Take the session's next place in its log for a message written later; returns its seq"""
+        message = Message(role, None, session.session_id)
+
+        with self.locked_session(session):
+            log = self.message_logs.setdefault(session.log_id, [])
+            seq = len(log) + 1
+            # Reserved before it is appended, so a view never renders it
+            self.reserved[session.log_id] = self.reserved.get(session.log_id, frozenset()) | {seq}
+            log.append(message)
+            session.message_seqs.append(seq)
+
+        self._changed('messages', session.log_id)
+        self._changed('session', session.session_id)
+        return seq
+
+    def write_message(self, session: Session, seq: int, text: str,
+                      is_hint: Optional[bool] = None, is_solution: bool = False):
+        """Fill in a message reserved by reserve_message(), in its original place"""
+        with self.locked_session(session):
+            message = self.message_logs[session.log_id][seq - 1]
+            message.text = text
+            message.flags = Message.flags_for(is_hint, is_solution)
+            remaining = self.reserved.get(session.log_id, frozenset()) - {seq}
+            if remaining:
+                self.reserved[session.log_id] = remaining
+            else:
+                self.reserved.pop(session.log_id, None)
+
+            conversation = self.get_conversation(session.conversation_id)
+            if conversation:
+                conversation.last_updated = max(conversation.last_updated, message.timestamp)
+
+        self._changed('messages', session.log_id)
+        if conversation:
+            self._changed('conversation', conversation.id)
+
+    def _view(self, log_id: str, seqs: Optional[Sequence[int]] = None, include_session: bool = True) -> LogView:
+        log = self.message_logs.get(log_id, [])
+        reserved = self.reserved.get(log_id)
+        if reserved:
+            # Leave out reserved messages that aren't written yet (this copies the seqs)
+            all_seqs = seqs if seqs is not None else range(1, len(log) + 1)
+            seqs = [seq for seq in all_seqs if seq not in reserved]
+        return LogView(log, seqs, include_session)
+
+    def conversation_context(self, conversation_id: str) -> LogView:
+        """All written messages of a conversation, in order (seq = position + 1 unless some are reserved)"""
+        return self._view(conversation_id)
+
+    def session_history(self, session: Session) -> LogView:
+        """The session's own written messages, rendered from its log without copying"""
+        # Session history never carried session_id, only the conversation context did
+        return self._view(session.log_id, session.message_seqs, include_session=False)
+
+    def context_for(self, session: Session) -> LogView:
+        """
+        Snapshot of the history the tutor should see: the session's whole conversation
+        when it has one, otherwise just this session. Caller holds the lock.
+        """
+        if self.get_conversation(session.conversation_id):
+            context = self.conversation_context(session.conversation_id)
+            if context:
+                return context
+        # Freeze the seqs too, they are appended to in place
+        return self._view(session.log_id, session.message_seqs[:], include_session=False)
+
+    def snapshot(self) -> Dict:
+        """Per-record dict copies of all sessions, conversations and logs, for persistence"""
+        sessions = {}
+        for session_id, session in list(self.sessions.items()):
+            with self.locked(session_id=session_id):
+                sessions[session_id] = session.to_dict()
+
+        conversations = {}
+        for conversation_id, conversation in list(self.conversations.items()):
+            with self.locked(conversation_id=conversation_id):
+                conversations[conversation_id] = conversation.to_dict()
+
+        message_logs = {}
+        for log_id in list(self.message_logs):
+            # A log is keyed by its conversation ID, or by the session ID for standalone sessions
+            owner = {'conversation_id': log_id} if log_id in self.conversations else {'session_id': log_id}
+            with self.locked(**owner):
+                log = self.message_logs[log_id][:]
+            message_logs[log_id] = [message.to_dict() for message in log]
+
+        return {
+            'active_sessions': sessions,
+            'conversations': conversations,
+            'message_logs': message_logs
+        }
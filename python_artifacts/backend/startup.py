@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Lazy service construction and a startup-time report.
+
+The services behind the API (problem store, Gemini client, session storage)
+are expensive to build: parsing the problem JSON, importing the Gemini SDK
+and loading storage.json each take a noticeable fraction of a second. They
+are wrapped in LazyService proxies and built on first use instead of at
+import time, so the server can start answering (health checks, static files)
+right away. Every phase is timed into the shared `startup` report, which
+/api/health?verbose=1 exposes.
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+LOADED_AT = time.time()
+
+
+class StartupReport:
+    """Wall-clock timings of startup phases and deferred imports"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Dict] = []
+        self.imports: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(self.phases, name, started)
+
+    def mark(self, name: str, started: float):
+        """Record a phase that began at `started` (a perf_counter value) and ends now"""
+        self._record(self.phases, name, started)
+
+    def timed_import(self, module: str):
+        """Import a module, recording how long it took if it wasn't loaded yet"""
+        if module in sys.modules:
+            return sys.modules[module]
+        started = time.perf_counter()
+        loaded = importlib.import_module(module)
+        self._record(self.imports, module, started)
+        return loaded
+
+    def _record(self, entries: List[Dict], name: str, started: float):
+        ended = time.perf_counter()
+        with self._lock:
+            entries.append({
+                'name': name,
+                'ms': round((ended - started) * 1000, 1),
+                'at_ms': round((started - self.started) * 1000, 1),
+                'pid': os.getpid(),
+            })
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'uptime_s': round(time.time() - LOADED_AT, 1),
+                'phases': list(self.phases),
+                'imports': sorted(self.imports, key=lambda entry: -entry['ms']),
+            }
+
+
+startup = StartupReport()
+
+
+class LazyService:
+    """
+    Proxy that builds its service on first use. Construction is thread-safe:
+    concurrent first requests wait for a single build instead of racing.
+    A failed build is retried on the next use.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], object]):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                with startup.phase(f"init {self._name}"):
+                    self._instance = self._factory()
+            return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    # Container protocol, for proxies over the session and conversation maps
+    def __contains__(self, key) -> bool:
+        return key in self.get()
+
+    def __getitem__(self, key):
+        return self.get()[key]
+
+    def __len__(self) -> int:
+        return len(self.get())
+
+    def __iter__(self):
+        return iter(self.get())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyService {self._name} ({state})>"
+
+
+def warm_up(services: Dict[str, LazyService], skip: Optional[List[str]] = None):
+    """Build every service now (e.g. in a preloading server master before forking)"""
+    for name, service in services.items():
+        if skip and name in skip:
+            continue
+        try:
+            service.get()
+        except Exception as e:
+            print(f"Warning: could not initialize {name} during warm-up: {e}")
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+"""
+Stress testing of student code against a reference solution.
+
+A generator script prints one random test for the seed it gets as its
+first argument. Seeds are split into batches; each worker generates its
+whole batch of inputs in one process (a Python generator is re-run in the
+same interpreter for every seed instead of paying interpreter start-up per
+case), then runs reference and student on each input and compares the
+outputs token by token. The first mismatch sets a shared stop flag, so every other worker
+ends after its current case and queued batches are cancelled. The smallest
+failing input found is reported as the counterexample.
+
+The generator runs in the judge's sandbox like the two solutions, and at
+most STRESS_CONCURRENCY stress runs go on at once.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from backend.judge import (COMPILATION_ERROR, OK, SHOWN_OUTPUT_CHARS, WRONG_ANSWER, LocalJudge,
+                           JudgeError, check_tokens, parse_memory_limit, parse_time_limit, run_failure)
+
+DEFAULT_CASES = 1000
+MAX_CASES = 20000
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_TIME_BUDGET = 30.0  # seconds for one stress run
+GENERATOR_TIME_LIMIT = 5.0
+GENERATOR_LANGUAGES = ('python', 'cpp')
+DEFAULT_CONCURRENCY = 2
+
+# Runs a generator script once per seed inside one interpreter and prints the inputs as JSON
+PYTHON_BATCH_HOST = """
+import io, json, runpy, sys
+script, first, last = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+real_stdout, inputs = sys.stdout, []
+for seed in range(first, last + 1):
+    sys.argv = [script, str(seed)]
+    sys.stdout = io.StringIO()
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            sys.stdout = real_stdout
+            sys.stderr.write('generator exited with %r on seed %d' % (e.code, seed))
+            sys.exit(1)
+    inputs.append(sys.stdout.getvalue())
+sys.stdout = real_stdout
+json.dump(inputs, sys.stdout)
+"""
+
+
+class StressError(JudgeError):
+    """Raised when a stress run can't start (no reference, broken generator...)"""
+
+
+class StressBusy(StressError):
+    """Raised when STRESS_CONCURRENCY runs are already going on"""
+
+
+def reference_codes(problem_data: Dict) -> List[str]:
+    """Reference solution sources stored with a problem's editorial, in editorial order"""
+    codes = []
+    for section in ('solutions', 'editorials'):
+        for item in problem_data.get(section, []):
+            codes.extend(code for code in item.get('codes', []) if code.strip())
+    return codes
+
+
+class StressTester:
+    """Runs student and reference programs over generated tests until they disagree"""
+
+    def __init__(self, judge: LocalJudge, workers: Optional[int] = None, batch_size: Optional[int] = None):
+        self.judge = judge
+        self.workers = workers or int(os.getenv('STRESS_WORKERS', 0)) or max(2, os.cpu_count() or 1)
+        self.batch_size = batch_size or int(os.getenv('STRESS_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        self.time_budget = float(os.getenv('STRESS_TIME_BUDGET', DEFAULT_TIME_BUDGET))
+        self.concurrency = int(os.getenv('STRESS_CONCURRENCY', 0)) or DEFAULT_CONCURRENCY
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stress')
+        self._runs = threading.BoundedSemaphore(self.concurrency)
+
+    def _compile(self, code: str, what: str) -> str:
+        build = self.judge.compile(code)
+        if 'error' in build:
+            raise StressError(f"{what} does not compile: {build['error'][:500]}")
+        return os.path.abspath(build['binary'])
+
+    def _reference_binary(self, problem_data: Dict, reference_code: Optional[str]) -> str:
+        if reference_code:
+            return self._compile(reference_code, 'Reference solution')
+        # Editorial code blocks may be in other languages or be fragments; take the first that builds
+        for code in reference_codes(problem_data):
+            build = self.judge.compile(code)
+            if 'error' not in build:
+                return os.path.abspath(build['binary'])
+        raise StressError('No compilable reference solution stored for this problem')
+
+    def _generator_command(self, generator: str, language: str) -> Dict:
+        if language == 'cpp':
+            return {'command': [self._compile(generator, 'Generator')], 'batched': False, 'readable': []}
+        if language != 'python':
+            raise StressError(f"Generator language must be one of {', '.join(GENERATOR_LANGUAGES)}")
+        # Scripts are content-addressed like binaries, so repeated runs reuse the file
+        digest = hashlib.sha256(generator.encode('utf-8')).hexdigest()
+        os.makedirs(self.judge.cache_dir, exist_ok=True)
+        path = os.path.abspath(os.path.join(self.judge.cache_dir, f"gen-{digest}.py"))
+        if os.path.exists(path):
+            self.judge.touch(path)
+        else:
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(generator)
+            os.replace(temp_path, path)
+            self.judge.trim_cache()
+        # The sandbox sees the script and this interpreter's installation, read-only
+        readable = sorted({path, sys.prefix, sys.base_prefix})
+        return {'command': [sys.executable, '-c', PYTHON_BATCH_HOST, path], 'batched': True, 'readable': readable}
+
+    def _generate(self, generator: Dict, seeds: range, memory_limit: int) -> List[str]:
+        """Inputs for a batch of seeds: one process for batched generators, one per seed otherwise"""
+        if generator['batched']:
+            time_limit = GENERATOR_TIME_LIMIT * len(seeds)
+            run = self.judge.execute(generator['command'] + [str(seeds[0]), str(seeds[-1])], '',
+                                     time_limit, memory_limit, generator['readable'])
+            if run_failure(run, time_limit, memory_limit):
+                raise StressError(f"Generator failed: {run['stderr'][-500:]}")
+            return json.loads(run['stdout'])
+
+        inputs = []
+        for seed in seeds:
+            run = self.judge.execute(generator['command'] + [str(seed)], '', GENERATOR_TIME_LIMIT, memory_limit,
+                                     generator['readable'])
+            if run_failure(run, GENERATOR_TIME_LIMIT, memory_limit):
+                raise StressError(f"Generator failed on seed {seed}: {run['stderr'][-500:]}")
+            inputs.append(run['stdout'])
+        return inputs
+
+    def _run_batch(self, seeds: range, student: str, reference: str, generator: Dict,
+                   time_limit: float, memory_limit: int, stop: threading.Event) -> Dict:
+        judge = self.judge
+        batch = {'ran': 0, 'failures': []}
+        if stop.is_set():
+            return batch
+        try:
+            inputs = self._generate(generator, seeds, memory_limit)
+        except (StressError, ValueError) as e:
+            batch['error'] = str(e)
+            stop.set()
+            return batch
+
+        for seed, test_input in zip(seeds, inputs):
+            if stop.is_set():
+                break
+
+            expected = judge.execute([reference], test_input, time_limit, memory_limit)
+            if run_failure(expected, time_limit, memory_limit):
+                batch['error'] = f"Reference solution failed on seed {seed} with input:\n{test_input[:500]}"
+                stop.set()
+                break
+
+            actual = judge.execute([student], test_input, time_limit, memory_limit)
+            batch['ran'] += 1
+            verdict = run_failure(actual, time_limit, memory_limit)
+            reason = ''
+            if not verdict:
+                ok, reason = check_tokens(expected['stdout'], actual['stdout'])
+                verdict = OK if ok else WRONG_ANSWER
+            if verdict != OK:
+                batch['failures'].append({
+                    'seed': seed,
+                    'verdict': verdict,
+                    'checker': reason,
+                    'input': test_input,
+                    'expected': expected['stdout'][:SHOWN_OUTPUT_CHARS],
+                    'output': actual['stdout'][:SHOWN_OUTPUT_CHARS],
+                    'stderr': actual['stderr'][-SHOWN_OUTPUT_CHARS:],
+                })
+                stop.set()
+                break
+        return batch
+
+    def run(self, code: str, problem_data: Dict, generator: str, language: str = 'python',
+            cases: int = DEFAULT_CASES, reference_code: Optional[str] = None) -> Dict:
+        """Stress the student's code; reports the smallest counterexample found, if any"""
+        if not code or not code.strip():
+            raise StressError('No code to test')
+        if not generator or not generator.strip():
+            raise StressError('A generator script is required')
+        cases = min(max(int(cases), 1), MAX_CASES)
+
+        if not self._runs.acquire(blocking=False):
+            raise StressBusy('Too many stress tests running, please try again shortly')
+        try:
+            return self._run(code, problem_data, generator, language, cases, reference_code)
+        finally:
+            self._runs.release()
+
+    def _run(self, code: str, problem_data: Dict, generator: str, language: str, cases: int,
+             reference_code: Optional[str]) -> Dict:
+        started = time.perf_counter()
+        build = self.judge.compile(code)
+        if 'error' in build:
+            return {'verdict': COMPILATION_ERROR, 'compile_error': build['error'],
+                    'cases_run': 0, 'took_ms': round((time.perf_counter() - started) * 1000, 1)}
+        student = os.path.abspath(build['binary'])
+        reference = self._reference_binary(problem_data, reference_code)
+        generator_command = self._generator_command(generator, language)
+        time_limit = parse_time_limit(problem_data.get('time_limit', ''))
+        memory_limit = parse_memory_limit(problem_data.get('memory_limit', ''))
+
+        stop = threading.Event()
+        deadline = threading.Timer(self.time_budget, stop.set)
+        deadline.start()
+        try:
+            futures = [
+                self._pool.submit(self._run_batch, range(first, min(first + self.batch_size, cases + 1)),
+                                  student, reference, generator_command, time_limit, memory_limit, stop)
+                for first in range(1, cases + 1, self.batch_size)
+            ]
+            batches = []
+            for future in futures:
+                if stop.is_set() and future.cancel():
+                    continue  # never started: nothing to wait for
+                batches.append(future.result())
+        finally:
+            deadline.cancel()
+
+        failures = [failure for batch in batches for failure in batch['failures']]
+        errors = [batch for batch in batches if 'error' in batch]
+        report = {
+            'cases_run': sum(batch['ran'] for batch in batches),
+            'cases_requested': cases,
+            'took_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        if errors and not failures:
+            raise StressError(errors[0]['error'])
+        if failures:
+            # Several workers may fail before they see the stop flag; keep the smallest input
+            counterexample = min(failures, key=lambda failure: (len(failure['input']), failure['seed']))
+            counterexample['input'] = counterexample['input'][:SHOWN_OUTPUT_CHARS]
+            report['verdict'] = counterexample['verdict']
+            report['counterexample'] = counterexample
+        else:
+            report['verdict'] = OK
+            # A run cut short by the time budget found nothing, but didn't cover every case either
+            report['completed'] = report['cases_run'] == cases
+        return report
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Welcome overviews of new sessions, generated off the request path.
+
+The overview depends only on the problem, so it is cached per problem,
+keyed by problem_id and a hash of the problem context the prompt is built
+from (a re-extracted statement gets a fresh overview). /api/start-session
+answers right away: with the cached overview, or with the session ID while
+the overview is generated on a small worker pool. Sessions starting the
+same problem while it is generated share that one model call. The client
+then polls or streams the session's overview.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_WORKERS = 4
+SESSIONS_TRACKED = 4096  # pending or recent overviews remembered per session
+
+
+def welcome_key(problem_id: str, problem_context: str) -> Tuple[str, str]:
+    return problem_id, hashlib.sha256(problem_context.encode('utf-8')).hexdigest()[:16]
+
+
+class WelcomeMessages:
+    """Per-problem overview cache with single-flight background generation"""
+
+    def __init__(self, max_entries: Optional[int] = None, workers: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv('WELCOME_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+        self.workers = workers or int(os.getenv('WELCOME_WORKERS', DEFAULT_WORKERS))
+        self._entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._sessions: "OrderedDict[str, Future]" = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'generated': 0, 'joined': 0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created on first miss so forked server workers each start their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='welcome')
+        return self._executor
+
+    def cached(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def _put(self, key: Tuple[str, str], text: str):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def request(self, session_id: str, key: Tuple[str, str], generate: Callable[[], Tuple[str, bool]]) -> Future:
+        """
+        Future of the session's overview: already resolved on a cache hit, else shared
+        with the generation in flight for the problem, else a new `generate()` call on
+        the worker pool. `generate` returns (text, cacheable).
+        """
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                future = Future()
+                future.set_result(text)
+            elif key in self._in_flight:
+                self.stats['joined'] += 1
+                future = self._in_flight[key]
+            else:
+                self.stats['generated'] += 1
+                future = self._in_flight[key] = self._pool().submit(self._generate, key, generate)
+            self._sessions[session_id] = future
+            while len(self._sessions) > SESSIONS_TRACKED:
+                self._sessions.popitem(last=False)
+        return future
+
+    def _generate(self, key: Tuple[str, str], generate) -> str:
+        try:
+            text, cacheable = generate()
+            if cacheable:
+                self._put(key, text)
+            return text
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def for_session(self, session_id: str) -> Optional[Future]:
+        with self._lock:
+            return self._sessions.get(session_id)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+Memory benchmark: bytes per stored message, dict vs. compact record.
+
+Builds N messages the way backend/app.py used to (one dict per message,
+ISO timestamp string per append, duplicated into the session history and
+the conversation context) and the way it does now (one Message record in
+the conversation log plus a 4-byte seq in the session). Message bodies are
+created up front and shared by both runs, so only the storage overhead
+is measured.
+
+Usage: python benchmarks/message_memory.py [N]
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+from array import array
+from datetime import datetime
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+from backend.records import Message
+
+
+def build_dict_messages(texts, session_id):
+    """Old layout: every message stored twice as a dict"""
+    session_history = []
+    conversation_context = []
+    for i, text in enumerate(texts):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        entry = {'role': role, 'message': text, 'timestamp': datetime.now().isoformat()}
+        if role == 'assistant':
+            entry['is_hint'] = False
+        session_history.append(entry)
+        conversation_context.append(dict(entry, timestamp=datetime.now().isoformat(), session_id=session_id))
+    return session_history, conversation_context
+
+
+def build_record_messages(texts, session_id):
+    """New layout: one Message per message in the log, the session keeps seqs"""
+    log = []
+    seqs = array('I')
+    for i, text in enumerate(texts):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        flags = Message.flags_for(False) if role == 'assistant' else 0
+        log.append(Message(role, text, session_id, flags))
+        seqs.append(len(log))
+    return log, seqs
+
+
+def measure(builder, texts, session_id):
+    gc.collect()
+    tracemalloc.start()
+    result = builder(texts, session_id)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    session_id = sys.intern('2128A_01JZ0000000000000000000000')
+    texts = [f"message body {i}" for i in range(count)]
+
+    dict_bytes = measure(build_dict_messages, texts, session_id)
+    record_bytes = measure(build_record_messages, texts, session_id)
+
+    print(f"Messages: {count:,} (bodies excluded, they are shared by both layouts)")
+    print(f"  dicts, session + conversation copies: {dict_bytes / count:8.1f} bytes/message ({dict_bytes / 2**20:.1f} MiB)")
+    print(f"  Message records + session seqs:       {record_bytes / count:8.1f} bytes/message ({record_bytes / 2**20:.1f} MiB)")
+    print(f"  Reduction: {dict_bytes / record_bytes:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
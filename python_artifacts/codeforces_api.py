@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Bulk problem metadata from the official Codeforces API.
+
+One problemset.problems request returns the name, tags, rating and solve
+count of every problem, and one contest.list request names every contest,
+so the whole store can be enriched in a single pass instead of scraping
+each problem page. Responses can be recorded to a directory and replayed
+from it, which makes ingestion runnable offline and reproducible.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+API_BASE = "https://codeforces.com/api/"
+
+
+class CodeforcesAPIError(Exception):
+    pass
+
+
+class CodeforcesAPI:
+    """Minimal client for the public Codeforces API with record/replay support"""
+
+    def __init__(self, session=None, recorded_dir: Optional[str] = None, record_dir: Optional[str] = None):
+        self.session = session
+        self.recorded_dir = recorded_dir  # replay responses from here instead of the network
+        self.record_dir = record_dir  # save every live response here
+
+    @staticmethod
+    def _response_path(directory: str, method: str) -> str:
+        return os.path.join(directory, f"{method}.json")
+
+    def call(self, method: str, **params) -> object:
+        """Result of an API method; raises CodeforcesAPIError unless the status is OK"""
+        if self.recorded_dir:
+            path = self._response_path(self.recorded_dir, method)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CodeforcesAPIError(f"No usable recorded response for {method} in {path}: {e}")
+        else:
+            if self.session is None:
+                raise CodeforcesAPIError("No HTTP session configured")
+            response = self.session.get(API_BASE + method, params=params)
+            if response.status_code != 200:
+                raise CodeforcesAPIError(f"{method} failed with status code {response.status_code}")
+            payload = response.json()
+            if self.record_dir:
+                os.makedirs(self.record_dir, exist_ok=True)
+                with open(self._response_path(self.record_dir, method), 'w', encoding='utf-8') as f:
+                    json.dump(payload, f, ensure_ascii=False)
+
+        if payload.get('status') != 'OK':
+            raise CodeforcesAPIError(f"{method}: {payload.get('comment', 'unknown error')}")
+        return payload['result']
+
+    def problemset_metadata(self) -> Dict[str, Dict]:
+        """Metadata of every problemset problem keyed by store ID ('2128A'), from two requests"""
+        problemset = self.call('problemset.problems')
+        contests = {contest['id']: contest.get('name', '') for contest in self.call('contest.list')}
+
+        solved_counts = {
+            (stats.get('contestId'), stats.get('index')): stats.get('solvedCount')
+            for stats in problemset.get('problemStatistics', [])
+        }
+
+        metadata = {}
+        for problem in problemset.get('problems', []):
+            contest_id = problem.get('contestId')
+            index = problem.get('index')
+            if contest_id is None or not index:
+                continue
+            rating = problem.get('rating')
+            tags = list(problem.get('tags', []))
+            if rating:
+                # Same form the problem page uses for the difficulty tag
+                tags.append(f"*{rating}")
+            metadata[f"{contest_id}{index}"] = {
+                'problem_title': f"{index}. {problem.get('name', '')}",
+                'tags': tags,
+                'rating': rating,
+                'solved_count': solved_counts.get((contest_id, index)),
+                'url': f"https://codeforces.com/contest/{contest_id}/problem/{index}",
+                'contest_title': contests.get(contest_id, ''),
+            }
+        return metadata
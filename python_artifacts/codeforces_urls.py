@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Canonical form of Codeforces problem URLs.
+
+Contest, problemset and gym URLs on codeforces.com or any of its
+mirrors, with or without scheme, trailing slash, query string, fragment or
+lower-case problem index, all map to one problem key ('2128A') and one
+canonical fetch URL.
+"""
+
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+MIRROR_HOSTS = (
+    'codeforces.com',
+    'codeforces.ru',
+    'codeforces.ml',
+    'codeforc.es',
+)
+
+# Path shapes that identify a single problem; each yields (contest, index)
+PROBLEM_PATHS = [
+    ('contest', re.compile(r'^/contest/(\d+)/problem/([a-z]\d*)$', re.IGNORECASE)),
+    ('contest', re.compile(r'^/problemset/problem/(\d+)/([a-z]\d*)$', re.IGNORECASE)),
+    ('gym', re.compile(r'^/gym/(\d+)/problem/([a-z]\d*)$', re.IGNORECASE)),
+    ('gym', re.compile(r'^/problemset/gymproblem/(\d+)/([a-z]\d*)$', re.IGNORECASE)),
+]
+
+PROBLEM_KEY_RE = re.compile(r'^(\d+)([a-z]\d*)$', re.IGNORECASE)
+
+
+class CanonicalProblem(NamedTuple):
+    key: str  # store key, e.g. '2128A'
+    contest_id: str
+    index: str
+    kind: str  # 'contest' or 'gym'
+    url: str  # canonical URL to fetch
+
+
+def _make(contest_id: str, index: str, kind: str) -> CanonicalProblem:
+    contest_id = str(int(contest_id))  # drop leading zeros
+    index = index.upper()
+    url = f"https://codeforces.com/{kind}/{contest_id}/problem/{index}"
+    return CanonicalProblem(f"{contest_id}{index}", contest_id, index, kind, url)
+
+
+def _is_codeforces_host(host: str) -> bool:
+    host = host.lower().split(':')[0]
+    return any(host == mirror or host.endswith('.' + mirror) for mirror in MIRROR_HOSTS)
+
+
+def canonicalize_problem_url(url: str) -> Optional[CanonicalProblem]:
+    """Canonical problem for a Codeforces URL (or bare problem ID), or None if it isn't one"""
+    if not url:
+        return None
+    text = url.strip()
+
+    key_match = PROBLEM_KEY_RE.match(text)
+    if key_match:
+        return _make(key_match.group(1), key_match.group(2), 'contest')
+
+    if '://' not in text:
+        text = 'https://' + text.lstrip('/')
+    try:
+        parts = urlsplit(text)
+    except ValueError:
+        return None
+    if not _is_codeforces_host(parts.netloc):
+        return None
+
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+    for kind, pattern in PROBLEM_PATHS:
+        match = pattern.match(path)
+        if match:
+            return _make(match.group(1), match.group(2), kind)
+    return None
+
+
+def alias_form(url: str) -> str:
+    """
+    Alias-index key of a raw URL: host and path only, lower-cased, without scheme,
+    query string, fragment or trailing slash, so those variants share one entry
+    """
+    text = url.strip().lower()
+    if PROBLEM_KEY_RE.match(text):
+        return text
+    if '://' not in text:
+        text = 'https://' + text.lstrip('/')
+    try:
+        parts = urlsplit(text)
+    except ValueError:
+        return text
+    return parts.netloc + re.sub(r'/{2,}', '/', parts.path).rstrip('/')
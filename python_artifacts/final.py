@@ -2,10 +2,42 @@
 
 from curl_cffi import requests
 from bs4 import BeautifulSoup
+import argparse
 import json
 import re
 import os
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from codeforces_api import CodeforcesAPI, CodeforcesAPIError
+from codeforces_urls import CanonicalProblem, alias_form, canonicalize_problem_url
+from problem_index import ProblemSearchIndex, contest_of
+from problem_similarity import SimilarProblemIndex
+from sibling_prefetch import SiblingPrefetcher
+from submission_codes import SubmissionCodeResolver
+from throttle import fetch_limiter
+from page_archive import PageArchive
+
+URL_ALIAS_LIMIT = 20000  # URL forms remembered for resolve_problem_url
+# What a problem page provides; a reparse refreshes only these on a stored record
+PAGE_FIELDS = ('problem_title', 'time_limit', 'memory_limit', 'statement',
+               'sample_inputs', 'sample_outputs', 'notes')
+EDITORIAL_SECTIONS = ('hints', 'solutions', 'tutorials', 'editorials')
+
+
+def _parse_archived_page(job: Tuple[str, str, str, str]) -> Tuple[str, str, object]:
+    """Process-pool worker: parse one archived page (kind, url, sha256, archive root)."""
+    kind, url, digest, root = job
+    try:
+        html = PageArchive(root).load(digest)
+        if kind == 'editorial':
+            return kind, url, ComprehensiveCodeforcesSolutionExtractor.extract_solutions_from_html(html)
+        return kind, url, ComprehensiveCodeforcesSolutionExtractor.parse_problem_page(html, url)
+    except Exception as e:
+        print(f"❌ Error reparsing {url}: {e}")
+        return kind, url, None
 
 
 class ComprehensiveCodeforcesSolutionExtractor:
@@ -13,6 +45,17 @@ class ComprehensiveCodeforcesSolutionExtractor:
         self.scraper = requests.Session(impersonate="chrome110")
         self.problems_data = {}
         self.data_file = "comprehensive_codeforces_problems.json"
+        self.search_index = ProblemSearchIndex()
+        self.similarity_index = SimilarProblemIndex()
+        # Recently seen URL forms (host and path) -> their canonical problem
+        self.url_aliases: "OrderedDict[str, CanonicalProblem]" = OrderedDict()
+        self.alias_lock = threading.Lock()
+        # Every fetched page is archived raw so the store can be rebuilt offline
+        self.archive = PageArchive()
+        # Guards problems_data against the background submission resolver
+        self.data_lock = threading.RLock()
+        self.submission_resolver = SubmissionCodeResolver()
+        self.prefetcher = SiblingPrefetcher(self)
         self.load_existing_data()
 
     def load_existing_data(self):
@@ -26,21 +69,57 @@ class ComprehensiveCodeforcesSolutionExtractor:
             except Exception as e:
                 print(f"Error loading existing data: {e}")
                 self.problems_data = {}
+        self.search_index.rebuild(self.problems_data)
+        self.similarity_index.rebuild(self.problems_data)
+        for data in self.problems_data.values():
+            if data.get('url'):
+                self.resolve_problem_url(data['url'])
+
+    def resolve_problem_url(self, url: str) -> Optional[CanonicalProblem]:
+        """Canonical problem for a URL; recent forms are remembered, so repeats are one dict hit."""
+        alias = alias_form(url)
+        with self.alias_lock:
+            canonical = self.url_aliases.get(alias)
+            if canonical is not None:
+                self.url_aliases.move_to_end(alias)
+                return canonical
+        canonical = canonicalize_problem_url(url)
+        if canonical:
+            with self.alias_lock:
+                self.url_aliases[alias] = canonical
+                self.url_aliases[alias_form(canonical.url)] = canonical
+                while len(self.url_aliases) > URL_ALIAS_LIMIT:
+                    self.url_aliases.popitem(last=False)
+        return canonical
+
+    def store_problem(self, problem_id: str, problem_data: Dict):
+        """Store a problem record and keep the search and similarity indexes in sync."""
+        with self.data_lock:
+            self.problems_data[problem_id] = problem_data
+        self.search_index.add(problem_id, problem_data)
+        self.similarity_index.add(problem_id, problem_data)
 
     def save_data(self):
         """Save problems data to JSON file."""
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
+            with self.data_lock, open(self.data_file, 'w', encoding='utf-8') as f:
                 json.dump(self.problems_data, f, indent=2, ensure_ascii=False)
             print(
                 f"Saved {len(self.problems_data)} problems to {self.data_file}")
         except Exception as e:
             print(f"Error saving data: {e}")
 
-    def extract_problem_info(self, url: str) -> Optional[Dict]:
+    def extract_problem_info(self, url: str, background: bool = False) -> Optional[Dict]:
         """Extract basic problem information from a Codeforces problem page."""
+        canonical = self.resolve_problem_url(url)
+        if not canonical:
+            print(f"❌ Not a Codeforces problem URL: {url}")
+            return None
+        url = canonical.url
+
         try:
             print(f"🔍 Fetching problem from: {url}")
+            fetch_limiter.acquire(background=background)
             response = self.scraper.get(url)
 
             if response.status_code != 200:
@@ -48,131 +127,137 @@ class ComprehensiveCodeforcesSolutionExtractor:
                     f"❌ Failed to fetch URL. Status code: {response.status_code}")
                 return None
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Keep the raw page so parser fixes can be re-applied offline
+            self.archive.store(url, response.text, 'problem')
 
-            # Extract contest title
-            contest_title_elem = soup.find(
-                'th', string=lambda text: text and 'Codeforces Round' in text)
-            if not contest_title_elem:
-                contest_title_elem = soup.find(
-                    'a', href=lambda href: href and '/contest/' in href)
-
-            contest_title = ""
-            if contest_title_elem:
-                contest_title = contest_title_elem.get_text(strip=True)
-
-            # Extract problem information
-            problem_div = soup.find('div', class_='problem-statement')
-            if not problem_div:
-                print("❌ Could not find problem statement")
-                return None
+            return self.parse_problem_page(response.text, url)
 
-            # Extract problem title
-            title_elem = problem_div.find('div', class_='title')
-            problem_title = title_elem.get_text(
-                strip=True) if title_elem else "Unknown"
-
-            # Extract problem ID from URL
-            url_parts = url.split('/')
-            problem_id = ""
-            if 'contest' in url_parts and 'problem' in url_parts:
-                problem_index = url_parts.index('problem')
-                if problem_index > 0:
-                    problem_id = url_parts[problem_index-1] + url_parts[problem_index+1]
-            elif 'problemset' in url_parts and 'problem' in url_parts:
-                problem_index = url_parts.index('problem')
-                if len(url_parts) > problem_index + 2:
-                    problem_id = url_parts[problem_index+1] + url_parts[problem_index+2]
-
-            # Extract constraints
-            time_limit_elem = problem_div.find('div', class_='time-limit')
-            memory_limit_elem = problem_div.find('div', class_='memory-limit')
-
-            time_limit = ""
-            memory_limit = ""
-
-            if time_limit_elem:
-                time_limit = time_limit_elem.get_text(
-                    strip=True).replace('time limit per test', '').strip()
-            if memory_limit_elem:
-                memory_limit = memory_limit_elem.get_text(
-                    strip=True).replace('memory limit per test', '').strip()
-
-            # Extract problem statement
-            statement_parts = []
-            header = problem_div.find('div', class_='header')
-            if header:
-                current = header.find_next_sibling()
-                while current and not (current.name == 'div' and 'sample-tests' in str(current.get('class', []))):
-                    if current.name == 'div':
-                        text = current.get_text(strip=True)
-                        if text:
-                            statement_parts.append(text)
-                    current = current.find_next_sibling()
-
-            problem_statement = '\n\n'.join(statement_parts)
-
-            # Extract sample input/output
-            sample_tests_div = problem_div.find('div', class_='sample-tests')
-            sample_inputs = []
-            sample_outputs = []
-
-            if sample_tests_div:
-                input_divs = sample_tests_div.find_all('div', class_='input')
-                output_divs = sample_tests_div.find_all('div', class_='output')
-
-                for input_div in input_divs:
-                    pre_elem = input_div.find('pre')
-                    if pre_elem:
-                        sample_inputs.append(pre_elem.get_text(strip=True))
-
-                for output_div in output_divs:
-                    pre_elem = output_div.find('pre')
-                    if pre_elem:
-                        sample_outputs.append(pre_elem.get_text(strip=True))
-
-            # Extract notes
-            note_div = problem_div.find('div', class_='note')
-            notes = note_div.get_text(strip=True) if note_div else ""
-
-            # Extract tags
-            tags = []
-            tag_elements = soup.find_all('span', class_='tag-box')
-            for tag_elem in tag_elements:
-                tag_text = tag_elem.get_text(strip=True)
-                if tag_text:
-                    tags.append(tag_text)
-
-            # Extract tutorial links
-            tutorial_info = self.extract_tutorial_links(soup)
+        except Exception as e:
+            print(f"❌ Error processing URL {url}: {e}")
+            return None
 
-            problem_data = {
-                'contest_title': contest_title,
-                'problem_id': problem_id,
-                'problem_title': problem_title,
-                'time_limit': time_limit,
-                'memory_limit': memory_limit,
-                'statement': problem_statement,
-                'sample_inputs': sample_inputs,
-                'sample_outputs': sample_outputs,
-                'notes': notes,
-                'tags': tags,
-                'url': url,
-                'tutorial_info': tutorial_info,
-                # Enhanced fields for editorial content
-                'hints': [],
-                'solutions': [],
-                'tutorials': [],
-                'editorials': []
-            }
+    @classmethod
+    def parse_problem_page(cls, html: str, url: str) -> Optional[Dict]:
+        """Parse a problem page (fetched live or read from the archive) into a problem record."""
+        canonical = canonicalize_problem_url(url)
+        if not canonical:
+            return None
+        url = canonical.url
 
-            return problem_data
+        soup = BeautifulSoup(html, 'html.parser')
 
-        except Exception as e:
-            print(f"❌ Error processing URL {url}: {e}")
+        # Extract contest title
+        contest_title_elem = soup.find(
+            'th', string=lambda text: text and 'Codeforces Round' in text)
+        if not contest_title_elem:
+            contest_title_elem = soup.find(
+                'a', href=lambda href: href and '/contest/' in href)
+
+        contest_title = ""
+        if contest_title_elem:
+            contest_title = contest_title_elem.get_text(strip=True)
+
+        # Extract problem information
+        problem_div = soup.find('div', class_='problem-statement')
+        if not problem_div:
+            print("❌ Could not find problem statement")
             return None
 
-    def extract_tutorial_links(self, soup) -> Dict:
+        # Extract problem title
+        title_elem = problem_div.find('div', class_='title')
+        problem_title = title_elem.get_text(
+            strip=True) if title_elem else "Unknown"
+
+        # Problem ID is the canonical key, whatever form the URL came in
+        problem_id = canonical.key
+
+        # Extract constraints
+        time_limit_elem = problem_div.find('div', class_='time-limit')
+        memory_limit_elem = problem_div.find('div', class_='memory-limit')
+
+        time_limit = ""
+        memory_limit = ""
+
+        if time_limit_elem:
+            time_limit = time_limit_elem.get_text(
+                strip=True).replace('time limit per test', '').strip()
+        if memory_limit_elem:
+            memory_limit = memory_limit_elem.get_text(
+                strip=True).replace('memory limit per test', '').strip()
+
+        # Extract problem statement
+        statement_parts = []
+        header = problem_div.find('div', class_='header')
+        if header:
+            current = header.find_next_sibling()
+            while current and not (current.name == 'div' and 'sample-tests' in str(current.get('class', []))):
+                if current.name == 'div':
+                    text = current.get_text(strip=True)
+                    if text:
+                        statement_parts.append(text)
+                current = current.find_next_sibling()
+
+        problem_statement = '\n\n'.join(statement_parts)
+
+        # Extract sample input/output
+        sample_tests_div = problem_div.find('div', class_='sample-tests')
+        sample_inputs = []
+        sample_outputs = []
+
+        if sample_tests_div:
+            input_divs = sample_tests_div.find_all('div', class_='input')
+            output_divs = sample_tests_div.find_all('div', class_='output')
+
+            for input_div in input_divs:
+                pre_elem = input_div.find('pre')
+                if pre_elem:
+                    # Newer pages put every sample line in its own div; keep the line breaks
+                    sample_inputs.append(pre_elem.get_text('\n', strip=True))
+
+            for output_div in output_divs:
+                pre_elem = output_div.find('pre')
+                if pre_elem:
+                    sample_outputs.append(pre_elem.get_text('\n', strip=True))
+
+        # Extract notes
+        note_div = problem_div.find('div', class_='note')
+        notes = note_div.get_text(strip=True) if note_div else ""
+
+        # Extract tags
+        tags = []
+        tag_elements = soup.find_all('span', class_='tag-box')
+        for tag_elem in tag_elements:
+            tag_text = tag_elem.get_text(strip=True)
+            if tag_text:
+                tags.append(tag_text)
+
+        # Extract tutorial links
+        tutorial_info = cls.extract_tutorial_links(soup)
+
+        problem_data = {
+            'contest_title': contest_title,
+            'problem_id': problem_id,
+            'problem_title': problem_title,
+            'time_limit': time_limit,
+            'memory_limit': memory_limit,
+            'statement': problem_statement,
+            'sample_inputs': sample_inputs,
+            'sample_outputs': sample_outputs,
+            'notes': notes,
+            'tags': tags,
+            'url': url,
+            'tutorial_info': tutorial_info,
+            # Enhanced fields for editorial content
+            'hints': [],
+            'solutions': [],
+            'tutorials': [],
+            'editorials': []
+        }
+
+        return problem_data
+
+    @staticmethod
+    def extract_tutorial_links(soup) -> Dict:
         """Extract tutorial/editorial links from the contest materials section."""
         tutorial_info = {
             'has_tutorial': False,
@@ -207,6 +292,7 @@ class ComprehensiveCodeforcesSolutionExtractor:
         """Extract ALL problems and their content from an editorial page."""
         try:
             print(f"📖 Fetching editorial from: {editorial_url}")
+            fetch_limiter.acquire()
             response = self.scraper.get(editorial_url)
 
             if response.status_code != 200:
@@ -214,7 +300,7 @@ class ComprehensiveCodeforcesSolutionExtractor:
                     f"❌ Failed to fetch editorial. Status code: {response.status_code}")
                 return []
 
-
+            self.archive.store(editorial_url, response.text, 'editorial')
 
             # Extract all problems using the enhanced logic
             problems = self.extract_solutions_from_html(response.text)
@@ -224,7 +310,8 @@ class ComprehensiveCodeforcesSolutionExtractor:
             print(f"❌ Error processing editorial {editorial_url}: {e}")
             return []
 
-    def extract_solutions_from_html(self, html_content: str) -> List[Dict]:
+    @staticmethod
+    def extract_solutions_from_html(html_content: str) -> List[Dict]:
         """
         Enhanced extraction from editorial HTML - extracts ALL problems
         """
@@ -368,81 +455,261 @@ class ComprehensiveCodeforcesSolutionExtractor:
         print(f"✅ Successfully extracted problem: {problem_id}")
 
         # Process editorial if available
-        tutorial_info = problem_data.get('tutorial_info', {})
-        if tutorial_info.get('has_tutorial') and tutorial_info.get('tutorial_links'):
-            for tutorial_link in tutorial_info['tutorial_links']:
-                editorial_url = tutorial_link['full_url']
-                print(f"📖 Processing editorial: {editorial_url}")
-
-                # Extract ALL problems from editorial
-                all_editorial_problems = self.extract_all_editorial_content(
-                    editorial_url)
-                print(
-                    f"✅ Found {len(all_editorial_problems)} problems in editorial!")
-
-                # Find the specific problem we're looking for
-                target_problem = None
-                for editorial_problem in all_editorial_problems:
-                    if editorial_problem['id'] == problem_id:
-                        target_problem = editorial_problem
-                        break
-
-                if target_problem:
-                    # Merge editorial data into problem data
-                    problem_data['hints'].extend(
-                        target_problem.get('hints', []))
-                    problem_data['solutions'].extend(
-                        target_problem.get('solutions', []))
-                    problem_data['tutorials'].extend(
-                        target_problem.get('tutorials', []))
-                    problem_data['editorials'].extend(
-                        target_problem.get('editorials', []))
-
-                    total_content = len(problem_data['hints']) + len(problem_data['solutions']) + len(
-                        problem_data['tutorials']) + len(problem_data['editorials'])
-                    print(
-                        f"✅ Found {total_content} total content items for {problem_id}!")
-                else:
-                    print(f"⚠️  Could not find {problem_id} in editorial")
-
-                # Also save all other problems found in editorial
-                for editorial_problem in all_editorial_problems:
-                    if editorial_problem['id'] != problem_id:
-                        # Create a basic problem entry for this
-                        basic_problem_data = {
-                            'contest_title': problem_data['contest_title'],
-                            'problem_id': editorial_problem['id'],
-                            'problem_title': editorial_problem['name'],
-                            'time_limit': '',
-                            'memory_limit': '',
-                            'statement': '',
-                            'sample_inputs': [],
-                            'sample_outputs': [],
-                            'notes': '',
-                            'tags': [],
-                            'url': '',
-                            'tutorial_info': tutorial_info,
-                            'hints': editorial_problem.get('hints', []),
-                            'solutions': editorial_problem.get('solutions', []),
-                            'tutorials': editorial_problem.get('tutorials', []),
-                            'editorials': editorial_problem.get('editorials', [])
-                        }
-                        self.problems_data[editorial_problem['id']
-                                           ] = basic_problem_data
-                        print(
-                            f"✅ Also saved {editorial_problem['id']} from editorial")
-
-                break  # Use first tutorial link
+        editorial_problems = []
+        editorial_url = self.editorial_url_of(problem_data)
+        if editorial_url:
+            print(f"📖 Processing editorial: {editorial_url}")
+
+            # Extract ALL problems from editorial
+            editorial_problems = self.extract_all_editorial_content(
+                editorial_url)
+            print(
+                f"✅ Found {len(editorial_problems)} problems in editorial!")
         else:
             print("⚠️  No tutorial/editorial found for this problem")
 
-        # Save the main problem to problems data
-        self.problems_data[problem_id] = problem_data
+        records = self.merge_editorial(problem_data, editorial_problems)
+        self.store_records(records)
         self.save_data()
 
+        # Editorial code given only as submission IDs is fetched without holding up the caller
+        self.submission_resolver.resolve_in_background(
+            [(record_id, self.problems_data[record_id]) for record_id in records],
+            lock=self.data_lock,
+            on_done=lambda filled: filled and self.save_data())
+
+        # The student will likely open another problem of this contest next
+        self.prefetcher.schedule(problem_id, [
+            record_id for record_id in records
+            if record_id != problem_id and not self.problems_data[record_id].get('statement')])
+
         print(f"✅ Problem {problem_id} processing complete!")
         return True
 
+    def reparse_archive(self, workers: Optional[int] = None) -> int:
+        """Rebuild stored problems from the raw page archive without any network access."""
+        entries = list(self.archive.latest_entries().values())
+        if not entries:
+            print(f"⚠️  No archived pages in {self.archive.root}")
+            return 0
+
+        print(f"♻️  Reparsing {len(entries)} archived pages...")
+        jobs = [(entry['kind'], entry['url'], entry['sha256'], self.archive.root) for entry in entries]
+        problem_pages: Dict[str, Dict] = {}
+        editorial_pages: Dict[str, List[Dict]] = {}
+        # Parsing is CPU-bound BeautifulSoup work, so spread it over processes
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for kind, url, parsed in pool.map(_parse_archived_page, jobs, chunksize=8):
+                if not parsed:
+                    continue
+                if kind == 'editorial':
+                    editorial_pages[url] = parsed
+                else:
+                    problem_pages[url] = parsed
+
+        # Problems missing from the archive are left as they are
+        for problem_data in sorted(problem_pages.values(), key=lambda data: data['problem_id']):
+            editorial_problems = editorial_pages.get(self.editorial_url_of(problem_data), [])
+            records = self.merge_editorial(problem_data, editorial_problems)
+            self.overlay_page(records.pop(problem_data['problem_id']))
+            self.store_records(records)
+
+        self.save_data()
+        print(f"✅ Reparsed {len(problem_pages)} problems and {len(editorial_pages)} editorials")
+        return len(problem_pages)
+
+    def ingest_problemset(self, recorded_dir: Optional[str] = None, record_dir: Optional[str] = None,
+                          add_new: bool = False) -> int:
+        """
+        Merge names, tags and ratings of the whole problemset into the store from
+        the Codeforces API in one bulk request. Only known problems are updated
+        unless add_new is set, in which case every problem gets a metadata entry.
+        """
+        api = CodeforcesAPI(self.scraper, recorded_dir=recorded_dir, record_dir=record_dir)
+        try:
+            print("📦 Fetching problemset metadata from the Codeforces API...")
+            metadata = api.problemset_metadata()
+        except (CodeforcesAPIError, ValueError) as e:
+            print(f"❌ Bulk ingestion failed: {e}")
+            return 0
+        print(f"✅ Got metadata for {len(metadata)} problems")
+
+        updated = 0
+        for problem_id, meta in metadata.items():
+            existing = self.problems_data.get(problem_id)
+            if existing is None:
+                if not add_new:
+                    continue
+                record = {
+                    'contest_title': meta['contest_title'],
+                    'problem_id': problem_id,
+                    'problem_title': meta['problem_title'],
+                    'time_limit': '',
+                    'memory_limit': '',
+                    'statement': '',
+                    'sample_inputs': [],
+                    'sample_outputs': [],
+                    'notes': '',
+                    'tags': meta['tags'],
+                    'rating': meta['rating'],
+                    'solved_count': meta['solved_count'],
+                    'url': meta['url'],
+                    'tutorial_info': {},
+                    'hints': [],
+                    'solutions': [],
+                    'tutorials': [],
+                    'editorials': []
+                }
+            else:
+                record = dict(existing)
+                record['tags'] = meta['tags'] or existing.get('tags', [])
+                record['rating'] = meta['rating']
+                record['solved_count'] = meta['solved_count']
+                for field in ('url', 'contest_title'):
+                    if not existing.get(field):
+                        record[field] = meta[field]
+                # Editorial-only entries carry the editorial's (possibly translated) heading
+                if not existing.get('statement'):
+                    record['problem_title'] = meta['problem_title']
+                if record == existing:
+                    continue
+
+            self.store_problem(problem_id, record)
+            if record.get('url'):
+                self.resolve_problem_url(record['url'])
+            updated += 1
+
+        if updated:
+            self.save_data()
+        print(f"✅ Updated {updated} problems from the problemset API")
+        return updated
+
+    @staticmethod
+    def editorial_url_of(problem_data: Dict) -> Optional[str]:
+        """URL of the first tutorial link on a problem page, if any."""
+        tutorial_info = problem_data.get('tutorial_info', {})
+        if tutorial_info.get('has_tutorial') and tutorial_info.get('tutorial_links'):
+            return tutorial_info['tutorial_links'][0]['full_url']
+        return None
+
+    @staticmethod
+    def merge_editorial(problem_data: Dict, editorial_problems: List[Dict]) -> Dict[str, Dict]:
+        """
+        Merge editorial content into a problem record. Returns the records to store:
+        the problem itself plus a basic entry for every other problem in the editorial.
+        """
+        problem_id = problem_data['problem_id']
+        tutorial_info = problem_data.get('tutorial_info', {})
+        records = {}
+
+        # Find the specific problem we're looking for
+        target_problem = None
+        for editorial_problem in editorial_problems:
+            if editorial_problem['id'] == problem_id:
+                target_problem = editorial_problem
+                break
+
+        if target_problem:
+            # Merge editorial data into problem data
+            problem_data['hints'].extend(target_problem.get('hints', []))
+            problem_data['solutions'].extend(target_problem.get('solutions', []))
+            problem_data['tutorials'].extend(target_problem.get('tutorials', []))
+            problem_data['editorials'].extend(target_problem.get('editorials', []))
+
+            total_content = len(problem_data['hints']) + len(problem_data['solutions']) + len(
+                problem_data['tutorials']) + len(problem_data['editorials'])
+            print(
+                f"✅ Found {total_content} total content items for {problem_id}!")
+        elif editorial_problems:
+            print(f"⚠️  Could not find {problem_id} in editorial")
+
+        # Also save all other problems found in editorial
+        for editorial_problem in editorial_problems:
+            if editorial_problem['id'] != problem_id:
+                # Create a basic problem entry for this
+                records[editorial_problem['id']] = {
+                    'contest_title': problem_data['contest_title'],
+                    'problem_id': editorial_problem['id'],
+                    'problem_title': editorial_problem['name'],
+                    'time_limit': '',
+                    'memory_limit': '',
+                    'statement': '',
+                    'sample_inputs': [],
+                    'sample_outputs': [],
+                    'notes': '',
+                    'tags': [],
+                    'url': '',
+                    'tutorial_info': tutorial_info,
+                    'hints': editorial_problem.get('hints', []),
+                    'solutions': editorial_problem.get('solutions', []),
+                    'tutorials': editorial_problem.get('tutorials', []),
+                    'editorials': editorial_problem.get('editorials', [])
+                }
+
+        # The main problem goes last so it wins over any basic entry with the same ID
+        records[problem_id] = problem_data
+        return records
+
+    def store_records(self, records: Dict[str, Dict]):
+        """
+        Store merged records over what is already stored. A basic editorial entry only
+        adds its editorial content, so it never wipes an extracted statement or ingested
+        metadata; a freshly extracted page replaces the fields it has values for.
+        """
+        main_id = next(reversed(records), None)
+        for record_id, record in records.items():
+            with self.data_lock:
+                existing = self.problems_data.get(record_id)
+                if existing:
+                    merged = dict(existing)
+                    if record.get('statement'):
+                        merged.update({field: value for field, value in record.items()
+                                       if value or not existing.get(field)})
+                    else:
+                        for field, value in record.items():
+                            if (field in EDITORIAL_SECTIONS and value) or not merged.get(field):
+                                merged[field] = value
+                    record = merged
+                self.store_problem(record_id, record)
+            if record_id != main_id:
+                print(f"✅ Also saved {record_id} from editorial")
+
+    def overlay_page(self, problem_data: Dict):
+        """
+        Refresh a stored record from a reparsed page: statement and sample fields are
+        replaced, everything else (ingested rating and solved count, resolved submission
+        codes, merged editorial sections) is kept and only filled in where missing.
+        """
+        problem_id = problem_data['problem_id']
+        with self.data_lock:
+            existing = self.problems_data.get(problem_id)
+            if existing is None:
+                record = problem_data
+            else:
+                record = dict(existing)
+                for field in PAGE_FIELDS:
+                    record[field] = problem_data[field]
+                for field, value in problem_data.items():
+                    if field not in PAGE_FIELDS and not record.get(field):
+                        record[field] = value
+            self.store_problem(problem_id, record)
+
+    def fill_statement(self, problem_id: str, problem_data: Dict):
+        """Add a fetched problem page to a stub record, keeping the editorial content it already has."""
+        with self.data_lock:
+            existing = self.problems_data.get(problem_id)
+            if existing and existing.get('statement'):
+                return
+            record = dict(existing or {})
+            for field, value in problem_data.items():
+                if field in ('hints', 'solutions', 'tutorials', 'editorials'):
+                    record.setdefault(field, value)
+                else:
+                    record[field] = value
+            self.store_problem(problem_id, record)
+        if record.get('url'):
+            self.resolve_problem_url(record['url'])
+
     def list_problems(self):
         """List all stored problems with numbers for selection."""
         if not self.problems_data:
@@ -531,6 +798,65 @@ class ComprehensiveCodeforcesSolutionExtractor:
         """Search for a problem by ID."""
         return self.problems_data.get(problem_id.upper())
 
+    def search_problems(self, query: str, tags: Optional[List[str]] = None,
+                        contest: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """Full-text search over titles, statements, tags and editorial text (BM25 ranked)."""
+        results = []
+        for hit in self.search_index.search(query, tags=tags, contest=contest, limit=limit):
+            data = self.problems_data.get(hit['problem_id'], {})
+            results.append({
+                'problem_id': hit['problem_id'],
+                'problem_title': data.get('problem_title', ''),
+                'contest_id': contest_of(hit['problem_id']),
+                'contest_title': data.get('contest_title', ''),
+                'tags': data.get('tags', []),
+                'url': data.get('url', ''),
+                'score': hit['score']
+            })
+        return results
+
+    def similar_problems(self, problem_id: str, k: int = 5) -> Optional[List[Dict]]:
+        """Stored problems most similar to the given one (cosine over hashed n-gram vectors)."""
+        hits = self.similarity_index.similar_to(problem_id.upper(), k)
+        if hits is None:
+            return None
+
+        results = []
+        for hit in hits:
+            data = self.problems_data.get(hit['problem_id'], {})
+            results.append({
+                'problem_id': hit['problem_id'],
+                'problem_title': data.get('problem_title', ''),
+                'contest_title': data.get('contest_title', ''),
+                'tags': data.get('tags', []),
+                'url': data.get('url', ''),
+                'score': hit['score']
+            })
+        return results
+
+    def print_search_results(self, query: str):
+        """Print search results for the CLI ('search <query> [tag:<tag>] [contest:<id>]')."""
+        tags = []
+        contest = None
+        words = []
+        for word in query.split():
+            if word.lower().startswith('tag:'):
+                tags.append(word[4:].replace('_', ' '))
+            elif word.lower().startswith('contest:'):
+                contest = word[8:]
+            else:
+                words.append(word)
+
+        results = self.search_problems(' '.join(words), tags=tags, contest=contest)
+        if not results:
+            print(f"❌ No problems match '{query}'.")
+            return
+
+        print(f"\n🔎 SEARCH RESULTS ({len(results)}):")
+        for i, result in enumerate(results, 1):
+            tag_text = f" [{', '.join(result['tags'])}]" if result['tags'] else ""
+            print(f"  {i}. {result['problem_id']}: {result['problem_title']}{tag_text} (score {result['score']})")
+
     def interactive_mode(self):
         """Run in interactive mode."""
         print(f"\n{'='*60}")
@@ -553,6 +879,7 @@ class ComprehensiveCodeforcesSolutionExtractor:
         print("  - Enter a number (1,2,3...) to select a problem")
         print("  - Enter a problem ID (e.g., 2135C) to search")
         print("  - Enter 'add <URL>' to process a new problem")
+        print("  - Enter 'search <words> [tag:<tag>] [contest:<id>]' to search problems")
         print("  - Enter 'list' to show all problems")
         print("  - Enter 'quit' to exit")
         print("-" * 60)
@@ -575,6 +902,8 @@ class ComprehensiveCodeforcesSolutionExtractor:
                         self.process_problem_url(url)
                     else:
                         print("❌ Please provide a URL after 'add'")
+                elif command.lower().startswith('search '):
+                    self.print_search_results(command[7:].strip())
                 elif command.isdigit() and command in problem_list:
                     # Select by number
                     problem_id = problem_list[command]
@@ -597,8 +926,27 @@ class ComprehensiveCodeforcesSolutionExtractor:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Codeforces problem and editorial extractor")
+    subparsers = parser.add_subparsers(dest='command')
+    reparse_parser = subparsers.add_parser('reparse', help="rebuild the problem store from archived raw pages")
+    reparse_parser.add_argument('--workers', type=int, default=None,
+                                help="parser processes (default: CPU count)")
+    ingest_parser = subparsers.add_parser('ingest', help="merge tags and ratings from the Codeforces problemset API")
+    ingest_parser.add_argument('--recorded', metavar='DIR',
+                               help="replay recorded API responses from DIR instead of the network")
+    ingest_parser.add_argument('--record', metavar='DIR',
+                               help="save the live API responses to DIR for later replay")
+    ingest_parser.add_argument('--add-new', action='store_true',
+                               help="also add metadata entries for problems not in the store")
+    args = parser.parse_args()
+
     extractor = ComprehensiveCodeforcesSolutionExtractor()
-    extractor.interactive_mode()
+    if args.command == 'reparse':
+        extractor.reparse_archive(workers=args.workers)
+    elif args.command == 'ingest':
+        extractor.ingest_problemset(recorded_dir=args.recorded, record_dir=args.record, add_new=args.add_new)
+    else:
+        extractor.interactive_mode()
 
 
 if __name__ == "__main__":
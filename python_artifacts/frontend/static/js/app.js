@@ -409,7 +409,7 @@ async function submitProblemUrl() {
     document.getElementById('hints-counter').textContent = 'Hints given: 0';
     chatMessages.innerHTML = '';
     conversation.history = [];
-    addMessage('assistant', result.welcome_message);
+    showWelcomeMessage(result, conversation);
     chatInput.focus();
     
     console.log('Session started successfully. Conversations:', conversations);
@@ -460,7 +460,7 @@ async function startSession() {
     document.getElementById('hints-counter').textContent = 'Hints given: 0';
     chatMessages.innerHTML = '';
     conversation.history = [];
-    addMessage('assistant', result.welcome_message);
+    showWelcomeMessage(result, conversation);
     chatInput.focus();
     
     console.log('Session started successfully. Conversations:', conversations);
@@ -472,6 +472,45 @@ async function startSession() {
   finally { hideLoading(globalLoading); }
 }
 
+// The session is usable right away; unless it was cached, the overview arrives over SSE
+function showWelcomeMessage(result, conversation) {
+  if (result.welcome_message) {
+    addMessage('assistant', result.welcome_message);
+    return;
+  }
+  
+  const messageElement = document.createElement('div');
+  messageElement.classList.add('message', 'assistant');
+  const contentDiv = document.createElement('div');
+  contentDiv.classList.add('message-content');
+  contentDiv.innerHTML = '<em>Preparing an overview of the problem...</em>';
+  messageElement.appendChild(contentDiv);
+  chatMessages.appendChild(messageElement);
+  
+  const source = new EventSource(result.welcome_url);
+  source.onmessage = (event) => {
+    source.close();
+    const data = JSON.parse(event.data);
+    if (data.error) {
+      contentDiv.innerHTML = 'The problem overview is unavailable right now. Ask away anyway!';
+      return;
+    }
+    contentDiv.innerHTML = processMessageContent(data.welcome_message);
+    attachCopyButtons(messageElement);
+    if (window.MathJax && window.MathJax.typesetPromise) {
+      MathJax.typesetPromise([messageElement]).catch((err) => console.log('MathJax error:', err));
+    }
+    // The student may have written already; keep the overview first, as on screen
+    conversation.history.unshift({ type: 'assistant', content: data.welcome_message, timestamp: new Date().toISOString() });
+    saveToLocalStorage();
+  };
+  source.onerror = () => {
+    // EventSource would reconnect forever; the overview is optional
+    source.close();
+    contentDiv.innerHTML = 'The problem overview is unavailable right now. Ask away anyway!';
+  };
+}
+
 // Chat
 async function sendMessage() {
   const message = chatInput.value.trim();
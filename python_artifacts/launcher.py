@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+Codeforces AI Tutor - Production Launcher
+
+Runs the app under gunicorn instead of a development server:
+
+- gthread workers; thread count sized from the CPU count, since requests
+  mostly wait on Gemini and Codeforces rather than compute
+- exactly one worker process, because sessions live in process memory and
+  each process journals and compacts storage.json from its own registry;
+  WEB_CONCURRENCY (set automatically by Heroku and Railway) is clamped to 1
+- the app is preloaded in the master, its lazily built services warmed up
+  and the heap frozen before forking, so the problem store and indexes are
+  shared copy-on-write by the workers
+- SIGTERM stops accepting connections and lets in-flight requests, including
+  open SSE chat streams, finish for up to GRACEFUL_TIMEOUT seconds
+- each worker flushes and compacts its dirty session state on exit
+
+SERVER_MODE=asgi runs the ASGI app (backend/asgi.py) on uvicorn workers
+instead. gunicorn needs a Unix-like OS; on Windows use start_server.py.
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_GRACEFUL_TIMEOUT = 30
+DEFAULT_TIMEOUT = 120  # a single generation can take a while
+
+
+def default_threads() -> int:
+    """Threads per worker: I/O-bound handlers, so several per core"""
+    return min(4 * (2 * multiprocessing.cpu_count() + 1), 64)
+
+
+def worker_count() -> int:
+    """Worker processes: always 1 while sessions live in process memory"""
+    requested = int(os.getenv('WEB_CONCURRENCY') or 1)
+    if requested > 1:
+        # A second worker would neither see the first one's sessions nor its journaled
+        # writes, and its compaction would truncate them from storage.json
+        print(f"⚠️  WEB_CONCURRENCY={requested} ignored: sessions live in process memory, "
+              f"running 1 worker (scale with GUNICORN_THREADS instead)")
+    return 1
+
+
+def build_options() -> dict:
+    port = os.getenv('PORT', os.getenv('FLASK_PORT', '5000'))
+    host = os.getenv('FLASK_HOST', '0.0.0.0')
+    asgi = os.getenv('SERVER_MODE', 'flask').lower() == 'asgi'
+
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': worker_count(),
+        'preload_app': True,
+        'graceful_timeout': int(os.getenv('GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT)),
+        'timeout': int(os.getenv('GUNICORN_TIMEOUT', DEFAULT_TIMEOUT)),
+        'keepalive': 5,
+        'accesslog': '-',
+        'errorlog': '-',
+        'pre_fork': pre_fork,
+        'worker_exit': worker_exit,
+    }
+    if asgi:
+        options['worker_class'] = 'uvicorn.workers.UvicornWorker'
+    else:
+        options['worker_class'] = 'gthread'
+        options['threads'] = int(os.getenv('GUNICORN_THREADS') or 0) or default_threads()
+    return options
+
+
+def pre_fork(server, worker):
+    # Preloaded objects move to a permanent generation the collector never scans,
+    # so collections in the workers don't write to (and un-share) their pages
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    """Flush everything the worker still holds in its write-behind buffer"""
+    from backend.app import close_storage
+    close_storage()
+
+
+class TutorApplication(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from backend.app import warm_up_services
+        if self.options.get('worker_class') == 'gthread':
+            from backend.app import app
+        else:
+            from backend.asgi import app
+        if self.cfg.preload_app:
+            # Services are built lazily on first use; with a preloading master they are
+            # built once here instead, and the workers share them copy-on-write
+            warm_up_services()
+        return app
+
+
+def main():
+    # Relative paths (storage.json, the problem store) resolve against the project root
+    os.chdir(project_root)
+    sys.path.insert(0, project_root)
+    # Server settings come from .env too, and they are read before the app loads it
+    load_dotenv(os.path.join(project_root, '.env'))
+
+    options = build_options()
+    print("=" * 60)
+    print("🎯 CODEFORCES AI TUTOR (production)")
+    print("=" * 60)
+    print(f"🚀 Listening on http://{options['bind']}")
+    print(f"⚙️  {options['workers']} worker(s), {options['worker_class']}"
+          + (f", {options['threads']} threads each" if 'threads' in options else ""))
+    print(f"🛑 SIGTERM drains in-flight requests for up to {options['graceful_timeout']}s")
+    print("=" * 60)
+
+    TutorApplication(options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed archive of raw Codeforces pages.
+
+Every problem and editorial page is stored gzip-compressed under the SHA-256
+of its HTML, so identical fetches are kept once. An append-only manifest
+records which URL produced which object and when. Parser fixes can then be
+applied by re-parsing the archive instead of downloading everything again,
+and the archive doubles as a fixture corpus for parser benchmarks.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+DEFAULT_ARCHIVE_DIR = "raw_pages"
+
+
+class PageArchive:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv('RAW_PAGE_ARCHIVE', DEFAULT_ARCHIVE_DIR)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.manifest_path = os.path.join(self.root, 'manifest.jsonl')
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:] + '.html.gz')
+
+    def store(self, url: str, html: str, kind: str) -> Optional[str]:
+        """Archive a fetched page; returns its content hash (None if archiving failed)."""
+        try:
+            data = html.encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._object_path(digest)
+
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with gzip.open(temp_path, 'wb', compresslevel=6) as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+
+            entry = {
+                'url': url,
+                'kind': kind,
+                'sha256': digest,
+                'fetched_at': datetime.now().isoformat()
+            }
+            with self._lock:
+                with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            return digest
+        except Exception as e:
+            # The archive is a side channel; never fail a fetch because of it
+            print(f"⚠️  Could not archive {url}: {e}")
+            return None
+
+    def load(self, digest: str) -> str:
+        with gzip.open(self._object_path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def entries(self) -> Iterator[Dict]:
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def latest_entries(self) -> Dict[str, Dict]:
+        """Most recent manifest entry for every archived URL."""
+        latest = {}
+        for entry in self.entries():
+            latest[entry['url']] = entry
+        return latest
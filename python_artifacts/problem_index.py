@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""
+Incremental BM25 full-text index over the stored Codeforces problems.
+
+Titles, statements, tags and all editorial text (hints, solutions,
+tutorials, editorials) are tokenized into an inverted index that is updated
+one problem at a time, so storing a new problem never rebuilds the index.
+Queries score only the postings of their own terms and can be filtered by
+tag and contest.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Fields are weighted by repeating their term counts (a simple BM25F)
+FIELD_WEIGHTS = {
+    'title': 3,
+    'tags': 2,
+    'statement': 1,
+    'editorial': 1,
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have if in is it its of on or that the
+this to was were will with we you your can not no so then than there which
+""".split())
+
+EDITORIAL_SECTIONS = ('hints', 'solutions', 'tutorials', 'editorials')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, without stopwords and single characters"""
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def contest_of(problem_id: str) -> str:
+    """Leading contest number of a problem ID ('2128A' -> '2128')"""
+    match = re.match(r'\d+', problem_id or '')
+    return match.group(0) if match else ''
+
+
+def problem_fields(problem_data: Dict) -> Dict[str, str]:
+    """Text of each indexed field of a stored problem record"""
+    editorial_parts = []
+    for section in EDITORIAL_SECTIONS:
+        for item in problem_data.get(section, []):
+            editorial_parts.append(item.get('title', ''))
+            editorial_parts.append(item.get('text', ''))
+
+    return {
+        'title': problem_data.get('problem_title', ''),
+        'tags': ' '.join(problem_data.get('tags', [])),
+        'statement': '\n'.join(filter(None, [problem_data.get('statement', ''), problem_data.get('notes', '')])),
+        'editorial': '\n'.join(editorial_parts),
+    }
+
+
+class ProblemSearchIndex:
+    """Inverted index with BM25 ranking and tag/contest filters"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._tags: Dict[str, set] = {}
+        self._doc_tags: Dict[str, List[str]] = {}
+        self._contests: Dict[str, set] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def rebuild(self, problems: Dict[str, Dict]):
+        """Index every problem of a store (used once at load time)"""
+        with self._lock:
+            for problem_id, problem_data in problems.items():
+                self.add(problem_id, problem_data)
+
+    def add(self, problem_id: str, problem_data: Dict):
+        """Index a problem, replacing its previous version if it was indexed before"""
+        terms = Counter()
+        for field, text in problem_fields(problem_data).items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                terms[token] += weight
+
+        tags = [tag.lower() for tag in problem_data.get('tags', [])]
+
+        with self._lock:
+            self.remove(problem_id)
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[problem_id] = frequency
+            length = sum(terms.values())
+            self._doc_terms[problem_id] = terms
+            self._doc_lengths[problem_id] = length
+            self._total_length += length
+
+            self._doc_tags[problem_id] = tags
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(problem_id)
+            self._contests.setdefault(contest_of(problem_id), set()).add(problem_id)
+
+    def remove(self, problem_id: str):
+        with self._lock:
+            terms = self._doc_terms.pop(problem_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(problem_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(problem_id, 0)
+
+            for tag in self._doc_tags.pop(problem_id, []):
+                self._tags.get(tag, set()).discard(problem_id)
+            self._contests.get(contest_of(problem_id), set()).discard(problem_id)
+
+    def _allowed(self, tags: Optional[Iterable[str]], contest: Optional[str]) -> Optional[set]:
+        """Problem IDs passing the filters, or None when there are no filters"""
+        allowed = None
+        for tag in tags or []:
+            tagged = self._tags.get(tag.strip().lower(), set())
+            allowed = set(tagged) if allowed is None else allowed & tagged
+        if contest:
+            in_contest = self._contests.get(str(contest).strip(), set())
+            allowed = set(in_contest) if allowed is None else allowed & in_contest
+        return allowed
+
+    def search(self, query: str, tags: Optional[Iterable[str]] = None,
+               contest: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """Top problems for a query as [{'problem_id', 'score'}], best first"""
+        with self._lock:
+            allowed = self._allowed(tags, contest)
+            query_terms = set(tokenize(query or ''))
+
+            if not query_terms:
+                # Filter-only query: list the matching problems in ID order
+                matches = sorted(allowed) if allowed is not None else []
+                return [{'problem_id': problem_id, 'score': 0.0} for problem_id in matches[:limit]]
+
+            doc_count = len(self._doc_lengths)
+            if doc_count == 0:
+                return []
+            average_length = self._total_length / doc_count
+
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for problem_id, frequency in postings.items():
+                    if allowed is not None and problem_id not in allowed:
+                        continue
+                    length_norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[problem_id] / average_length)
+                    scores[problem_id] = scores.get(problem_id, 0.0) + \
+                        idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{'problem_id': problem_id, 'score': round(score, 4)} for problem_id, score in best]
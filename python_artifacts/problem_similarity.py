@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+Similar-problem recommendations from hashed n-gram vectors.
+
+Every stored problem becomes one row of a contiguous float16 NumPy matrix:
+word unigrams and bigrams of its title, tags, statement and editorial text
+are hashed into 1024 buckets (sublinear term frequency, field weights from
+the search index), then L2-normalized. That is 2 KB per problem, about
+20 MB for the whole Codeforces problemset. Cosine similarity against every
+problem is a matrix-vector product over blocks of rows. New problems are
+appended as rows without rebuilding anything.
+
+Vectors are built lazily: loading the store only remembers the records, and
+they are vectorized on the first similarity query, so startup doesn't pay
+for an index that may never be used.
+"""
+
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from problem_index import FIELD_WEIGHTS, problem_fields, tokenize
+
+DEFAULT_DIMENSIONS = 1 << 10
+STORAGE_DTYPE = np.float16  # unit vectors: half precision is plenty for ranking
+SCORE_BLOCK_ROWS = 4096  # rows widened to float32 at a time when scoring
+
+
+class SimilarProblemIndex:
+    """Row-per-problem matrix of hashed n-gram vectors with top-k cosine lookup"""
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS, initial_capacity: int = 256):
+        self.dimensions = dimensions
+        self._matrix = np.zeros((initial_capacity, dimensions), dtype=STORAGE_DTYPE)
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        # Records waiting to be vectorized on first use (problem_id -> record)
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids) + len([pid for pid in self._pending if pid not in self._row_of])
+
+    def vectorize(self, problem_data: Dict) -> np.ndarray:
+        """Hashed, sublinear-TF, L2-normalized vector of a problem record"""
+        counts: Dict[int, float] = {}
+        for field, text in problem_fields(problem_data).items():
+            weight = FIELD_WEIGHTS[field]
+            tokens = tokenize(text)
+            grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for gram in grams:
+                digest = zlib.crc32(gram.encode('utf-8'))
+                # The top bit picks a sign so colliding features tend to cancel instead of pile up
+                bucket = (digest & 0x7FFFFFFF) % self.dimensions
+                sign = -1.0 if digest & 0x80000000 else 1.0
+                counts[bucket] = counts.get(bucket, 0.0) + sign * weight
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        if counts:
+            buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            vector[buckets] = np.sign(values) * (1.0 + np.log(np.maximum(np.abs(values), 1.0)))
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector
+
+    def rebuild(self, problems: Dict[str, Dict]):
+        """Queue every record; they are vectorized on the first query"""
+        with self._lock:
+            self._pending.update(problems)
+
+    def _build_pending(self):
+        """Vectorize queued records (caller holds the lock)"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        for problem_id, problem_data in pending.items():
+            self._insert(problem_id, self.vectorize(problem_data))
+
+    def add(self, problem_id: str, problem_data: Dict):
+        """Insert or refresh one problem's row"""
+        with self._lock:
+            if self._pending:
+                # Still lazy: just replace the queued record
+                self._pending[problem_id] = problem_data
+                return
+        vector = self.vectorize(problem_data)
+        with self._lock:
+            self._insert(problem_id, vector)
+
+    def _insert(self, problem_id: str, vector: np.ndarray):
+        with self._lock:
+            row = self._row_of.get(problem_id)
+            if row is None:
+                row = len(self._ids)
+                if row == self._matrix.shape[0]:
+                    # Amortized O(1) appends: grow by half and copy once
+                    grown = np.zeros((row + row // 2 + 1, self.dimensions), dtype=STORAGE_DTYPE)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._ids.append(problem_id)
+                self._row_of[problem_id] = row
+            self._matrix[row] = vector
+
+    def similar_to(self, problem_id: str, k: int = 5) -> Optional[List[Dict]]:
+        """Top-k most similar problems, or None if the problem isn't indexed"""
+        with self._lock:
+            self._build_pending()
+            row = self._row_of.get(problem_id)
+            if row is None:
+                return None
+            return self._top_k(self._matrix[row].astype(np.float32), k, exclude=row)
+
+    def similar_to_vector(self, vector: np.ndarray, k: int = 5) -> List[Dict]:
+        with self._lock:
+            self._build_pending()
+            return self._top_k(vector.astype(np.float32), k)
+
+    def _top_k(self, vector: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Dict]:
+        count = len(self._ids)
+        if count == 0 or k <= 0:
+            return []
+
+        # float16 dot products would be slow and lossy; widen one block at a time
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, count)
+            scores[start:end] = self._matrix[start:end].astype(np.float32) @ vector
+        if exclude is not None:
+            scores[exclude] = -np.inf
+
+        k = min(k, count - (1 if exclude is not None else 0))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{'problem_id': self._ids[i], 'score': round(float(scores[i]), 4)} for i in top]
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Speculative prefetch of the other problems of a contest.
+
+Processing one problem's editorial stores its siblings as stub records
+without statements, samples or limits. The prefetcher fetches those pages
+on a single background thread, at background priority on the shared rate
+limiter, so moving on to the next problem is a store hit instead of a
+scrape. Siblings following the requested problem go first, and the most
+recently requested contest is served before older ones.
+"""
+
+import itertools
+import os
+import queue
+import threading
+from typing import Iterable
+
+from codeforces_urls import canonicalize_problem_url
+
+
+class SiblingPrefetcher:
+    """Priority queue of stub problems whose pages are fetched in the background"""
+
+    def __init__(self, extractor, enabled: bool = None):
+        self.extractor = extractor
+        self.enabled = enabled if enabled is not None else os.getenv('PREFETCH_SIBLINGS', '1') != '0'
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._batches = itertools.count(1)
+        self._thread = None
+        self.stats = {'scheduled': 0, 'fetched': 0, 'skipped': 0, 'failed': 0}
+
+    def schedule(self, requested_id: str, sibling_ids: Iterable[str]):
+        """Queue the siblings of a just-requested problem, nearest following letters first"""
+        if not self.enabled:
+            return
+        batch = next(self._batches)
+        requested = canonicalize_problem_url(requested_id)
+        siblings = sorted(sibling_ids)
+        # Rank: problems after the requested one in order, then the ones before it
+        following = [pid for pid in siblings if requested is None or pid > requested.key]
+        preceding = [pid for pid in siblings if pid not in following]
+
+        with self._queued_lock:
+            for rank, problem_id in enumerate(following + preceding):
+                if problem_id in self._queued:
+                    continue
+                self._queued.add(problem_id)
+                self._queue.put((-batch, rank, problem_id))
+                self.stats['scheduled'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sibling-prefetch', daemon=True)
+                self._thread.start()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            _, _, problem_id = self._queue.get()
+            try:
+                self._prefetch(problem_id)
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"❌ Error prefetching {problem_id}: {e}")
+            finally:
+                with self._queued_lock:
+                    self._queued.discard(problem_id)
+            if self._queue.empty():
+                self.extractor.save_data()
+
+    def _prefetch(self, problem_id: str):
+        existing = self.extractor.search_problem(problem_id)
+        if existing and existing.get('statement'):
+            # Filled meanwhile, e.g. the student requested it directly
+            self.stats['skipped'] += 1
+            return
+
+        canonical = canonicalize_problem_url(problem_id)
+        if not canonical:
+            self.stats['skipped'] += 1
+            return
+
+        problem_data = self.extractor.extract_problem_info(canonical.url, background=True)
+        if not problem_data:
+            self.stats['failed'] += 1
+            return
+        self.extractor.fill_statement(problem_id, problem_data)
+        self.stats['fetched'] += 1
+        print(f"✅ Prefetched statement of {problem_id}")
@@ -3,7 +3,9 @@
 """
 Codeforces AI Tutor - Startup Script
 
-This script starts the Flask backend server for the Codeforces AI Tutor web application.
+This script starts the backend server for the Codeforces AI Tutor web application.
+Set SERVER_MODE=asgi to serve through uvicorn, where chat streams are async and
+don't each hold a thread; the default runs the Flask server directly.
 """
 
 import os
@@ -20,21 +22,20 @@ def main():
     # Set working directory to project root so relative paths work
     os.chdir(project_root)
     
-    # Import and run the Flask app
-    from app import app
-    
     # Get configuration from environment
     # Railway uses PORT environment variable
     port = int(os.getenv('PORT', os.getenv('FLASK_PORT', 5000)))
     debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     # Railway requires binding to 0.0.0.0
     host = os.getenv('FLASK_HOST', '0.0.0.0')
+    server_mode = os.getenv('SERVER_MODE', 'flask').lower()
     
     print("=" * 60)
     print("🎯 CODEFORCES AI TUTOR")
     print("=" * 60)
     print(f"🚀 Starting server on http://{host}:{port}")
     print(f"🔧 Debug mode: {debug}")
+    print(f"⚙️  Server mode: {server_mode}")
     print("📋 Available endpoints:")
     print("   • GET  /                    - Main web interface")
     print("   • POST /api/extract-problem - Extract problem from URL")
@@ -49,7 +50,21 @@ def main():
     print("=" * 60)
     
     try:
-        app.run(host=host, port=port, debug=debug)
+        if server_mode == 'asgi':
+            import uvicorn
+            sys.path.insert(0, project_root)
+            requested = int(os.getenv('ASGI_WORKERS') or 1)
+            if requested > 1:
+                # Sessions live in process memory and the storage journal has a single writer:
+                # a second worker's compaction would truncate the first one's journaled writes
+                print(f"⚠️  ASGI_WORKERS={requested} ignored: sessions live in process memory, "
+                      f"running 1 worker (scale with WSGI_THREADS instead)")
+            uvicorn.run('backend.asgi:app', host=host, port=port, workers=1,
+                        log_level='debug' if debug else 'info')
+        else:
+            # Import and run the Flask app
+            from app import app
+            app.run(host=host, port=port, debug=debug, threaded=True)
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
     except Exception as e:
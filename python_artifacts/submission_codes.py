@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+Source code of submissions referenced by editorials.
+
+Many editorial "code" spoilers contain only submission IDs instead of the
+code itself. The resolver finds those IDs, downloads the submissions on a
+small thread pool paced by the shared rate limiter, caches every source by
+submission ID on disk, and fills the spoiler's `codes` list in place.
+"""
+
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+from curl_cffi import requests
+
+from problem_index import contest_of
+from throttle import RateLimiter, fetch_limiter
+
+DEFAULT_CACHE_FILE = "submission_codes_cache.json"
+DEFAULT_FETCH_WORKERS = 4
+
+SUBMISSION_ID_RE = re.compile(r'(?<![\d$.])(\d{7,10})(?![\d$]|\.\d)')
+# Only spoilers like these hold submission references; others may contain large constants
+CODE_TITLE_RE = re.compile(r'code|implementation|submission', re.IGNORECASE)
+
+EDITORIAL_SECTIONS = ('hints', 'solutions', 'tutorials', 'editorials')
+
+
+def find_submission_ids(item: Dict) -> List[str]:
+    """Submission IDs referenced by an editorial spoiler that has no code of its own"""
+    if item.get('codes') or not CODE_TITLE_RE.search(item.get('title', '')):
+        return []
+    return list(dict.fromkeys(SUBMISSION_ID_RE.findall(item.get('text', ''))))
+
+
+def pending_references(problem_id: str, problem_data: Dict) -> List[Tuple[Dict, str, List[str]]]:
+    """(spoiler, contest, submission IDs) for every spoiler of a problem that needs code"""
+    contest_id = contest_of(problem_id)
+    references = []
+    for section in EDITORIAL_SECTIONS:
+        for item in problem_data.get(section, []):
+            submission_ids = find_submission_ids(item)
+            if submission_ids:
+                references.append((item, contest_id, submission_ids))
+    return references
+
+
+class SubmissionCodeResolver:
+    """Fetches and caches submission sources, and fills editorial spoilers with them"""
+
+    def __init__(self, cache_file: Optional[str] = None, max_workers: Optional[int] = None,
+                 limiter: Optional[RateLimiter] = None):
+        self.cache_file = cache_file or os.getenv('SUBMISSION_CACHE_FILE', DEFAULT_CACHE_FILE)
+        self.max_workers = max_workers or int(os.getenv('SUBMISSION_FETCH_WORKERS', DEFAULT_FETCH_WORKERS))
+        self.limiter = limiter or fetch_limiter
+        self._cache: Dict[str, str] = self._load_cache()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._fetch_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='submission-fetch')
+        # One background job at a time; each job fans out onto the fetch pool
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='submission-resolver')
+
+    def _load_cache(self) -> Dict[str, str]:
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Error loading submission cache: {e}")
+        return {}
+
+    def _save_cache(self):
+        with self._cache_lock:
+            snapshot = dict(self._cache)
+        try:
+            temp_path = self.cache_file + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp_path, self.cache_file)
+        except Exception as e:
+            print(f"Error saving submission cache: {e}")
+
+    def _session(self):
+        # curl_cffi sessions aren't safe to share between threads
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session(impersonate="chrome110")
+            self._local.session = session
+        return session
+
+    def fetch(self, contest_id: str, submission_id: str) -> Optional[str]:
+        """Source of one submission, from the cache or from its submission page"""
+        with self._cache_lock:
+            cached = self._cache.get(submission_id)
+        if cached is not None:
+            return cached
+
+        url = f"https://codeforces.com/contest/{contest_id}/submission/{submission_id}"
+        try:
+            # Resolution runs behind the request that found the spoilers: yield to interactive fetches
+            self.limiter.acquire(background=True)
+            response = self._session().get(url)
+            if response.status_code != 200:
+                print(f"⚠️  Could not fetch submission {submission_id}: status {response.status_code}")
+                return None
+            source_elem = BeautifulSoup(response.text, 'html.parser').find('pre', id='program-source-text')
+            if not source_elem:
+                print(f"⚠️  No source on the page of submission {submission_id}")
+                return None
+            source = source_elem.get_text().strip()
+        except Exception as e:
+            print(f"⚠️  Error fetching submission {submission_id}: {e}")
+            return None
+
+        with self._cache_lock:
+            self._cache[submission_id] = source
+        return source
+
+    def resolve(self, problems: Iterable[Tuple[str, Dict]], lock=None) -> int:
+        """Fill `codes` of every spoiler that references submissions; returns how many were filled"""
+        references = []
+        for problem_id, problem_data in problems:
+            references.extend(pending_references(problem_id, problem_data))
+        if not references:
+            return 0
+
+        jobs = {(contest_id, submission_id) for _, contest_id, ids in references for submission_id in ids}
+        futures = {job: self._fetch_pool.submit(self.fetch, *job) for job in jobs}
+        sources = {job: future.result() for job, future in futures.items()}
+
+        filled = 0
+        with lock or threading.Lock():
+            for item, contest_id, submission_ids in references:
+                codes = [sources[(contest_id, sid)] for sid in submission_ids if sources.get((contest_id, sid))]
+                if codes and not item.get('codes'):
+                    item['codes'] = codes
+                    filled += 1
+
+        self._save_cache()
+        return filled
+
+    def resolve_in_background(self, problems: List[Tuple[str, Dict]], lock=None,
+                              on_done: Optional[Callable[[int], None]] = None):
+        """Queue a resolve() run so the caller never waits on submission fetches"""
+        def run():
+            try:
+                filled = self.resolve(problems, lock)
+                if filled:
+                    print(f"✅ Filled {filled} editorial code blocks from referenced submissions")
+                if on_done:
+                    on_done(filled)
+            except Exception as e:
+                print(f"❌ Error resolving submission code: {e}")
+
+        return self._background.submit(run)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the app's modules the way the servers do: from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
@@ -0,0 +1,96 @@
+"""Problemset ingestion, replayed from recorded Codeforces API responses"""
+
+import json
+import os
+
+import pytest
+
+from codeforces_api import CodeforcesAPI, CodeforcesAPIError
+from conftest import FIXTURES
+
+RECORDED = os.path.join(FIXTURES, 'codeforces_api')
+
+
+def test_problemset_metadata_from_recording():
+    metadata = CodeforcesAPI(recorded_dir=RECORDED).problemset_metadata()
+
+    assert set(metadata) == {'2128A', '2128B', '2128Z'}
+    problem = metadata['2128A']
+    assert problem['problem_title'] == 'A. Recycling Center'
+    assert problem['tags'] == ['greedy', 'sortings', '*800']
+    assert problem['rating'] == 800
+    assert problem['solved_count'] == 24000
+    assert problem['url'] == 'https://codeforces.com/contest/2128/problem/A'
+    assert problem['contest_title'] == 'Codeforces Round 1039 (Div. 2)'
+    assert metadata['2128Z']['rating'] is None
+    assert metadata['2128Z']['tags'] == []
+
+
+def test_missing_recording_raises(tmp_path):
+    with pytest.raises(CodeforcesAPIError):
+        CodeforcesAPI(recorded_dir=str(tmp_path)).call('problemset.problems')
+
+
+@pytest.fixture
+def extractor(tmp_path, monkeypatch):
+    # The store, page archive and submission cache all live in the working directory
+    monkeypatch.chdir(tmp_path)
+    final = pytest.importorskip('final')
+    store = {
+        '2128A': {
+            'problem_id': '2128A', 'problem_title': 'A. Recycling Center', 'contest_title': '',
+            'statement': 'Scraped statement', 'sample_inputs': ['1'], 'sample_outputs': ['1'],
+            'tags': [], 'url': '', 'hints': [], 'tutorials': [], 'editorials': [],
+            'solutions': [{'title': 'code', 'text': '', 'codes': ['int main() {}']}],
+        },
+    }
+    with open('comprehensive_codeforces_problems.json', 'w', encoding='utf-8') as f:
+        json.dump(store, f)
+    return final.ComprehensiveCodeforcesSolutionExtractor()
+
+
+def test_ingest_merges_metadata_into_known_problems(extractor):
+    assert extractor.ingest_problemset(recorded_dir=RECORDED) == 1
+
+    problem = extractor.problems_data['2128A']
+    assert problem['rating'] == 800
+    assert problem['solved_count'] == 24000
+    assert problem['tags'] == ['greedy', 'sortings', '*800']
+    # Filled only where empty; scraped content is kept
+    assert problem['url'] == 'https://codeforces.com/contest/2128/problem/A'
+    assert problem['contest_title'] == 'Codeforces Round 1039 (Div. 2)'
+    assert problem['statement'] == 'Scraped statement'
+    assert problem['solutions'][0]['codes'] == ['int main() {}']
+    assert '2128B' not in extractor.problems_data
+
+    # Nothing changes on a second pass
+    assert extractor.ingest_problemset(recorded_dir=RECORDED) == 0
+
+
+def test_ingest_add_new_creates_metadata_records(extractor):
+    assert extractor.ingest_problemset(recorded_dir=RECORDED, add_new=True) == 3
+
+    problem = extractor.problems_data['2128B']
+    assert problem['statement'] == ''
+    assert problem['rating'] == 1100
+    assert problem['solved_count'] == 15000
+    assert problem['tags'] == ['constructive algorithms', '*1100']
+    assert extractor.search_problem('2128B')['problem_title'] == 'B. Deque Process'
+    with open('comprehensive_codeforces_problems.json', encoding='utf-8') as f:
+        assert set(json.load(f)) == {'2128A', '2128B', '2128Z'}
+
+
+def test_editorial_entry_keeps_ingested_metadata(extractor):
+    extractor.ingest_problemset(recorded_dir=RECORDED, add_new=True)
+    stub = {
+        'problem_id': '2128B', 'problem_title': 'B. Deque', 'contest_title': '', 'statement': '',
+        'tags': [], 'url': '', 'tutorial_info': {}, 'hints': [{'title': 'Hint 1', 'text': 'Think greedily'}],
+        'solutions': [], 'tutorials': [], 'editorials': [],
+    }
+    extractor.store_records({'2128B': stub})
+
+    problem = extractor.problems_data['2128B']
+    assert problem['hints'][0]['text'] == 'Think greedily'
+    assert problem['rating'] == 1100
+    assert problem['tags'] == ['constructive algorithms', '*1100']
+    assert problem['url'] == 'https://codeforces.com/contest/2128/problem/B'
@@ -0,0 +1,110 @@
+import math
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from backend import llm_resilience
+from backend.fake_provider import FakeGenerativeModel
+from backend.llm_resilience import CircuitOpenError, LLMResilience
+
+FAST = {'FAKE_LLM_TTFT_MS': 2, 'FAKE_LLM_TTFT_JITTER_MS': 0, 'FAKE_LLM_CHUNK_MS': 0}
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """Set FAKE_LLM_* / LLM_* variables, then build a fake model and a resilience layer from them"""
+    def build(**settings):
+        for name, value in {'LLM_BACKOFF_BASE': 0, **FAST, **settings}.items():
+            monkeypatch.setenv(name, str(value))
+        return FakeGenerativeModel('fake'), LLMResilience()
+    return build
+
+
+def test_service_unavailable_is_retried_until_it_succeeds(configure):
+    model, resilience = configure(FAKE_LLM_ERROR_RATE=1, LLM_MAX_ATTEMPTS=3)
+
+    def flaky():
+        try:
+            return model.generate_content('prompt')
+        finally:
+            model.error_rate = 0  # only the first attempt fails
+
+    assert resilience.call(flaky).text
+    assert model.calls == 2
+    assert resilience.counters['retries'] == 1
+    assert resilience.counters['failures'] == 0
+
+
+def test_stream_retry_gives_up_after_max_attempts(configure):
+    model, resilience = configure(FAKE_LLM_ERROR_RATE=1, LLM_MAX_ATTEMPTS=3, LLM_BREAKER_FAILURES=10)
+
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        list(resilience.stream(lambda: model.generate_content('prompt', stream=True)))
+    assert model.calls == 3
+    assert resilience.counters['retries'] == 2
+    assert resilience.counters['failures'] == 1
+
+
+def test_breaker_opens_then_probes_half_open(configure):
+    model, resilience = configure(FAKE_LLM_ERROR_RATE=1, LLM_MAX_ATTEMPTS=1,
+                                  LLM_BREAKER_FAILURES=2, LLM_BREAKER_COOLDOWN=0.1)
+    call = lambda: model.generate_content('prompt')
+
+    for _ in range(2):
+        with pytest.raises(google_exceptions.ServiceUnavailable):
+            resilience.call(call)
+    assert resilience.breaker.state == 'open'
+
+    # Open: refused without reaching the model
+    with pytest.raises(CircuitOpenError):
+        resilience.call(call)
+    assert model.calls == 2
+    assert resilience.counters['rejected_open'] == 1
+
+    # After the cooldown one probe goes out; its failure opens the breaker again
+    time.sleep(0.15)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        resilience.call(call)
+    assert model.calls == 3
+    assert resilience.breaker.state == 'open'
+    assert resilience.breaker.times_opened == 2
+
+    # A successful probe closes it
+    time.sleep(0.15)
+    model.error_rate = 0
+    assert resilience.call(call).text
+    assert resilience.breaker.state == 'closed'
+
+
+def test_half_open_breaker_admits_a_single_probe(configure):
+    _, resilience = configure(LLM_BREAKER_FAILURES=1, LLM_BREAKER_COOLDOWN=0.05)
+    resilience.breaker.record_failure()
+    time.sleep(0.1)
+
+    resilience.breaker.allow()  # the probe
+    assert resilience.breaker.state == 'half-open'
+    with pytest.raises(CircuitOpenError):
+        resilience.breaker.allow()
+
+
+@pytest.mark.parametrize('budget', [0.0, 0.02])
+def test_hedges_stay_within_budget(configure, monkeypatch, budget):
+    monkeypatch.setattr(llm_resilience, 'HEDGE_MIN_DELAY', 0.005)
+    model, resilience = configure(LLM_HEDGE_BUDGET=budget)
+    call = lambda: model.generate_content('prompt')
+
+    # Enough fast calls for a latency p95, then a run of calls 10x slower than it
+    for _ in range(60):
+        resilience.call(call)
+    model.slow_rate = 1
+    for _ in range(10):
+        assert resilience.call(call).text
+
+    counters = resilience.counters
+    assert counters['hedges'] <= math.ceil(budget * counters['calls'])
+    if budget:
+        assert counters['hedges'] >= 1
+    else:
+        assert counters['hedges'] == 0
+    assert model.calls == counters['calls'] + counters['hedges']
@@ -0,0 +1,95 @@
+import asyncio
+
+from backend.llm_scheduler import BACKGROUND, INTERACTIVE, STANDARD, LLMScheduler
+
+
+async def hold(scheduler, gate, priority=STANDARD):
+    """Take a slot and keep it until the gate opens"""
+    async with scheduler.slot_async(priority, 'holder'):
+        await gate.wait()
+
+
+async def served_order(scheduler, calls):
+    """Queue (priority, user, cost) calls behind a held slot, free it, and return the users in the order served"""
+    order = []
+
+    async def call(priority, user, cost):
+        async with scheduler.slot_async(priority, user, cost):
+            order.append(user)
+
+    gate = asyncio.Event()
+    holder = asyncio.create_task(hold(scheduler, gate))
+    await asyncio.sleep(0)
+    tasks = []
+    for priority, user, cost in calls:
+        tasks.append(asyncio.create_task(call(priority, user, cost)))
+        await asyncio.sleep(0)  # queue them in this order
+    gate.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_waiting_calls_are_served_by_class():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = asyncio.run(served_order(scheduler, [
+        (BACKGROUND, 'welcome', 1), (STANDARD, 'hint', 1), (INTERACTIVE, 'chat', 1),
+    ]))
+    assert order == ['chat', 'hint', 'welcome']
+
+
+def test_callers_are_served_fairly_by_cost_within_a_class():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = asyncio.run(served_order(scheduler, [
+        (STANDARD, 'heavy', 1000), (STANDARD, 'heavy', 1000), (STANDARD, 'heavy', 1000), (STANDARD, 'light', 100),
+    ]))
+    # light queued last but its virtual start is behind heavy's second call
+    assert order == ['heavy', 'light', 'heavy', 'heavy']
+
+
+def test_background_work_holds_at_most_its_share_of_slots():
+    scheduler = LLMScheduler(max_concurrency=4, background_share=0.5)
+
+    async def scenario():
+        gate = asyncio.Event()
+        background = [asyncio.create_task(hold(scheduler, gate, BACKGROUND)) for _ in range(3)]
+        await asyncio.sleep(0)
+        classes = scheduler.stats()['classes']
+        assert classes[BACKGROUND]['active'] == 2
+        assert classes[BACKGROUND]['queued'] == 1
+
+        # The slots background work may not take stay free for everything else
+        async with scheduler.slot_async(STANDARD, 'hint'):
+            async with scheduler.slot_async(INTERACTIVE, 'chat'):
+                assert scheduler.stats()['active'] == 4
+        gate.set()
+        await asyncio.gather(*background)
+
+    asyncio.run(scenario())
+    assert scheduler.stats()['classes'][BACKGROUND]['served'] == 3
+    assert scheduler.stats()['active'] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def scenario():
+        gate = asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, gate))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(scheduler, gate, INTERACTIVE))
+        await asyncio.sleep(0)
+        assert scheduler.stats()['classes'][INTERACTIVE]['queued'] == 1
+
+        waiter.cancel()  # e.g. the client disconnected while queued
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.stats()['classes'][INTERACTIVE]['queued'] == 0
+
+        gate.set()
+        await holder
+        # The freed slot isn't handed to the cancelled waiter
+        assert scheduler.stats()['active'] == 0
+        async with scheduler.slot_async(STANDARD, 'next'):
+            assert scheduler.stats()['active'] == 1
+
+    asyncio.run(scenario())
+    assert scheduler.stats()['classes'][INTERACTIVE]['served'] == 0
@@ -0,0 +1,94 @@
+import json
+
+from backend.persistence import WriteBehindPersister, load_storage
+from backend.session_registry import SessionRegistry
+
+PROBLEM = {'problem_id': '1A', 'statement': 'x' * 20000, 'editorials': [{'title': 'Tutorial', 'text': 'y' * 20000}]}
+
+
+def open_registry(path):
+    registry = SessionRegistry.from_storage(load_storage(path))
+    registry.persister = WriteBehindPersister(registry, path, flush_interval=60)
+    registry.on_change = registry.persister.mark_dirty
+    return registry
+
+
+def journal_records(path):
+    with open(path + '.journal') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_chat_turns_journal_session_state_not_problem_data(tmp_path):
+    path = str(tmp_path / 'storage.json')
+    registry = open_registry(path)
+    session = registry.create_session('1A', PROBLEM)
+    registry.persister.flush()
+    for turn in range(3):
+        registry.append_message(session, 'user', f"question {turn}")
+        registry.append_message(session, 'assistant', f"answer {turn}", is_hint=False)
+        registry.persister.flush()
+
+    sessions = [record for record in journal_records(path) if record['t'].startswith('session')]
+    assert [record['t'] for record in sessions] == ['session'] + ['session_state'] * 3
+    assert all('problem_data' not in record['v'] for record in sessions[1:])
+
+    restored = SessionRegistry.from_storage(load_storage(path)).sessions[session.session_id]
+    assert restored.problem_data == PROBLEM
+    assert restored.message_seqs.tolist() == [1, 2, 3, 4, 5, 6]
+
+
+def test_reopened_store_journals_only_state_of_known_sessions(tmp_path):
+    path = str(tmp_path / 'storage.json')
+    registry = open_registry(path)
+    session = registry.create_session('1A', PROBLEM)
+    registry.persister.close()  # compacts: the session is now in storage.json
+
+    registry = open_registry(path)
+    session = registry.sessions[session.session_id]
+    with registry.locked_session(session):
+        session.hints_given += 1
+        registry.mark_changed(session)
+    registry.persister.flush()
+
+    assert [record['t'] for record in journal_records(path)] == ['session_state']
+    restored = SessionRegistry.from_storage(load_storage(path)).sessions[session.session_id]
+    assert restored.hints_given == 1
+    assert restored.problem_data == PROBLEM
+
+
+def history_texts(registry, session):
+    return [message['message'] for message in registry.session_history(session)]
+
+
+def test_reserved_welcome_stays_first_when_written_after_the_student(tmp_path):
+    path = str(tmp_path / 'storage.json')
+    registry = open_registry(path)
+    session = registry.create_session('1A', PROBLEM)
+    seq = registry.reserve_message(session, 'assistant')
+    registry.append_message(session, 'user', 'hello')
+    registry.persister.flush()  # the reserved place goes to disk empty
+    assert history_texts(registry, session) == ['hello']
+
+    registry.write_message(session, seq, 'welcome')
+    registry.persister.flush()
+    assert history_texts(registry, session) == ['welcome', 'hello']
+    assert [message['message'] for message in registry.context_for(session)] == ['welcome', 'hello']
+
+    restored = SessionRegistry.from_storage(load_storage(path))
+    assert history_texts(restored, restored.sessions[session.session_id]) == ['welcome', 'hello']
+    assert not restored.reserved
+
+
+def test_unwritten_reservation_stays_out_of_the_history_after_a_restart(tmp_path):
+    path = str(tmp_path / 'storage.json')
+    registry = open_registry(path)
+    session = registry.create_session('1A', PROBLEM, conversation_id='c1')
+    registry.reserve_message(session, 'assistant')  # e.g. the welcome failed
+    registry.append_message(session, 'user', 'hello')
+    registry.persister.close()
+
+    restored = SessionRegistry.from_storage(load_storage(path))
+    assert history_texts(restored, restored.sessions[session.session_id]) == ['hello']
+    context = restored.conversation_context('c1')
+    assert [message['message'] for message in context] == ['hello']
+    assert list(context.seqs) == [2]
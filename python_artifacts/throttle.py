@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Process-wide request pacing for everything that talks to codeforces.com.
+
+Page fetches from different threads (submission code lookups, background
+prefetching, interactive extraction) share one limiter, so together they
+never exceed CF_FETCH_RATE requests per second. Background fetches step
+aside while a foreground fetch is waiting for a slot.
+"""
+
+import os
+import threading
+import time
+
+DEFAULT_FETCH_RATE = 2.0  # requests per second
+
+
+class RateLimiter:
+    """Spaces calls evenly: at most `rate` acquisitions per second across all threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self._foreground = 0
+        self._idle = threading.Condition()
+
+    def reserve(self) -> float:
+        """Claim the next free slot; returns how many seconds to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            return slot - now
+
+    def acquire(self, background: bool = False):
+        """Wait for a slot; background callers only get one when no foreground caller is waiting"""
+        with self._idle:
+            if background:
+                while self._foreground:
+                    self._idle.wait()
+            else:
+                self._foreground += 1
+        try:
+            delay = self.reserve()
+            if delay > 0:
+                time.sleep(delay)
+        finally:
+            if not background:
+                with self._idle:
+                    self._foreground -= 1
+                    self._idle.notify_all()
+
+
+fetch_limiter = RateLimiter(float(os.getenv('CF_FETCH_RATE', DEFAULT_FETCH_RATE)))